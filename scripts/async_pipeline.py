@@ -0,0 +1,209 @@
+"""
+# async_pipeline.py
+
+## Purpose:
+This script transfers documents from the DEV database to the PROD database with an asyncio pipeline,
+so that reading from DEV and writing to PROD overlap instead of running one after the other.
+
+## Usage:
+This script is invoked within `data_transfer.py` (`--mode async`) and is not typically run directly by the user.
+
+## Details:
+- A reader task streams chunks of documents from DEV into a bounded queue.
+- Writer tasks drain the queue and upsert each chunk into PROD, each on its own pooled connection.
+  Title conflicts are quarantined before writing, with one validator shared by all writers.
+- Chunks are capped by record count and payload bytes. Oversized `content` values are left on DEV by the
+  reader and streamed in chunks by the writers, which borrow a DEV connection for it when needed.
+- The bounded queue provides backpressure: the reader pauses when the writers fall behind.
+- Writers finish chunks out of order, so the checkpoint saved with each chunk (`async:documents`) is the last
+  key of the longest run of written chunks from the start of the stream. An interrupted run resumes after it.
+- When a writer fails, the reader stops before its next DEV fetch, the other writers drain the queue
+  without writing, and the error is raised.
+- psycopg2 calls are blocking, so they run in worker threads through `asyncio.to_thread`. This keeps the
+  existing psycopg2 stack (server-side cursors, batched upserts, connection pools) instead of adding an
+  async driver, while still overlapping network latency on both sides.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from functools import partial
+from dotenv import load_dotenv
+from db import connection, dev_db_name, get_pool, prod_db_name
+from extract_data_from_dev import stream_new_records
+from large_values import LARGE_VALUE_BYTES, ensure_large_value_table, has_large_values
+from metrics import timed_iter
+from quarantine import ensure_quarantine_table
+from sync_state import clear_checkpoints, ensure_checkpoint_table, get_checkpoint, save_checkpoint
+from validate_and_transfer import DEFAULT_BATCH_BYTES, DEFAULT_BATCH_SIZE, UniqueConflictValidator, iter_batches
+from validate_and_transfer import transfer_batch
+
+load_dotenv()
+
+# Maximum number of chunks waiting between the reader and the writers
+DEFAULT_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+
+# Number of concurrent PROD writer tasks
+DEFAULT_WRITERS = int(os.getenv("PIPELINE_WRITERS", "2"))
+
+CHECKPOINT_NAME = "async:documents"
+
+class ChunkProgress:
+    """
+    Tracks the chunks that were written, by sequence number, to find the last key below which every
+    chunk of the stream is written. Only chunks written ahead of an unfinished one are kept.
+    """
+
+    def __init__(self, last_key=None):
+        self.last_key = last_key
+        self.next_seq = 0
+        self.written_ahead = {}
+        self._lock = threading.Lock()
+
+    def _advance(self, written):
+        key, seq = self.last_key, self.next_seq
+        while seq in written:
+            key = written[seq]
+            seq += 1
+        return key, seq
+
+    def checkpoint_key(self, seq, last_key):
+        """Return the key to checkpoint once chunk `seq`, ending with `last_key`, is written too."""
+        with self._lock:
+            key, _ = self._advance({**self.written_ahead, seq: last_key})
+            return key
+
+    def complete(self, seq, last_key):
+        """Record that chunk `seq` was committed."""
+        with self._lock:
+            self.written_ahead[seq] = last_key
+            self.last_key, next_seq = self._advance(self.written_ahead)
+            for done in range(self.next_seq, next_seq):
+                del self.written_ahead[done]
+            self.next_seq = next_seq
+
+def save_progress(prod_conn, progress, seq, last_key):
+    """`transfer_batch` checkpoint: save, in the chunk's transaction, the key every written chunk reaches."""
+    key = progress.checkpoint_key(seq, last_key)
+    if key is not None:
+        save_checkpoint(prod_conn, CHECKPOINT_NAME, "documents", key, commit=False)
+
+async def read_chunks(queue, failed, stats, batch_size, batch_bytes, writers, after_id=None):
+    """
+    Stream numbered chunks of documents after `after_id` from DEV into the queue, then signal every
+    writer to stop.
+    """
+    dev_pool = get_pool(dev_db_name())
+    dev_conn = None
+    try:
+        dev_conn = await asyncio.to_thread(dev_pool.getconn)
+        records = stream_new_records(dev_conn, itersize=batch_size, after_id=after_id,
+                                     max_value_bytes=LARGE_VALUE_BYTES)
+        chunks = timed_iter(iter_batches(records, batch_size, batch_bytes), "extract", table="documents")
+        seq = 0
+        while not failed.is_set():
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            stats["extracted"] += len(chunk)
+            await queue.put((seq, chunk))
+            seq += 1
+        await asyncio.to_thread(chunks.close)
+    except Exception:
+        failed.set()
+        raise
+    finally:
+        if dev_conn is not None:
+            await asyncio.to_thread(dev_pool.putconn, dev_conn)
+        for _ in range(writers):
+            await queue.put(None)
+
+async def write_chunks(queue, failed, stats, validator, progress):
+    """Upsert chunks from the queue into PROD until the reader signals the end of the stream."""
+    prod_pool = get_pool(prod_db_name())
+    prod_conn = None
+    dev_pool = get_pool(dev_db_name())
+    # Only borrowed once a chunk holds values that have to be streamed from DEV
+    dev_conn = None
+    error = None
+    try:
+        try:
+            prod_conn = await asyncio.to_thread(prod_pool.getconn)
+        except Exception as e:
+            # Without a connection this writer only drains the queue, so that the reader is not left blocked
+            error = e
+            failed.set()
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            # After a failure, keep draining the queue so that the reader is never left blocked
+            if failed.is_set():
+                continue
+            seq, chunk = item
+            last_key = chunk[-1][0]
+            try:
+                if dev_conn is None and any(has_large_values(record) for record in chunk):
+                    dev_conn = await asyncio.to_thread(dev_pool.getconn)
+                checkpoint = partial(save_progress, progress=progress, seq=seq, last_key=last_key)
+                updated, skipped, quarantined, inserted = await asyncio.to_thread(
+                    transfer_batch, prod_conn, chunk, validator, checkpoint, dev_conn
+                )
+            except Exception as e:
+                error = e
+                failed.set()
+                continue
+            progress.complete(seq, last_key)
+            stats["updated"] += updated
+            stats["skipped"] += skipped
+            stats["quarantined"] += quarantined
+            stats["inserted"] += inserted
+    finally:
+        if prod_conn is not None:
+            await asyncio.to_thread(prod_pool.putconn, prod_conn)
+        if dev_conn is not None:
+            await asyncio.to_thread(dev_pool.putconn, dev_conn)
+    if error is not None:
+        raise error
+
+async def run_pipeline(batch_size=DEFAULT_BATCH_SIZE, queue_size=DEFAULT_QUEUE_SIZE, writers=DEFAULT_WRITERS,
+                       batch_bytes=DEFAULT_BATCH_BYTES):
+    queue = asyncio.Queue(maxsize=queue_size)
+    failed = asyncio.Event()
+    stats = {"extracted": 0, "updated": 0, "skipped": 0, "quarantined": 0, "inserted": 0}
+    # Shared by all writers, so that titles are checked across the whole stream
+    validator = UniqueConflictValidator()
+    with connection(prod_db_name()) as prod_conn:
+        await asyncio.to_thread(ensure_quarantine_table, prod_conn)
+        await asyncio.to_thread(ensure_large_value_table, prod_conn)
+        await asyncio.to_thread(ensure_checkpoint_table, prod_conn)
+        checkpoint = await asyncio.to_thread(get_checkpoint, prod_conn, CHECKPOINT_NAME)
+    after_id = None
+    if checkpoint is not None and checkpoint["last_key"] is not None:
+        after_id = int(checkpoint["last_key"])
+        logging.info(f"Resuming the transfer of 'documents' after id {after_id}.")
+    progress = ChunkProgress(after_id)
+
+    results = await asyncio.gather(
+        read_chunks(queue, failed, stats, batch_size, batch_bytes, writers, after_id),
+        *(write_chunks(queue, failed, stats, validator, progress) for _ in range(writers)),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+    # Every chunk was written
+    with connection(prod_db_name()) as prod_conn:
+        await asyncio.to_thread(clear_checkpoints, prod_conn, CHECKPOINT_NAME)
+    return stats
+
+def async_transfer_data(batch_size=DEFAULT_BATCH_SIZE, queue_size=DEFAULT_QUEUE_SIZE, writers=DEFAULT_WRITERS):
+    """Transfer documents from DEV to PROD with overlapped reads and writes. Returns the transfer stats."""
+    stats = asyncio.run(run_pipeline(batch_size, queue_size, writers))
+    logging.info(f"Number of records extracted from DEV 'documents' table: {stats['extracted']}")
+    logging.info(f"Number of records updated in PROD 'documents' table: {stats['updated']}")
+    logging.info(f"Number of records skipped due to unique constraint violations: {stats['skipped']}")
+    logging.info(f"Number of records quarantined due to rule violations or title conflicts: {stats['quarantined']}")
+    return stats
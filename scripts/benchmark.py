@@ -0,0 +1,176 @@
+"""
+# benchmark.py
+
+## Purpose:
+This script runs the transfer modes end to end against synthetic datasets and records how fast they are,
+so that performance regressions can be compared between commits.
+
+## Usage:
+    python3 scripts/benchmark.py --scale 100
+    python3 scripts/benchmark.py --scale 1000 --modes upsert copy --output /tmp/results.json
+
+## Details:
+- Before each mode, DEV and PROD are reseeded with the same dataset from `generate_synthetic_data.py`,
+  so every mode starts from an identical state.
+- Each transfer runs `data_transfer.py` in a child process, which isolates its memory usage and lets the
+  benchmark read the child's peak RSS.
+- For every mode the report contains rows/s, MB/s, peak RSS and the timings of each stage
+  (`seed_dev`, `seed_prod`, `transfer`, `verify`).
+- Results are saved as JSON together with the git commit, the dataset configuration and a timestamp,
+  by default into `benchmarks/results/<timestamp>.json`.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from db import close_all_pools, connection, dev_db_name, prod_db_name
+from generate_synthetic_data import DEFAULT_CONFIG, generate_rows
+from insert_sample_data import insert_data
+from schema import load_table_specs
+
+load_dotenv()
+
+BENCHMARK_MODES = ("upsert", "copy", "bulk", "diff", "parallel", "async")
+
+# Modes that sync every table; the other modes only transfer documents
+ALL_TABLE_MODES = ("copy", "bulk", "parallel")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(SCRIPT_DIR, '..', 'benchmarks', 'results')
+
+@contextmanager
+def stage(timings, name):
+    """Record the wall-clock duration of the block under `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(time.perf_counter() - start, 3)
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def transferred_tables(mode, table_names=None):
+    """Return the tables `mode` transfers, out of `table_names` or, by default, every DEV table."""
+    if mode in ALL_TABLE_MODES:
+        if table_names is None:
+            with connection(dev_db_name()) as conn:
+                table_names = [spec.name for spec in load_table_specs(conn)]
+        return list(table_names)
+    return ["documents"]
+
+def measure_tables(db_name, tables):
+    """Return (rows, bytes) of the given tables, with bytes measured as the stored size of each row."""
+    rows = 0
+    size = 0
+    with connection(db_name) as conn:
+        with conn.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(pg_column_size(t.*)), 0) FROM {table} t;")
+                table_rows, table_size = cursor.fetchone()
+                rows += table_rows
+                size += table_size
+        conn.commit()
+    return rows, size
+
+def run_transfer(mode):
+    """Run `data_transfer.py` in a child process. Returns (exit_code, peak_rss_kb)."""
+    process = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIR, "data_transfer.py"), "--mode", mode])
+    # wait4 reports the resource usage of this child alone; ru_maxrss is in kilobytes on Linux
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage.ru_maxrss
+
+def benchmark_mode(mode, config):
+    timings = {}
+    print(f"Benchmarking '{mode}' mode...")
+
+    with stage(timings, "seed_dev"):
+        insert_data(dev_db_name(), generate_rows(config, "dev"))
+    with stage(timings, "seed_prod"):
+        insert_data(prod_db_name(), generate_rows(config, "prod"))
+
+    tables = transferred_tables(mode)
+    source_rows, source_bytes = measure_tables(dev_db_name(), tables)
+
+    with stage(timings, "transfer"):
+        exit_code, peak_rss_kb = run_transfer(mode)
+
+    with stage(timings, "verify"):
+        target_rows, _ = measure_tables(prod_db_name(), tables)
+
+    duration = timings["transfer"] or 1e-9
+    result = {
+        "mode": mode,
+        "exit_code": exit_code,
+        "tables": tables,
+        "source_rows": source_rows,
+        "source_bytes": source_bytes,
+        "target_rows": target_rows,
+        "rows_per_second": round(source_rows / duration, 1),
+        "mb_per_second": round(source_bytes / (1024 * 1024) / duration, 3),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+        "stages": timings,
+    }
+    print(f"  {result['rows_per_second']} rows/s, {result['mb_per_second']} MB/s, "
+          f"peak RSS {result['peak_rss_mb']} MB, transfer took {timings['transfer']}s.")
+    return result
+
+def save_results(report, output=None):
+    if output is None:
+        output = os.path.join(RESULTS_DIR, f"{report['timestamp'].replace(':', '-')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=4)
+    return output
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the transfer modes against synthetic data.")
+    parser.add_argument("--scale", type=float, default=DEFAULT_CONFIG.scale,
+                        help="Scale factor of the synthetic dataset; 1 means 1,000 documents.")
+    parser.add_argument("--content-size", type=int, default=DEFAULT_CONFIG.content_size)
+    parser.add_argument("--change-rate", type=float, default=DEFAULT_CONFIG.change_rate)
+    parser.add_argument("--title-collision-rate", type=float, default=DEFAULT_CONFIG.title_collision_rate)
+    parser.add_argument("--seed", type=int, default=DEFAULT_CONFIG.seed)
+    parser.add_argument("--modes", nargs="+", choices=BENCHMARK_MODES, default=list(BENCHMARK_MODES))
+    parser.add_argument("--output", help="Where to write the JSON report (default: benchmarks/results/).")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    config = DEFAULT_CONFIG._replace(
+        scale=args.scale,
+        content_size=args.content_size,
+        change_rate=args.change_rate,
+        title_collision_rate=args.title_collision_rate,
+        seed=args.seed,
+    )
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": config._asdict(),
+        "results": [],
+    }
+    try:
+        for mode in args.modes:
+            report["results"].append(benchmark_mode(mode, config))
+    finally:
+        close_all_pools()
+
+    output = save_results(report, args.output)
+    print(f"Benchmark results written to {output}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+# bulk_load.py
+
+## Purpose:
+This script bulk loads every table from the DEV database into the PROD database with index maintenance
+and foreign key checks taken off the per-row path, for large initial loads and full resyncs.
+
+## Usage:
+This script is invoked within `data_transfer.py` (`--mode bulk`) and is not typically run directly by the user.
+
+## Details:
+- Secondary indexes of the loaded tables (such as `idx_documents_title` and `idx_images_url`) are dropped,
+  and foreign keys are made `DEFERRABLE` and checked once at commit with `SET CONSTRAINTS ALL DEFERRED`.
+- The data is loaded with the COPY path of `copy_transfer.py`, in a single transaction with
+  `synchronous_commit=off` and a larger `maintenance_work_mem`.
+- Before committing, the loaded data is checked against every dropped unique index. If any values are
+  duplicated the whole load is rolled back, which also restores the dropped indexes.
+- The unique indexes are rebuilt inside the load transaction, so they are enforced again the moment the
+  load commits and no write can slip a duplicate in between. The loaded tables are locked by the dropped
+  indexes until the commit anyway, so building them there blocks nothing more.
+- After the commit, the other indexes are rebuilt with `CREATE INDEX CONCURRENTLY`, so PROD stays readable
+  and writable while they build. Their definitions are kept in the PROD `pending_indexes` table until they
+  are rebuilt, so an interrupted rebuild is completed by the next bulk load.
+"""
+
+import logging
+import os
+from collections import namedtuple
+from dotenv import load_dotenv
+from copy_transfer import DEFAULT_BUFFER_CHUNKS, copy_table
+from db import connection, dev_db_name, prod_db_name
+from metrics import stage_timer
+from schema import load_table_specs
+
+load_dotenv()
+
+# Memory available to each index build on PROD
+MAINTENANCE_WORK_MEM = os.getenv("BULK_LOAD_MAINTENANCE_WORK_MEM", "1GB")
+
+# Number of duplicated values reported when the uniqueness check fails
+DUPLICATE_SAMPLE_SIZE = 10
+
+# definition: the `CREATE INDEX` statement returned by pg_get_indexdef
+IndexSpec = namedtuple("IndexSpec", ["name", "table", "columns", "unique", "definition"])
+
+class UniquenessError(Exception):
+    """Raised when loaded data would violate a unique index that was dropped for the load."""
+
+def get_secondary_indexes(conn, table_names, schema_name="public"):
+    """
+    Return the IndexSpecs of the plain-column secondary indexes of the given tables.
+
+    Primary keys, indexes backing a constraint, and partial or expression indexes are left alone.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT ic.relname, c.relname, i.indisunique, pg_get_indexdef(i.indexrelid),
+                   array_agg(a.attname ORDER BY k.ordinality)
+            FROM pg_index i
+            JOIN pg_class ic ON ic.oid = i.indexrelid
+            JOIN pg_class c ON c.oid = i.indrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ordinality)
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+            WHERE n.nspname = %s AND c.relname = ANY(%s)
+              AND NOT i.indisprimary AND i.indpred IS NULL AND i.indexprs IS NULL
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint con WHERE con.conindid = i.indexrelid)
+            GROUP BY ic.relname, c.relname, i.indisunique, i.indexrelid
+            ORDER BY c.relname, ic.relname;
+        """, (schema_name, list(table_names)))
+        return [
+            IndexSpec(name=name, table=table, columns=tuple(columns), unique=unique, definition=definition)
+            for name, table, unique, definition, columns in cursor.fetchall()
+        ]
+
+def make_foreign_keys_deferrable(conn, table_names, schema_name="public"):
+    """Mark the foreign keys of the given tables DEFERRABLE, so that they can be checked at commit."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname, f.conname
+            FROM pg_constraint f
+            JOIN pg_class c ON c.oid = f.conrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relname = ANY(%s) AND f.contype = 'f' AND NOT f.condeferrable;
+        """, (schema_name, list(table_names)))
+        for table, constraint in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {table} ALTER CONSTRAINT {constraint} DEFERRABLE INITIALLY IMMEDIATE;")
+            logging.info(f"Made foreign key '{constraint}' on '{table}' deferrable.")
+    conn.commit()
+
+def ensure_pending_index_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pending_indexes (
+                index_name VARCHAR(255) PRIMARY KEY,
+                table_name VARCHAR(255) NOT NULL,
+                definition TEXT NOT NULL,
+                dropped_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+    conn.commit()
+
+def drop_indexes(cursor, indexes):
+    """Drop the indexes inside the current transaction, remembering their definitions for the rebuild."""
+    for index in indexes:
+        cursor.execute("""
+            INSERT INTO pending_indexes (index_name, table_name, definition)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (index_name) DO UPDATE SET definition = EXCLUDED.definition;
+        """, (index.name, index.table, index.definition))
+        cursor.execute(f"DROP INDEX {index.name};")
+        logging.info(f"Dropped index '{index.name}' on '{index.table}' for the bulk load.")
+
+def find_duplicates(cursor, index, limit=DUPLICATE_SAMPLE_SIZE):
+    """Return up to `limit` values that appear more than once in the columns of a unique index."""
+    columns = ", ".join(index.columns)
+    # NULLs never conflict in a unique index
+    not_null = " AND ".join(f"{column} IS NOT NULL" for column in index.columns)
+    cursor.execute(f"""
+        SELECT {columns}
+        FROM {index.table}
+        WHERE {not_null}
+        GROUP BY {columns}
+        HAVING count(*) > 1
+        LIMIT %s;
+    """, (limit,))
+    return cursor.fetchall()
+
+def check_uniqueness(cursor, indexes):
+    """Raise UniquenessError if the data violates any of the given (dropped) unique indexes."""
+    for index in indexes:
+        if not index.unique:
+            continue
+        with stage_timer("validate", table=index.table):
+            duplicates = find_duplicates(cursor, index)
+        if duplicates:
+            raise UniquenessError(
+                f"Duplicate values for unique index '{index.name}' on '{index.table}' "
+                f"({', '.join(index.columns)}): {duplicates}"
+            )
+
+def rebuild_unique_indexes(cursor, indexes):
+    """Rebuild the given (dropped) unique indexes inside the current transaction. Returns how many were built."""
+    rebuilt = 0
+    for index in indexes:
+        if not index.unique:
+            continue
+        logging.info(f"Rebuilding unique index '{index.name}' on '{index.table}' before the commit.")
+        with stage_timer("index", table=index.table):
+            cursor.execute(index.definition)
+        cursor.execute("DELETE FROM pending_indexes WHERE index_name = %s;", (index.name,))
+        rebuilt += 1
+    return rebuilt
+
+def rebuild_pending_indexes(prod_conn):
+    """
+    Rebuild every index recorded in `pending_indexes` with CREATE INDEX CONCURRENTLY.
+    An index left invalid by an interrupted build is dropped and built again.
+    """
+    with prod_conn.cursor() as cursor:
+        cursor.execute("SELECT index_name, table_name, definition FROM pending_indexes ORDER BY table_name, index_name;")
+        pending = cursor.fetchall()
+    prod_conn.commit()
+    if not pending:
+        return 0
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    autocommit = prod_conn.autocommit
+    prod_conn.autocommit = True
+    try:
+        with prod_conn.cursor() as cursor:
+            for index_name, table_name, definition in pending:
+                cursor.execute("""
+                    SELECT i.indisvalid
+                    FROM pg_class c
+                    JOIN pg_index i ON i.indexrelid = c.oid
+                    WHERE c.relname = %s;
+                """, (index_name,))
+                row = cursor.fetchone()
+                if row is not None and not row[0]:
+                    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};")
+                if row is None or not row[0]:
+                    logging.info(f"Rebuilding index '{index_name}' on '{table_name}' concurrently.")
+                    with stage_timer("index", table=table_name):
+                        cursor.execute(definition.replace(" INDEX ", " INDEX CONCURRENTLY ", 1))
+                cursor.execute("DELETE FROM pending_indexes WHERE index_name = %s;", (index_name,))
+    finally:
+        prod_conn.autocommit = autocommit
+    return len(pending)
+
+def bulk_load_data(buffer_chunks=DEFAULT_BUFFER_CHUNKS, table_specs=None, maintenance_work_mem=MAINTENANCE_WORK_MEM):
+    """
+    Bulk load every table from DEV into PROD with secondary indexes dropped and foreign keys deferred.
+    When `table_specs` is omitted, the tables are read from the DEV schema.
+    Returns {table: (merged_records, skipped_records)}.
+    """
+    results = {}
+    with connection(dev_db_name()) as dev_conn, connection(prod_db_name()) as prod_conn:
+        if table_specs is None:
+            table_specs = load_table_specs(dev_conn)
+        table_names = [spec.name for spec in table_specs]
+
+        ensure_pending_index_table(prod_conn)
+        # Finish the rebuild of an earlier bulk load that was interrupted
+        rebuilt = rebuild_pending_indexes(prod_conn)
+        if rebuilt:
+            logging.info(f"Rebuilt {rebuilt} indexes left over from an interrupted bulk load.")
+        make_foreign_keys_deferrable(prod_conn, table_names)
+        indexes = get_secondary_indexes(prod_conn, table_names)
+        prod_conn.commit()
+
+        with prod_conn.cursor() as cursor:
+            cursor.execute("SET maintenance_work_mem = %s;", (maintenance_work_mem,))
+            cursor.execute("SET synchronous_commit = off;")
+        prod_conn.commit()
+
+        try:
+            with prod_conn.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL DEFERRED;")
+                drop_indexes(cursor, indexes)
+
+            for spec in table_specs:
+                merged_records, skipped_records = copy_table(dev_conn, prod_conn, spec, buffer_chunks, commit=False)
+                results[spec.name] = (merged_records, skipped_records)
+                logging.info(f"Bulk loaded {merged_records} records into PROD '{spec.name}' table "
+                             f"({skipped_records} skipped due to conflicts or missing parents).")
+
+            with prod_conn.cursor() as cursor:
+                # Never commit data that the rebuilt unique indexes would reject
+                check_uniqueness(cursor, indexes)
+                rebuilt_unique = rebuild_unique_indexes(cursor, indexes)
+            # Deferred foreign keys are checked here
+            with stage_timer("commit"):
+                prod_conn.commit()
+        except Exception:
+            prod_conn.rollback()
+            logging.error("Bulk load rolled back; the dropped indexes have been restored.")
+            raise
+
+        with prod_conn.cursor() as cursor:
+            for spec in table_specs:
+                cursor.execute(f"ANALYZE {spec.name};")
+        prod_conn.commit()
+
+        rebuilt = rebuild_pending_indexes(prod_conn)
+        logging.info(f"Rebuilt {rebuilt_unique} unique indexes before and {rebuilt} indexes concurrently after "
+                     f"the bulk load.")
+
+    return results
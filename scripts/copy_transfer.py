@@ -0,0 +1,284 @@
+"""
+# copy_transfer.py
+
+## Purpose:
+This script bulk loads data from the DEV database into the PROD database using PostgreSQL's COPY protocol.
+It is intended for large initial loads and full resyncs, where row-by-row or batched INSERTs are too slow.
+
+## Usage:
+This script is invoked within `data_transfer.py` (`--mode copy`) and is not typically run directly by the user.
+
+## Details:
+- Streams each table out of DEV with `COPY ... TO STDOUT` and into an unlogged PROD staging table with
+  `COPY ... FROM STDIN`. Both sides are connected through a bounded in-memory buffer, so the dataset never
+  has to fit in Python memory.
+- Merges the staging table into the target table with a single set-based `INSERT ... SELECT ... ON CONFLICT`.
+- Rows that would violate a unique index or reference a missing parent row in PROD are skipped.
+- Tables are read from the DEV schema and processed in foreign key dependency order.
+"""
+
+import logging
+import os
+import queue
+import threading
+from dotenv import load_dotenv
+from db import connection, dev_db_name, prod_db_name
+from metrics import increment, stage_timer
+from schema import load_table_specs
+
+load_dotenv()
+
+# Maximum number of COPY chunks held in memory between DEV and PROD
+DEFAULT_BUFFER_CHUNKS = int(os.getenv("COPY_BUFFER_CHUNKS", "1024"))
+
+# How long a blocked producer waits before re-checking whether the consumer gave up
+_PUT_TIMEOUT = 0.5
+
+class BoundedBuffer:
+    """
+    A file-like pipe between a `COPY ... TO STDOUT` and a `COPY ... FROM STDIN`.
+
+    The DEV side calls `write()` and the PROD side calls `read()`. At most `max_chunks` chunks are
+    buffered, so a fast producer blocks until the consumer catches up.
+    """
+
+    def __init__(self, max_chunks=DEFAULT_BUFFER_CHUNKS):
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._pending = b""
+        self._eof = False
+        self.bytes_written = 0
+        self._aborted = threading.Event()
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        while not self._aborted.is_set():
+            try:
+                self._queue.put(data, timeout=_PUT_TIMEOUT)
+                self.bytes_written += len(data)
+                return len(data)
+            except queue.Full:
+                continue
+        raise IOError("COPY consumer aborted")
+
+    def read(self, size=-1):
+        while not self._pending and not self._eof:
+            chunk = self._queue.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._pending = chunk
+        if size is None or size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    # Called by the producer once all data has been written
+    def close(self):
+        while not self._aborted.is_set():
+            try:
+                self._queue.put(None, timeout=_PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    # Called by the consumer when it fails, so that a blocked producer can exit
+    def abort(self):
+        self._aborted.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+def stream_copy(dev_conn, prod_conn, source_sql, target_sql, buffer_chunks=DEFAULT_BUFFER_CHUNKS):
+    """
+    Pipe the output of `source_sql` on DEV into `target_sql` on PROD through a bounded buffer.
+    Returns a tuple of (copied_rows, copied_bytes).
+    """
+    pipe = BoundedBuffer(buffer_chunks)
+    errors = []
+
+    def produce():
+        try:
+            with dev_conn.cursor() as cursor:
+                cursor.copy_expert(source_sql, pipe)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            pipe.close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        with prod_conn.cursor() as cursor:
+            cursor.copy_expert(target_sql, pipe)
+            copied_rows = cursor.rowcount
+    except Exception:
+        pipe.abort()
+        raise
+    finally:
+        producer.join()
+
+    if errors:
+        raise errors[0]
+    return copied_rows, pipe.bytes_written
+
+def staging_table_name(spec):
+    return f"staging_{spec.name}"
+
+def prepare_staging_table(prod_conn, spec):
+    """Create (if needed) and empty the unlogged staging table for the given table."""
+    staging = staging_table_name(spec)
+    with prod_conn.cursor() as cursor:
+        cursor.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {staging} (LIKE {spec.name} INCLUDING DEFAULTS);")
+        cursor.execute(f"TRUNCATE {staging};")
+    return staging
+
+def merge_conditions(spec):
+    """
+    Return the (condition, reason) pairs that a staging row `s` must meet to be merged: its unique values
+    are not used by a different PROD row, and its foreign keys point to existing PROD rows.
+    """
+    conditions = []
+    for column in spec.unique:
+        key_mismatch = " OR ".join(f"p.{k} <> s.{k}" for k in spec.key)
+        conditions.append((
+            f"NOT EXISTS (SELECT 1 FROM {spec.name} p WHERE p.{column} = s.{column} AND ({key_mismatch}))",
+            f"{column} is already used by another PROD record",
+        ))
+    for column, parent, parent_column in spec.references:
+        conditions.append((
+            f"(s.{column} IS NULL OR EXISTS (SELECT 1 FROM {parent} r WHERE r.{parent_column} = s.{column}))",
+            f"{column} references a missing {parent}.{parent_column}",
+        ))
+    return conditions
+
+def build_merge_sql(spec, staging):
+    """
+    Build the set-based `INSERT ... SELECT ... ON CONFLICT` that merges a staging table into its target.
+
+    Rows whose unique columns collide with a different PROD row, or whose foreign keys point to
+    rows missing from PROD, are filtered out instead of aborting the whole merge.
+    """
+    columns = ", ".join(spec.columns)
+    source_columns = ", ".join(f"s.{column}" for column in spec.columns)
+    key = ", ".join(spec.key)
+
+    conditions = [condition for condition, _ in merge_conditions(spec)]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # Keep a single row per unique value inside the staging table itself
+    distinct = ""
+    order_by = ""
+    if spec.unique:
+        unique_columns = ", ".join(f"s.{column}" for column in spec.unique)
+        distinct = f"DISTINCT ON ({unique_columns})"
+        order_by = f"ORDER BY {unique_columns}, {', '.join(f's.{k}' for k in spec.key)}"
+
+    non_key_columns = [column for column in spec.columns if column not in spec.key]
+    if non_key_columns:
+        updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in non_key_columns)
+        on_conflict = f"ON CONFLICT ({key}) DO UPDATE SET {updates}"
+    else:
+        on_conflict = f"ON CONFLICT ({key}) DO NOTHING"
+
+    return f"""
+        INSERT INTO {spec.name} ({columns})
+        SELECT {distinct} {source_columns}
+        FROM {staging} s
+        {where}
+        {order_by}
+        {on_conflict};
+    """
+
+def dropped_rows_sql(spec, staging):
+    """
+    Build the query returning the staging rows that `build_merge_sql` would leave out, as the transferred
+    columns followed by the reason. It must run before the merge, which it mirrors: rows failing a merge
+    condition, and rows sharing their unique values with a lower key of the staging table.
+    Returns None for tables whose merge never leaves rows out.
+    """
+    conditions = merge_conditions(spec)
+    if not conditions:
+        return None
+    source_columns = ", ".join(f"s.{column}" for column in spec.columns)
+    columns = ", ".join(spec.columns)
+    reasons = " ".join(f"WHEN NOT ({condition}) THEN '{reason}'" for condition, reason in conditions)
+    query = f"""
+        SELECT {columns}, reason FROM (
+            SELECT {source_columns}, CASE {reasons} END AS reason
+            FROM {staging} s
+        ) failed
+        WHERE reason IS NOT NULL
+    """
+    if spec.unique:
+        unique_columns = ", ".join(f"s.{column}" for column in spec.unique)
+        key_columns = ", ".join(f"s.{k}" for k in spec.key)
+        reason = f"{', '.join(spec.unique)} duplicates another incoming record"
+        query += f"""
+        UNION ALL
+        SELECT {columns}, '{reason}' FROM (
+            SELECT {source_columns},
+                   row_number() OVER (PARTITION BY {unique_columns} ORDER BY {key_columns}) AS duplicate
+            FROM {staging} s
+            WHERE {' AND '.join(condition for condition, _ in conditions)}
+        ) merged
+        WHERE duplicate > 1
+    """
+    return query
+
+def copy_table(dev_conn, prod_conn, spec, buffer_chunks=DEFAULT_BUFFER_CHUNKS, commit=True):
+    """
+    Bulk load one table from DEV into PROD through its staging table.
+    With `commit=False` the merge is left in the open PROD transaction, for loads that span several tables.
+    Returns a tuple of (merged_records, skipped_records).
+    """
+    columns = ", ".join(spec.columns)
+    try:
+        staging = prepare_staging_table(prod_conn, spec)
+        with stage_timer("copy", table=spec.name):
+            staged_records, staged_bytes = stream_copy(
+                dev_conn,
+                prod_conn,
+                f"COPY (SELECT {columns} FROM {spec.name}) TO STDOUT",
+                f"COPY {staging} ({columns}) FROM STDIN",
+                buffer_chunks,
+            )
+        dev_conn.commit()
+
+        with prod_conn.cursor() as cursor:
+            with stage_timer("merge", table=spec.name):
+                cursor.execute(build_merge_sql(spec, staging))
+            merged_records = cursor.rowcount
+            cursor.execute(f"TRUNCATE {staging};")
+        if commit:
+            with stage_timer("commit", table=spec.name):
+                prod_conn.commit()
+    except Exception:
+        dev_conn.rollback()
+        prod_conn.rollback()
+        raise
+
+    increment("rows_total", staged_records, table=spec.name, result="extracted")
+    increment("bytes_total", staged_bytes, table=spec.name, result="extracted")
+    increment("rows_total", merged_records, table=spec.name, result="updated")
+    increment("rows_total", staged_records - merged_records, table=spec.name, result="skipped")
+    return merged_records, staged_records - merged_records
+
+def copy_transfer_data(buffer_chunks=DEFAULT_BUFFER_CHUNKS, table_specs=None):
+    """
+    Bulk load every table from DEV into PROD. Returns {table: (merged_records, skipped_records)}.
+    When `table_specs` is omitted, the tables are read from the DEV schema.
+    """
+    results = {}
+    with connection(dev_db_name()) as dev_conn, connection(prod_db_name()) as prod_conn:
+        if table_specs is None:
+            table_specs = load_table_specs(dev_conn)
+        for spec in table_specs:
+            merged_records, skipped_records = copy_table(dev_conn, prod_conn, spec, buffer_chunks)
+            results[spec.name] = (merged_records, skipped_records)
+            logging.info(f"Bulk loaded {merged_records} records into PROD '{spec.name}' table "
+                         f"({skipped_records} skipped due to conflicts or missing parents).")
+
+    return results
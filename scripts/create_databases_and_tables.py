@@ -6,122 +6,196 @@ This script creates the necessary databases and tables in both the DEV and PROD
 
 ## Usage:
     python3 scripts/create_databases_and_tables.py
+    python3 scripts/create_databases_and_tables.py --databases preview_1 preview_2 preview_3 --template app_template
+
+## Details:
+- Without arguments, the DEV and PROD databases named in `.env` are provisioned.
+- Several databases are provisioned in parallel, each on its own connection.
+- The schema is applied as one idempotent script, in a single transaction and round trip, so a
+  database is never left with half of the tables. Applying it again to an existing database only adds
+  what is missing.
+- With `--template`, the template database is provisioned first, and every database that does not exist
+  yet is cloned from it with `CREATE DATABASE ... TEMPLATE`, which copies the files instead of rerunning
+  the DDL. Cloning requires that nothing else is connected to the template.
+- Errors are reported and make the script exit with a non-zero status.
 """
 
-import os
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from dotenv import load_dotenv
+from db import connect, dev_db_name, prod_db_name
 
 # Load environment variables from a .env file
 load_dotenv()
 
-# Connect to the PostgreSQL server
-def connect_to_server(dbname):
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            dbname=dbname,
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            port=os.getenv("DB_PORT")
-        )
-        return conn
-    except Exception as e:
-        print(f"Error connecting to the database '{dbname}': {e}")
-        return None
-
-# Creates a database
-def create_database(conn, db_name):
-    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-    with conn.cursor() as cursor:
-        try:
-            cursor.execute(f"CREATE DATABASE {db_name};")
-            print(f"Database '{db_name}' created successfully.")
-        except Exception as e:
-            print(f"Error creating database '{db_name}': {e}")
-
-# Creates tables in the given database
-def create_tables(conn):
+# Database used to issue CREATE DATABASE
+MAINTENANCE_DB = "postgres"
+
+# Number of databases provisioned at the same time
+DEFAULT_WORKERS = 8
+
+# Tables that carry a trigger-maintained `updated_at` column for incremental sync
+CHANGE_TRACKED_TABLES = ["categories", "companies", "documents", "images", "companies_categories"]
+
+# Key of the advisory lock that serializes concurrent schema applications to the same database
+SCHEMA_LOCK_KEY = 7201
+
+TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS categories (
+    id SERIAL PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS companies (
+    id SERIAL PRIMARY KEY,
+    category_id INTEGER REFERENCES categories(id) ON DELETE SET NULL DEFERRABLE,
+    site_url VARCHAR(255),
+    title VARCHAR(255) NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS documents (
+    id SERIAL PRIMARY KEY,
+    company_id INTEGER REFERENCES companies(id) ON DELETE CASCADE DEFERRABLE,
+    title VARCHAR(255) NOT NULL,
+    content TEXT
+);
+
+CREATE TABLE IF NOT EXISTS images (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE DEFERRABLE,
+    image_url VARCHAR(255) NOT NULL,
+    description TEXT
+);
+
+-- Joining table for companies and categories (many-to-many relationship)
+CREATE TABLE IF NOT EXISTS companies_categories (
+    company_id INTEGER REFERENCES companies(id) ON DELETE CASCADE DEFERRABLE,
+    category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE DEFERRABLE,
+    PRIMARY KEY (company_id, category_id)
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_title ON documents(title);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_images_url ON images(image_url);
+"""
+
+def change_tracking_sql(tables=CHANGE_TRACKED_TABLES):
+    """Return the SQL adding the `updated_at` column, its index and the trigger that maintains it."""
+    statements = ["""
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""]
+    for table in tables:
+        statements.append(f"""
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_{table}_updated_at ON {table}(updated_at);
+DROP TRIGGER IF EXISTS trg_{table}_updated_at ON {table};
+CREATE TRIGGER trg_{table}_updated_at
+BEFORE INSERT OR UPDATE ON {table}
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+""")
+    return "".join(statements)
+
+# The whole schema, applied in one transaction
+SCHEMA_SQL = f"SELECT pg_advisory_xact_lock({SCHEMA_LOCK_KEY});\n" + TABLES_SQL + change_tracking_sql()
+
+def database_exists(cursor, db_name):
+    cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (db_name,))
+    return cursor.fetchone() is not None
+
+# Creates a database, optionally as a copy of `template`. Returns False if it already existed
+def create_database(db_name, template=None):
+    conn = connect(MAINTENANCE_DB)
     try:
+        # CREATE DATABASE cannot run inside a transaction block
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
         with conn.cursor() as cursor:
-            # Create the categories table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS categories (
-                    id SERIAL PRIMARY KEY,
-                    title VARCHAR(255) NOT NULL,
-                    description TEXT
-                );
-            """)
-
-            # Create the companies table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS companies (
-                    id SERIAL PRIMARY KEY,
-                    category_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
-                    site_url VARCHAR(255),
-                    title VARCHAR(255) NOT NULL,
-                    description TEXT
-                );
-            """)
-
-            # Create the documents table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS documents (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER REFERENCES companies(id) ON DELETE CASCADE,
-                    title VARCHAR(255) NOT NULL,
-                    content TEXT
-                );
-            """)
-
-            # Create the images table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS images (
-                    id SERIAL PRIMARY KEY,
-                    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
-                    image_url VARCHAR(255) NOT NULL,
-                    description TEXT
-                );
-            """)
-
-            # Create the joining table for companies and categories (many-to-many relationship)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS companies_categories (
-                    company_id INTEGER REFERENCES companies(id) ON DELETE CASCADE,
-                    category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
-                    PRIMARY KEY (company_id, category_id)
-                );
-            """)
-
-            # Example: Creating a unique index on the title of documents
-            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_title ON documents(title);")
-
-            # Example: Creating a unique index on the URL of images
-            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_images_url ON images(image_url);")
-
-            print("Tables created successfully.")
-    except Exception as e:
-        conn.rollback()  # Rollback transaction if error occurs
-        print(f"Error creating tables: {e}")
+            if database_exists(cursor, db_name):
+                return False
+            try:
+                if template is None:
+                    cursor.execute(f"CREATE DATABASE {db_name};")
+                else:
+                    cursor.execute(f"CREATE DATABASE {db_name} TEMPLATE {template};")
+            except psycopg2.errors.DuplicateDatabase:
+                # Created by a concurrent provisioning run in the meantime
+                return False
+        return True
     finally:
+        conn.close()
+
+# Creates the tables in the given database, or completes them if some already exist
+def apply_schema(db_name):
+    conn = connect(db_name)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(SCHEMA_SQL)
         conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def provision_database(db_name, template=None):
+    """Create a database with the schema, cloned from `template` when given. Returns a status message."""
+    if create_database(db_name, template):
+        if template is not None:
+            # The clone already holds the schema of the template
+            return f"Database '{db_name}' cloned from template '{template}'."
+        apply_schema(db_name)
+        return f"Database '{db_name}' created successfully."
+    apply_schema(db_name)
+    return f"Database '{db_name}' already exists; schema is up to date."
+
+def provision_databases(db_names, template=None, workers=DEFAULT_WORKERS):
+    """
+    Provision the given databases in parallel, cloning them from `template` when given. The template is
+    provisioned first. Every database is attempted; the first error is raised once all have finished.
+    """
+    if template is not None:
+        print(provision_database(template))
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(db_names)))) as executor:
+        futures = {db_name: executor.submit(provision_database, db_name, template) for db_name in db_names}
+        for db_name, future in futures.items():
+            try:
+                print(future.result())
+            except Exception as e:
+                print(f"Error provisioning database '{db_name}': {e}")
+                errors.append(e)
+    if errors:
+        raise errors[0]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create the databases and tables for the DEV and PROD environments.")
+    parser.add_argument("--databases", nargs="+",
+                        help="Databases to provision (default: the DEV and PROD databases from .env).")
+    parser.add_argument("--template",
+                        help="Provision this template database and clone the new databases from it.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Number of databases provisioned in parallel (default: {DEFAULT_WORKERS}).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    db_names = args.databases or [dev_db_name(), prod_db_name()]
+    try:
+        provision_databases(db_names, template=args.template, workers=args.workers)
+    except Exception as e:
+        print(f"Provisioning failed: {e}")
+        return 1
+    print("Tables created successfully.")
+    return 0
 
-# Connect to the default database (e.g., postgres) to create "DEV" and "PROD" databases
-default_conn = connect_to_server("postgres")
-if default_conn:
-    create_database(default_conn, os.getenv("DB_DEV_NAME"))
-    create_database(default_conn, os.getenv("DB_PROD_NAME"))
-    default_conn.close()
-
-# Connect to the DEV database and create tables
-dev_conn = connect_to_server(os.getenv("DB_DEV_NAME"))
-if dev_conn:
-    create_tables(dev_conn)
-    dev_conn.close()
-
-# Connect to the PROD database and create tables
-prod_conn = connect_to_server(os.getenv("DB_PROD_NAME"))
-if prod_conn:
-    create_tables(prod_conn)
-    prod_conn.close()
+if __name__ == "__main__":
+    sys.exit(main())
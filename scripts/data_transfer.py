@@ -7,41 +7,202 @@ This script orchestrates the data transfer process by:
 2. Validating and transferring data to the PROD database.
 3. Optionally, it can also include logging or reporting.
 
+Extraction is streamed straight into the transfer stage, so DEV is read only once per run.
+
 ## Usage:
-    python3 scripts/data_transfer.py
+    python3 scripts/data_transfer.py [--mode {upsert,copy,bulk,diff,parallel,async,fanout,daemon,plan,
+                                            snapshot,replay}]
+                                    [--incremental] [--workers N] [--range-size N] [--snapshot-dir DIR]
+                                    [--targets DB [DB ...]]
+                                    [--count-mode {exact,estimate}]
+                                    [--metrics-textfile PATH] [--metrics-report PATH]
+
+- `upsert` (default): batched upserts of new and updated documents.
+  With `--incremental`, only documents changed since the last successful run are transferred.
+  Progress is checkpointed on PROD, so an interrupted run resumes where it stopped, and connection
+  failures are retried with exponential backoff.
+  With `--count-mode estimate`, PROD record counts come from the planner statistics instead of a `COUNT(*)` scan.
+- `copy`: COPY-based bulk load of all tables through PROD staging tables, for initial loads and full resyncs.
+- `bulk`: like `copy`, but with secondary indexes dropped and foreign keys deferred during the load, and the
+  indexes rebuilt concurrently afterwards. Fastest for very large loads.
+- `diff`: compares row hashes between DEV and PROD and only transfers the documents that differ.
+- `parallel`: full multi-table sync. Reads the schema from DEV and transfers every table in foreign key order,
+  split into primary key ranges handled by a pool of workers.
+- `async`: asyncio pipeline in which a DEV reader and PROD writers overlap through a bounded queue.
+- `fanout`: transfers documents to several PROD databases (`--targets`, or `DB_PROD_TARGETS`) from a single
+  DEV read. Each target has its own writer, bounded queue, checkpoint and quarantine.
+- `daemon`: long-running sync. Catches up on the changes since the last run, then applies DEV changes to
+  PROD within seconds as they are notified by triggers, until stopped with SIGINT or SIGTERM.
+- `plan`: dry run. Reports per table how many rows would be inserted, updated, left unchanged or rejected
+  for unique conflicts, the bytes to transfer and the expected duration of each benchmarked mode,
+  without writing to PROD.
+- `snapshot`: dumps every DEV table into compressed chunk files with a manifest in `--snapshot-dir`.
+- `replay`: loads a snapshot from `--snapshot-dir` into PROD, without reading DEV. One snapshot can be
+  replayed into several PROD databases, or again after a failed run.
+
+Every run records per-stage timings, row and byte counters and batch latencies (see `metrics.py`).
+With `--metrics-textfile` they are written in the Prometheus text format, and with `--metrics-report`
+as a JSON run report. In daemon mode they are written after every applied set of changes.
 """
 
+import argparse
 import logging
 import os
+import sys
 import datetime
+from functools import partial
 from dotenv import load_dotenv
-from extract_data_from_dev import extract_new_records
-from validate_and_transfer import validate_and_transfer_data
+from db import close_all_pools, with_retries
+from metrics import finish_run, start_run, write_json_report, write_prometheus_textfile
+from validate_and_transfer import COUNT_MODES, DEFAULT_COUNT_MODE, validate_and_transfer_data
+from copy_transfer import copy_transfer_data
+from bulk_load import bulk_load_data
+from hash_diff import diff_transfer_data
+from async_pipeline import async_transfer_data
+from fan_out import fan_out_transfer_data
+from parallel_transfer import DEFAULT_RANGE_SIZE, DEFAULT_WORKERS, parallel_transfer_data
+from sync_daemon import run_daemon
+from planner import log_plan, plan_transfer
+from snapshot import DEFAULT_SNAPSHOT_DIR, create_snapshot, replay_snapshot
 
 # Load environment variables
 load_dotenv()
 
 
-def main():
+TRANSFER_MODES = ("upsert", "copy", "bulk", "diff", "parallel", "async", "fanout", "daemon", "plan", "snapshot", "replay")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Transfer data from the DEV database to the PROD database.")
+    parser.add_argument("--mode", choices=TRANSFER_MODES, default="upsert",
+                        help="Transfer mode (default: upsert).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only transfer documents changed since the last successful run.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Number of parallel workers in parallel mode (default: {DEFAULT_WORKERS}).")
+    parser.add_argument("--range-size", type=int, default=DEFAULT_RANGE_SIZE,
+                        help=f"Primary keys per worker range in parallel mode (default: {DEFAULT_RANGE_SIZE}).")
+    parser.add_argument("--count-mode", choices=COUNT_MODES, default=DEFAULT_COUNT_MODE,
+                        help="Count PROD records exactly or estimate them from the planner statistics.")
+    parser.add_argument("--snapshot-dir", default=DEFAULT_SNAPSHOT_DIR,
+                        help=f"Snapshot directory in snapshot and replay modes (default: {DEFAULT_SNAPSHOT_DIR}).")
+    parser.add_argument("--targets", nargs="+",
+                        help="PROD databases to write to in fanout mode (default: DB_PROD_TARGETS, or DB_PROD_NAME).")
+    parser.add_argument("--metrics-textfile", default=os.getenv("METRICS_TEXTFILE"),
+                        help="Write the run metrics to this file in the Prometheus text format.")
+    parser.add_argument("--metrics-report", default=os.getenv("METRICS_REPORT"),
+                        help="Write a JSON report of the run metrics to this file.")
+    return parser.parse_args(argv)
+
+def export_metrics(metrics_textfile=None, metrics_report=None):
+    try:
+        if metrics_textfile:
+            write_prometheus_textfile(metrics_textfile)
+        if metrics_report:
+            write_json_report(metrics_report)
+    except OSError as e:
+        logging.error(f"Error writing transfer metrics: {e}")
+
+def main(mode="upsert", incremental=False, workers=DEFAULT_WORKERS, range_size=DEFAULT_RANGE_SIZE,
+         count_mode=DEFAULT_COUNT_MODE, metrics_textfile=None, metrics_report=None,
+         snapshot_dir=DEFAULT_SNAPSHOT_DIR, targets=None):
+    """Run one transfer in the given mode. Returns whether it succeeded."""
+    start_run(mode)
+    error = None
     try:
         logging.info("Starting data transfer process.")
 
-        # Extract data from DEV database
-        logging.info("Extracting data from DEV database.")
-        data = extract_new_records()
-        if not data:
+        if mode == "copy":
+            logging.info("Bulk loading data from DEV to PROD database using COPY.")
+            copy_transfer_data()
+            logging.info("Data transfer completed successfully.")
+            return True
+
+        if mode == "bulk":
+            logging.info("Bulk loading data from DEV to PROD database with deferred indexes and constraints.")
+            bulk_load_data()
+            logging.info("Data transfer completed successfully.")
+            return True
+
+        if mode == "parallel":
+            logging.info(f"Transferring all tables from DEV to PROD database with {workers} workers.")
+            parallel_transfer_data(workers=workers, range_size=range_size)
+            logging.info("Data transfer completed successfully.")
+            return True
+
+        if mode == "async":
+            logging.info("Transferring documents from DEV to PROD database with an asyncio pipeline.")
+            stats = async_transfer_data()
+            if not stats["extracted"]:
+                logging.info("No new records to transfer.")
+                return True
+            logging.info("Data transfer completed successfully.")
+            return True
+
+        if mode == "fanout":
+            logging.info("Transferring documents from DEV to several PROD databases from a single extraction.")
+            results = fan_out_transfer_data(targets=targets)
+            failed = [db_name for db_name, result in results.items() if result["error"] is not None]
+            if failed:
+                raise RuntimeError(f"Transfer failed for {', '.join(failed)}; rerun to resume from their checkpoints")
+            logging.info("Data transfer completed successfully.")
+            return True
+
+        if mode == "snapshot":
+            logging.info(f"Dumping DEV database into snapshot '{snapshot_dir}'.")
+            create_snapshot(snapshot_dir)
+            logging.info("Snapshot completed successfully.")
+            return True
+
+        if mode == "replay":
+            logging.info(f"Replaying snapshot '{snapshot_dir}' into PROD database.")
+            replay_snapshot(snapshot_dir)
+            logging.info("Data transfer completed successfully.")
+            return True
+
+        if mode == "plan":
+            logging.info("Planning the transfer from DEV to PROD database; nothing will be written.")
+            log_plan(plan_transfer())
+            return True
+
+        if mode == "daemon":
+            logging.info("Starting the sync daemon: applying DEV changes to PROD as they happen.")
+            run_daemon(on_apply=partial(export_metrics, metrics_textfile, metrics_report))
+            return True
+
+        if mode == "diff":
+            logging.info("Transferring documents that differ between DEV and PROD database.")
+            stats = diff_transfer_data()
+            logging.info(f"Transferred {stats['updated']} changed records to PROD database.")
+            logging.info("Data transfer completed successfully.")
+            return True
+
+        # Extract data from DEV and transfer it to PROD in a single pass
+        logging.info("Extracting, validating and transferring data from DEV to PROD database.")
+        # After a connection failure the transfer is retried, resuming from its last checkpoint
+        stats = with_retries(validate_and_transfer_data, incremental=incremental, count_mode=count_mode)
+        if not stats["extracted"]:
             logging.info("No new records to transfer.")
-            return
-        
-        logging.info(f"Extracted {len(data)} records from DEV database.")
+            return True
 
-        # Transfer data to PROD database
-        logging.info("Validating and transferring data to PROD database.")
-        validate_and_transfer_data()
+        logging.info(f"Extracted {stats['extracted']} records from DEV database.")
         logging.info("Data transfer completed successfully.")
-    
+        return True
+
     except Exception as e:
         logging.error(f"Error during data transfer: {e}")
+        error = e
+        return False
+    finally:
+        finish_run(success=error is None)
+        export_metrics(metrics_textfile, metrics_report)
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    try:
+        succeeded = main(mode=args.mode, incremental=args.incremental, workers=args.workers,
+                         range_size=args.range_size, count_mode=args.count_mode,
+                         metrics_textfile=args.metrics_textfile, metrics_report=args.metrics_report,
+                         snapshot_dir=args.snapshot_dir, targets=args.targets)
+    finally:
+        close_all_pools()
+    sys.exit(0 if succeeded else 1)
@@ -0,0 +1,182 @@
+"""
+# db.py
+
+## Purpose:
+This module is the shared connection layer for the DEV and PROD databases.
+
+## Usage:
+This module is used internally by the other scripts and is not run directly.
+
+## Details:
+- `connect` opens a single connection from the `DB_*` environment variables.
+- `connection` lends a connection from a per-database `ThreadedConnectionPool`, so repeated operations
+  within a process reuse already established (and authenticated) connections.
+- Connections are health-checked when they are borrowed, and broken ones are replaced.
+- Borrowing blocks once `DB_POOL_MAX` connections are in use instead of failing.
+- Optional TCP keepalives keep idle pooled connections alive between scheduled runs in daemon mode.
+- `with_retries` re-runs an operation that failed because of a dropped connection, with exponential backoff.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool
+from dotenv import load_dotenv
+from metrics import increment, stage_timer
+
+load_dotenv()
+
+DEFAULT_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DEFAULT_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DEFAULT_KEEPALIVE = os.getenv("DB_POOL_KEEPALIVE", "false").lower() in ("1", "true", "yes")
+
+# Attempts and initial delay (in seconds) for operations retried after a connection failure
+DEFAULT_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", "5"))
+DEFAULT_RETRY_DELAY = float(os.getenv("DB_RETRY_DELAY", "1.0"))
+
+# libpq TCP keepalive settings, used for long-lived pooled connections
+KEEPALIVE_PARAMS = {
+    "keepalives": 1,
+    "keepalives_idle": int(os.getenv("DB_KEEPALIVE_IDLE", "30")),
+    "keepalives_interval": int(os.getenv("DB_KEEPALIVE_INTERVAL", "10")),
+    "keepalives_count": int(os.getenv("DB_KEEPALIVE_COUNT", "5")),
+}
+
+def dev_db_name():
+    return os.getenv("DB_DEV_NAME")
+
+def prod_db_name():
+    return os.getenv("DB_PROD_NAME")
+
+def prod_target_names():
+    """Return the PROD databases listed in `DB_PROD_TARGETS` (comma-separated), or else `DB_PROD_NAME`."""
+    targets = [name.strip() for name in os.getenv("DB_PROD_TARGETS", "").split(",") if name.strip()]
+    return targets or [prod_db_name()]
+
+def connection_params(dbname, keepalive=False):
+    params = {
+        "host": os.getenv("DB_HOST"),
+        "dbname": dbname,
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "port": os.getenv("DB_PORT"),
+    }
+    if keepalive:
+        params.update(KEEPALIVE_PARAMS)
+    return params
+
+def connect(dbname, keepalive=False):
+    """Open a new, unpooled connection to the given database."""
+    with stage_timer("connect"):
+        return psycopg2.connect(**connection_params(dbname, keepalive))
+
+class ConnectionPool:
+    """A `ThreadedConnectionPool` that health-checks connections and blocks when exhausted."""
+
+    def __init__(self, dbname, minconn=DEFAULT_POOL_MIN, maxconn=DEFAULT_POOL_MAX, keepalive=DEFAULT_KEEPALIVE):
+        self.dbname = dbname
+        self.maxconn = maxconn
+        with stage_timer("connect"):
+            self._pool = pool.ThreadedConnectionPool(minconn, maxconn, **connection_params(dbname, keepalive))
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    @staticmethod
+    def is_healthy(conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        with stage_timer("connect"):
+            return self._getconn()
+
+    def _getconn(self):
+        self._slots.acquire()
+        try:
+            conn = self._pool.getconn()
+            if not self.is_healthy(conn):
+                logging.warning(f"Replacing broken pooled connection to '{self.dbname}'.")
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            if conn.closed:
+                self._pool.putconn(conn, close=True)
+                return
+            try:
+                # Roll back any open transaction and restore the default session settings
+                conn.reset()
+                self._pool.putconn(conn)
+            except psycopg2.Error:
+                self._pool.putconn(conn, close=True)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        self._pool.closeall()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(dbname, **kwargs):
+    """Return the shared pool for the given database, creating it on first use."""
+    with _pools_lock:
+        if dbname not in _pools:
+            _pools[dbname] = ConnectionPool(dbname, **kwargs)
+        return _pools[dbname]
+
+@contextmanager
+def connection(dbname):
+    """Borrow a pooled connection to the given database for the duration of the block."""
+    with get_pool(dbname).connection() as conn:
+        yield conn
+
+def close_all_pools():
+    with _pools_lock:
+        for connection_pool in _pools.values():
+            connection_pool.closeall()
+        _pools.clear()
+
+def with_retries(operation, *args, attempts=DEFAULT_RETRY_ATTEMPTS, base_delay=DEFAULT_RETRY_DELAY, **kwargs):
+    """
+    Call `operation(*args, **kwargs)`, retrying it when the database connection fails.
+
+    The delay doubles after every failed attempt, with random jitter so that parallel workers do not
+    reconnect in lockstep. Operations must be safe to repeat, for example by resuming from a checkpoint.
+    Other errors, and the last connection error, are raised to the caller.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation(*args, **kwargs)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            if attempt == attempts:
+                raise
+            delay = base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            name = getattr(operation, "__name__", "operation")
+            logging.warning(f"Connection error in {name} (attempt {attempt} of {attempts}), "
+                            f"retrying in {delay:.1f}s: {e}")
+            increment("retries_total", reason="connection")
+            time.sleep(delay)
@@ -9,38 +9,102 @@ This script is designed to be used internally by `data_transfer.py` and typicall
 
 ## Details:
 - Queries the DEV database for new or updated records in the `documents` table.
-- Returns the extracted records for further processing.
+- `stream_new_records` streams the records through a server-side cursor, so memory use stays flat
+  regardless of the table size.
+- With `max_value_bytes`, `content` values larger than that are not fetched; the row carries a
+  `LargeValue` placeholder, and the value is streamed in chunks when the record is written.
+- When `since` is given, only records whose `updated_at` is newer than it are read (incremental sync).
+  `get_change_high_water_mark` returns the mark to read up to, kept below the start of any DEV transaction
+  still in flight, so that rows it commits later are not skipped.
+- `extract_new_records` returns the extracted records as a list for further processing.
 """
 
 import os
-import psycopg2
 from dotenv import load_dotenv
+from db import connection, dev_db_name
+from large_values import select_list, wrap_rows
+from schema import get_table_spec
 
 # Load environment variables
 load_dotenv()
 
-def extract_new_records():
-    try:
-        # Connect to the DEV database
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            dbname=os.getenv("DB_DEV_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            port=os.getenv("DB_PORT")
-        )
-        
-        with conn.cursor() as cursor:
-            # Extract all records from the documents table
-            cursor.execute("""
-                SELECT id, company_id, title, content
-                FROM documents;
-            """)
-            new_records = cursor.fetchall()
-            return new_records
+# Number of rows fetched from the server-side cursor per network round trip
+DEFAULT_ITERSIZE = int(os.getenv("EXTRACT_ITERSIZE", "2000"))
+
+def get_change_high_water_mark(conn, table_name="documents"):
+    """
+    Return the `updated_at` value up to which the changes of the table can be synced, or None if it is empty.
+
+    `updated_at` is set to the start time of the writing transaction, so a transaction that is still
+    running can later commit rows older than the newest visible one. The mark is therefore kept just
+    below the start of the oldest other transaction open on the database. Other sessions are only
+    visible in `pg_stat_activity` to the same role or to members of `pg_read_all_stats`.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT CASE WHEN newest IS NULL THEN NULL ELSE least(newest, oldest_running) END
+            FROM (SELECT max(updated_at) AS newest FROM {table_name}) changes,
+                 (SELECT min(xact_start) - interval '1 microsecond' AS oldest_running
+                  FROM pg_stat_activity
+                  WHERE datname = current_database()
+                    AND backend_type = 'client backend'
+                    AND pid <> pg_backend_pid()
+                    AND xact_start IS NOT NULL) running;
+        """)
+        return cursor.fetchone()[0]
+
+def stream_new_records(conn=None, itersize=DEFAULT_ITERSIZE, chunk_size=None, since=None, until=None, after_id=None,
+                       max_value_bytes=None):
+    """
+    Stream records from the DEV `documents` table using a named (server-side) cursor.
+
+    `since` (exclusive) and `until` (inclusive) bound the `updated_at` values of the records to read.
+    Records are read in `id` order, starting after `after_id` when resuming from a checkpoint.
+    `content` values over `max_value_bytes` are replaced by LargeValue placeholders.
 
+    Yields one row at a time, or lists of up to `chunk_size` rows when `chunk_size` is given.
+    If no connection is passed, a pooled DEV connection is borrowed until the stream is exhausted.
+    """
+    if conn is None:
+        with connection(dev_db_name()) as conn:
+            yield from stream_new_records(conn, itersize, chunk_size, since, until, after_id, max_value_bytes)
+        return
+
+    spec = get_table_spec("documents")
+    with conn.cursor(name="extract_new_records") as cursor:
+        cursor.itersize = itersize
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append("updated_at > %s")
+            params.append(since)
+        if until is not None:
+            conditions.append("updated_at <= %s")
+            params.append(until)
+        if after_id is not None:
+            conditions.append("id > %s")
+            params.append(after_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # Extract the new or updated records from the documents table
+        cursor.execute(f"""
+            SELECT {select_list(spec, max_value_bytes)}
+            FROM documents
+            {where}
+            ORDER BY id;
+        """, params)
+        if chunk_size:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield list(wrap_rows(rows, spec, max_value_bytes))
+        else:
+            yield from wrap_rows(cursor, spec, max_value_bytes)
+
+def extract_new_records(since=None):
+    try:
+        return list(stream_new_records(since=since))
     except Exception as e:
         print(f"Error extracting new records: {e}")
         return []
-    finally:
-        conn.close()
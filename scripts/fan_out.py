@@ -0,0 +1,191 @@
+"""
+# fan_out.py
+
+## Purpose:
+This script transfers documents from the DEV database to several PROD databases (replicas or regions) at once,
+reading DEV only once.
+
+## Usage:
+This script is invoked within `data_transfer.py` (`--mode fanout`) and is not typically run directly by the user.
+The targets are given with `--targets` or the `DB_PROD_TARGETS` variable (comma-separated database names),
+and default to `DB_PROD_NAME`.
+
+## Details:
+- A single reader streams and batches the DEV documents, and hands every batch to each target through a
+  bounded queue of its own. Each target has a writer thread with its own PROD connection.
+- A slow target only holds the reader back once its queue is full, so the other targets run at most
+  `FANOUT_QUEUE_SIZE` batches ahead of it.
+- Every target keeps its own checkpoint (`fanout:<database>:documents`) and validator, and quarantines
+  its own title conflicts in its own `quarantine` table. The reader resumes after the oldest checkpoint,
+  and each writer skips the records its target already has.
+- A target that fails is dropped from the run without stopping the others. Its checkpoint is kept, so the
+  next run resumes it.
+"""
+
+import logging
+import os
+import queue
+import threading
+from functools import partial
+from dotenv import load_dotenv
+from db import connection, dev_db_name, get_pool, prod_target_names
+from extract_data_from_dev import stream_new_records
+from large_values import LARGE_VALUE_BYTES, ensure_large_value_table, has_large_values
+from metrics import timed_iter
+from quarantine import ensure_quarantine_table
+from sync_state import clear_checkpoints, ensure_checkpoint_table, get_checkpoint, save_checkpoint
+from validate_and_transfer import DEFAULT_BATCH_BYTES, DEFAULT_BATCH_SIZE, DOCUMENTS_SPEC, UniqueConflictValidator
+from validate_and_transfer import iter_batches, transfer_batch
+
+load_dotenv()
+
+# Maximum number of batches waiting for each target
+DEFAULT_QUEUE_SIZE = int(os.getenv("FANOUT_QUEUE_SIZE", "8"))
+
+# How long a blocked reader waits before re-checking whether the target failed
+_PUT_TIMEOUT = 0.5
+
+# Queued after the last batch when the reader failed, so that writers stop without completing their checkpoint
+_ABORT = object()
+
+class Target:
+    """The queue, checkpoint and results of one PROD target."""
+
+    def __init__(self, db_name, queue_size=DEFAULT_QUEUE_SIZE):
+        self.db_name = db_name
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.checkpoint_name = f"fanout:{db_name}:documents"
+        self.after_id = None
+        self.failed = threading.Event()
+        self.error = None
+        self.stats = {"updated": 0, "skipped": 0, "quarantined": 0, "inserted": 0}
+
+    def offer(self, item):
+        """Queue an item for the writer, waiting while the queue is full unless the target failed."""
+        while not self.failed.is_set():
+            try:
+                self.queue.put(item, timeout=_PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+def prepare_target(target):
+    """
+    Create the bookkeeping tables of a target and load its checkpoint. A target that cannot be prepared,
+    for example because it is unreachable, is marked as failed.
+    """
+    try:
+        with connection(target.db_name) as prod_conn:
+            ensure_quarantine_table(prod_conn)
+            ensure_checkpoint_table(prod_conn)
+            ensure_large_value_table(prod_conn)
+            checkpoint = get_checkpoint(prod_conn, target.checkpoint_name)
+    except Exception as e:
+        logging.error(f"Error preparing the transfer of 'documents' to '{target.db_name}': {e}")
+        target.error = e
+        target.failed.set()
+        return
+    if checkpoint is not None and checkpoint["last_key"] is not None:
+        target.after_id = int(checkpoint["last_key"])
+        logging.info(f"Resuming the transfer of 'documents' to '{target.db_name}' after id {target.after_id}.")
+
+def write_target(target):
+    """Upsert the batches queued for a target until the reader ends the stream."""
+    validator = UniqueConflictValidator(DOCUMENTS_SPEC)
+    dev_pool = get_pool(dev_db_name())
+    # Only borrowed once a batch holds values that have to be streamed from DEV
+    dev_conn = None
+    try:
+        with connection(target.db_name) as prod_conn:
+            while True:
+                batch = target.queue.get()
+                if batch is None or batch is _ABORT:
+                    break
+                if target.after_id is not None:
+                    batch = [record for record in batch if record[0] > target.after_id]
+                    if not batch:
+                        continue
+                if dev_conn is None and any(has_large_values(record) for record in batch):
+                    dev_conn = dev_pool.getconn()
+                checkpoint = partial(save_checkpoint, name=target.checkpoint_name, table_name="documents",
+                                     last_key=batch[-1][0], commit=False)
+                updated, skipped, quarantined, inserted = transfer_batch(
+                    prod_conn, batch, validator, checkpoint, dev_conn
+                )
+                target.stats["updated"] += updated
+                target.stats["skipped"] += skipped
+                target.stats["quarantined"] += quarantined
+                target.stats["inserted"] += inserted
+
+            if batch is None:
+                # Every record has been written to this target
+                clear_checkpoints(prod_conn, target.checkpoint_name)
+    except Exception as e:
+        logging.error(f"Error transferring 'documents' to '{target.db_name}': {e}")
+        target.error = e
+        target.failed.set()
+    finally:
+        if dev_conn is not None:
+            dev_pool.putconn(dev_conn)
+
+def read_into(targets, after_id, batch_size, batch_bytes):
+    """
+    Stream the DEV documents after `after_id` and queue every batch for each target that has not failed.
+    Returns the number of extracted records. Stops early once every target has failed.
+    """
+    extracted_records = 0
+    with connection(dev_db_name()) as dev_conn:
+        records = stream_new_records(dev_conn, after_id=after_id, max_value_bytes=LARGE_VALUE_BYTES)
+        for batch in timed_iter(iter_batches(records, batch_size, batch_bytes), "extract", table="documents"):
+            live_targets = [target for target in targets if not target.failed.is_set()]
+            if not live_targets:
+                break
+            extracted_records += len(batch)
+            for target in live_targets:
+                target.offer(batch)
+    return extracted_records
+
+def fan_out_transfer_data(targets=None, batch_size=DEFAULT_BATCH_SIZE, batch_bytes=DEFAULT_BATCH_BYTES,
+                          queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Transfer documents from DEV to every target database with a single DEV read.
+    Returns {database: {"updated": ..., "skipped": ..., "quarantined": ..., "inserted": ..., "error": ...}},
+    where `error` is None for the targets that succeeded.
+    """
+    targets = [Target(db_name, queue_size) for db_name in (targets or prod_target_names())]
+    for target in targets:
+        prepare_target(target)
+
+    live_targets = [target for target in targets if not target.failed.is_set()]
+    writers = [threading.Thread(target=write_target, args=(target,), name=f"fanout-{target.db_name}")
+               for target in live_targets]
+    for writer in writers:
+        writer.start()
+
+    # Start after the oldest checkpoint, so that no target misses records
+    after_ids = [target.after_id for target in live_targets]
+    after_id = None if None in after_ids else min(after_ids, default=None)
+
+    extracted_records = 0
+    # Writers only complete their checkpoint once the whole stream was read
+    end_of_stream = _ABORT
+    try:
+        # Nothing is read from DEV when no target could be prepared
+        if live_targets:
+            extracted_records = read_into(targets, after_id, batch_size, batch_bytes)
+            end_of_stream = None
+    finally:
+        for target in targets:
+            target.offer(end_of_stream)
+        for writer in writers:
+            writer.join()
+
+    logging.info(f"Number of records extracted from DEV 'documents' table: {extracted_records}")
+    results = {}
+    for target in targets:
+        stats = target.stats
+        if target.error is None:
+            logging.info(f"Transferred 'documents' to '{target.db_name}': {stats['updated']} updated, "
+                         f"{stats['skipped']} skipped, {stats['quarantined']} quarantined.")
+        results[target.db_name] = dict(stats, error=target.error)
+    return results
@@ -0,0 +1,229 @@
+"""
+# generate_synthetic_data.py
+
+## Purpose:
+This script generates realistic synthetic DEV and PROD datasets at a chosen scale, to see how the transfer
+behaves on tables far larger than the files in `sample_data`.
+
+## Usage:
+    python3 scripts/generate_synthetic_data.py --scale 100 --load
+    python3 scripts/generate_synthetic_data.py --scale 10 --output-dir /tmp/synthetic
+
+## Details:
+- Scale factor 1 produces 10 categories, 100 companies, 1,000 documents and 1,000 images.
+- Document content sizes follow a log-normal distribution around `--content-size` bytes.
+- PROD is derived from DEV: `--change-rate` of the documents are either missing from PROD or have different
+  content there, and `--title-collision-rate` of the documents are new in DEV with a title that is already
+  used by another PROD document.
+- Rows are generated lazily, so datasets of any size are streamed straight into the databases (`--load`)
+  or into JSON files in the `sample_data` format (`--output-dir`).
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+from collections import namedtuple
+from dotenv import load_dotenv
+from db import dev_db_name, prod_db_name
+from insert_sample_data import insert_data
+
+load_dotenv()
+
+SyntheticConfig = namedtuple(
+    "SyntheticConfig",
+    ["scale", "content_size", "content_sigma", "change_rate", "title_collision_rate", "seed"],
+)
+
+DEFAULT_CONFIG = SyntheticConfig(
+    scale=1,
+    content_size=2000,
+    content_sigma=1.0,
+    change_rate=0.05,
+    title_collision_rate=0.001,
+    seed=42,
+)
+
+# Rows per table at scale factor 1
+ROWS_PER_SCALE = {
+    "categories": 10,
+    "companies": 100,
+    "documents": 1000,
+    "images": 1000,
+}
+
+WORDS = (
+    "data transfer database document company category report analysis market growth revenue service "
+    "product customer policy update quarterly annual summary review strategy platform network system"
+).split()
+
+def table_sizes(config):
+    return {table: max(1, int(rows * config.scale)) for table, rows in ROWS_PER_SCALE.items()}
+
+def build_text_block(rng, size=1024 * 1024):
+    """Build a block of random words that content values are sliced from."""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+def content_length(rng, config):
+    # Log-normal sizes whose mean is `content_size`
+    mu = math.log(config.content_size) - config.content_sigma ** 2 / 2
+    return max(1, int(rng.lognormvariate(mu, config.content_sigma)))
+
+def slice_text(text_block, rng, length):
+    start = rng.randrange(len(text_block))
+    text = text_block[start:start + length]
+    while len(text) < length:
+        text += text_block[:length - len(text)]
+    return text
+
+def generate_rows(config=DEFAULT_CONFIG, side="dev"):
+    """
+    Yield (table, row) pairs for the DEV or PROD side of a synthetic dataset, in foreign key order.
+
+    Both sides draw the same random numbers in the same order, so they describe the same dataset and
+    only differ where the configured change and collision rates say they should.
+    """
+    rng = random.Random(config.seed)
+    text_block = build_text_block(rng)
+    sizes = table_sizes(config)
+    is_prod = side == "prod"
+
+    for category_id in range(1, sizes["categories"] + 1):
+        yield "categories", {
+            "id": category_id,
+            "title": f"Category {category_id}",
+            "description": slice_text(text_block, rng, 80),
+        }
+
+    for company_id in range(1, sizes["companies"] + 1):
+        yield "companies", {
+            "id": company_id,
+            "category_id": rng.randint(1, sizes["categories"]),
+            "site_url": f"https://company-{company_id}.example.com",
+            "title": f"Company {company_id}",
+            "description": slice_text(text_block, rng, 200),
+        }
+
+    # PROD documents that steal the title of a DEV document that is missing from PROD
+    colliding_documents = []
+    missing_documents = set()
+    for document_id in range(1, sizes["documents"] + 1):
+        company_id = rng.randint(1, sizes["companies"])
+        title = f"Document {document_id}"
+        content = slice_text(text_block, rng, content_length(rng, config))
+        collides = rng.random() < config.title_collision_rate
+        changes = rng.random() < config.change_rate
+        missing = rng.random() < 0.5
+        changed_content = slice_text(text_block, rng, content_length(rng, config))
+
+        if is_prod:
+            if collides:
+                colliding_documents.append((company_id, title))
+                missing_documents.add(document_id)
+                continue
+            if changes and missing:
+                missing_documents.add(document_id)
+                continue
+            if changes:
+                content = changed_content
+        yield "documents", {"id": document_id, "company_id": company_id, "title": title, "content": content}
+
+    for offset, (company_id, title) in enumerate(colliding_documents, start=1):
+        yield "documents", {
+            "id": sizes["documents"] + offset,
+            "company_id": company_id,
+            "title": title,
+            "content": "Colliding PROD document",
+        }
+
+    for image_id in range(1, sizes["images"] + 1):
+        document_id = rng.randint(1, sizes["documents"])
+        description = slice_text(text_block, rng, 120)
+        # Images of documents that only exist in DEV are new as well
+        if is_prod and document_id in missing_documents:
+            continue
+        yield "images", {
+            "id": image_id,
+            "document_id": document_id,
+            "image_url": f"https://images.example.com/{image_id}.jpg",
+            "description": description,
+        }
+
+    for company_id in range(1, sizes["companies"] + 1):
+        yield "companies_categories", {
+            "company_id": company_id,
+            "category_id": rng.randint(1, sizes["categories"]),
+        }
+
+def write_json(rows, file_path):
+    """Stream (table, row) pairs into a JSON file in the `sample_data` format."""
+    with open(file_path, 'w') as file:
+        file.write("{")
+        current_table = None
+        first_row = True
+        for table, row in rows:
+            if table != current_table:
+                if current_table is not None:
+                    file.write("\n    ],")
+                file.write(f"\n    {json.dumps(table)}: [")
+                current_table = table
+                first_row = True
+            file.write(("\n" if first_row else ",\n") + "        " + json.dumps(row))
+            first_row = False
+        if current_table is not None:
+            file.write("\n    ]")
+        file.write("\n}\n")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic DEV and PROD datasets.")
+    parser.add_argument("--scale", type=float, default=DEFAULT_CONFIG.scale,
+                        help="Scale factor; 1 means 1,000 documents.")
+    parser.add_argument("--content-size", type=int, default=DEFAULT_CONFIG.content_size,
+                        help="Mean document content size in bytes.")
+    parser.add_argument("--content-sigma", type=float, default=DEFAULT_CONFIG.content_sigma,
+                        help="Spread of the log-normal content size distribution.")
+    parser.add_argument("--change-rate", type=float, default=DEFAULT_CONFIG.change_rate,
+                        help="Fraction of documents that are new or changed in DEV compared to PROD.")
+    parser.add_argument("--title-collision-rate", type=float, default=DEFAULT_CONFIG.title_collision_rate,
+                        help="Fraction of documents whose title collides with another PROD document.")
+    parser.add_argument("--seed", type=int, default=DEFAULT_CONFIG.seed)
+    parser.add_argument("--load", action="store_true", help="Load the datasets into the DEV and PROD databases.")
+    parser.add_argument("--output-dir", help="Write the datasets as JSON files into this directory.")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    config = SyntheticConfig(
+        scale=args.scale,
+        content_size=args.content_size,
+        content_sigma=args.content_sigma,
+        change_rate=args.change_rate,
+        title_collision_rate=args.title_collision_rate,
+        seed=args.seed,
+    )
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for side in ("dev", "prod"):
+            file_path = os.path.join(args.output_dir, f"{side}_synthetic_data.json")
+            write_json(generate_rows(config, side), file_path)
+            print(f"Synthetic {side.upper()} data written to {file_path}.")
+
+    if args.load:
+        print("Loading synthetic data into DEV database...")
+        insert_data(dev_db_name(), generate_rows(config, "dev"))
+        print("Loading synthetic data into PROD database...")
+        insert_data(prod_db_name(), generate_rows(config, "prod"))
+
+    if not args.output_dir and not args.load:
+        print("Nothing to do: pass --load and/or --output-dir.")
+
+if __name__ == "__main__":
+    main()
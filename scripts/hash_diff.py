@@ -0,0 +1,142 @@
+"""
+# hash_diff.py
+
+## Purpose:
+This script finds the rows that differ between the DEV and PROD databases by comparing hashes, so that
+only changed rows are shipped to PROD even when DEV has no change tracking.
+
+## Usage:
+This script is invoked within `data_transfer.py` (`--mode diff`) and is not typically run directly by the user.
+
+## Details:
+- Every row is hashed on the server with `md5(row(...)::text)`, so row contents never leave the database
+  while diffing.
+- Primary key ranges are compared first through aggregate hashes, like a Merkle tree. Ranges whose hashes
+  differ are split into smaller ranges until they are small enough to compare row by row.
+- Only the rows that are missing from PROD or whose hashes differ are fetched from DEV and upserted.
+"""
+
+import logging
+import os
+from dotenv import load_dotenv
+from db import connection, dev_db_name, prod_db_name
+from large_values import LARGE_VALUE_BYTES, select_list, wrap_rows
+from schema import get_table_spec
+from validate_and_transfer import iter_batches, validate_and_transfer_data
+
+load_dotenv()
+
+# Number of primary keys covered by each top-level range
+DEFAULT_RANGE_SIZE = int(os.getenv("DIFF_RANGE_SIZE", "100000"))
+
+# Ranges covering at most this many keys are compared row by row
+DEFAULT_LEAF_SIZE = int(os.getenv("DIFF_LEAF_SIZE", "1000"))
+
+# Number of sub-ranges a mismatching range is split into
+DEFAULT_FANOUT = int(os.getenv("DIFF_FANOUT", "16"))
+
+def row_hash_sql(spec):
+    return f"md5(row({', '.join(spec.columns)})::text)"
+
+def get_key_bounds(cursor, spec):
+    """Return the (min, max) primary key of the table, or (None, None) if it is empty."""
+    key = spec.key[0]
+    cursor.execute(f"SELECT min({key}), max({key}) FROM {spec.name};")
+    return cursor.fetchone()
+
+def get_range_hashes(cursor, spec, low, high, step):
+    """
+    Split the keys in [low, high) into buckets of `step` keys and return
+    {bucket_start: (row_count, aggregate_hash)} for every non-empty bucket.
+    """
+    key = spec.key[0]
+    cursor.execute(f"""
+        SELECT %(low)s + (({key} - %(low)s) / %(step)s) * %(step)s AS bucket,
+               count(*),
+               md5(string_agg({row_hash_sql(spec)}, '' ORDER BY {key}))
+        FROM {spec.name}
+        WHERE {key} >= %(low)s AND {key} < %(high)s
+        GROUP BY bucket;
+    """, {"low": low, "high": high, "step": step})
+    return {bucket: (count, digest) for bucket, count, digest in cursor.fetchall()}
+
+def get_row_hashes(cursor, spec, low, high):
+    """Return {key: row_hash} for the keys in [low, high)."""
+    key = spec.key[0]
+    cursor.execute(f"""
+        SELECT {key}, {row_hash_sql(spec)}
+        FROM {spec.name}
+        WHERE {key} >= %s AND {key} < %s;
+    """, (low, high))
+    return dict(cursor.fetchall())
+
+def find_changed_keys(dev_cursor, prod_cursor, spec, range_size=DEFAULT_RANGE_SIZE,
+                      leaf_size=DEFAULT_LEAF_SIZE, fanout=DEFAULT_FANOUT):
+    """
+    Yield the primary keys of DEV rows that are missing from PROD or differ from it, in key order.
+
+    Rows that only exist in PROD are ignored, as the transfer never deletes from PROD.
+    """
+    for key, _ in find_changes(dev_cursor, prod_cursor, spec, range_size, leaf_size, fanout):
+        yield key
+
+def find_changes(dev_cursor, prod_cursor, spec, range_size=DEFAULT_RANGE_SIZE,
+                 leaf_size=DEFAULT_LEAF_SIZE, fanout=DEFAULT_FANOUT):
+    """Like `find_changed_keys`, but yield (key, in_prod) pairs, telling updated rows from new ones."""
+    low, high = get_key_bounds(dev_cursor, spec)
+    if low is None:
+        return
+
+    # Each entry is a (low, high, step) range still to be compared
+    pending = [(low, high + 1, range_size)]
+    while pending:
+        range_low, range_high, step = pending.pop()
+
+        if range_high - range_low <= leaf_size:
+            dev_hashes = get_row_hashes(dev_cursor, spec, range_low, range_high)
+            prod_hashes = get_row_hashes(prod_cursor, spec, range_low, range_high)
+            for key in sorted(key for key, digest in dev_hashes.items() if prod_hashes.get(key) != digest):
+                yield key, key in prod_hashes
+            continue
+
+        dev_buckets = get_range_hashes(dev_cursor, spec, range_low, range_high, step)
+        prod_buckets = get_range_hashes(prod_cursor, spec, range_low, range_high, step)
+        changed = sorted(bucket for bucket, summary in dev_buckets.items() if prod_buckets.get(bucket) != summary)
+
+        # Push in reverse so that ranges are processed in ascending key order
+        for bucket in reversed(changed):
+            sub_high = min(bucket + step, range_high)
+            sub_step = max(leaf_size, -(-step // fanout))
+            pending.append((bucket, sub_high, sub_step))
+
+def fetch_rows(cursor, spec, keys):
+    """Fetch the full DEV rows for the given primary keys, with oversized values left on DEV."""
+    key = spec.key[0]
+    cursor.execute(f"""
+        SELECT {select_list(spec, LARGE_VALUE_BYTES)}
+        FROM {spec.name}
+        WHERE {key} = ANY(%s)
+        ORDER BY {key};
+    """, (list(keys),))
+    return list(wrap_rows(cursor.fetchall(), spec, LARGE_VALUE_BYTES))
+
+def diff_transfer_data(range_size=DEFAULT_RANGE_SIZE, leaf_size=DEFAULT_LEAF_SIZE, fanout=DEFAULT_FANOUT,
+                       batch_size=DEFAULT_LEAF_SIZE):
+    """Transfer only the documents that differ between DEV and PROD. Returns the transfer stats."""
+    spec = get_table_spec("documents")
+
+    with connection(dev_db_name()) as dev_conn, connection(prod_db_name()) as prod_conn:
+        # Each hash query stands on its own, so no transaction is held open while PROD is written to
+        dev_conn.autocommit = True
+        prod_conn.autocommit = True
+
+        with dev_conn.cursor() as dev_cursor, prod_conn.cursor() as prod_cursor:
+            def changed_rows():
+                changed_keys = find_changed_keys(dev_cursor, prod_cursor, spec, range_size, leaf_size, fanout)
+                for keys in iter_batches(changed_keys, batch_size):
+                    yield from fetch_rows(dev_cursor, spec, keys)
+
+            stats = validate_and_transfer_data(records=changed_rows(), dev_conn=dev_conn)
+
+    logging.info(f"Found {stats['extracted']} changed records in DEV 'documents' table.")
+    return stats
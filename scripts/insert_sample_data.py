@@ -3,82 +3,237 @@
 
 ## Purpose:
 This script inserts sample data into the DEV and PROD databases using JSON files located in the `sample_data` directory.
+It is also used to seed staging environments from large JSON exports in the same format.
 
 ## Usage:
-    python3 scripts/insert_sample_data.py
+    python3 scripts/insert_sample_data.py [--dev-file PATH] [--prod-file PATH]
+
+## Details:
+- The JSON files are parsed incrementally, one row at a time, so multi-GB exports never have to fit in memory.
+- Rows are grouped by table and column set and inserted with multi-row `execute_values` batches.
+- Existing data is cleared with a single `TRUNCATE ... CASCADE` in foreign key order, and SERIAL sequences
+  are resynchronized with the loaded keys afterwards.
 """
 
+import argparse
 import json
-import psycopg2
 from dotenv import load_dotenv
 import os
+from psycopg2.extras import execute_values
+from db import connection, dev_db_name, prod_db_name
+from schema import load_table_specs
 
 # Load environment variables
 load_dotenv()
 
-def load_json(filename):
-    """Load JSON data from a file."""
-    try:
-        # Construct the full file path
-        script_dir = os.path.dirname(__file__)
-        file_path = os.path.join(script_dir, '..', 'sample_data', filename)
-        with open(file_path, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError as e:
-        print(f"File not found: {file_path}")
-        raise
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from file: {file_path}")
-        raise
-
-def insert_data(db_name, data):
-    """Insert data into the specified database and count records."""
-    conn = psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        dbname=db_name,
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT")
-    )
-    try:
-        with conn.cursor() as cursor:
-            for table, rows in data.items():
+# Number of rows inserted per statement
+DEFAULT_LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "5000"))
+
+# Number of characters read from a JSON file at a time
+JSON_READ_SIZE = 1024 * 1024
+
+def sample_data_path(filename):
+    script_dir = os.path.dirname(__file__)
+    return os.path.join(script_dir, '..', 'sample_data', filename)
+
+class JsonStreamReader:
+    """Reads JSON tokens and values from a file, keeping only a small window of it in memory."""
+
+    WHITESPACE = " \t\n\r"
+
+    def __init__(self, file, read_size=JSON_READ_SIZE):
+        self.file = file
+        self.read_size = read_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        data = self.file.read(self.read_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it, or '' at the end of the file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expected '{char}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def skip(self, char):
+        """Consume the next character if it is `char`. Returns whether it was consumed."""
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        """Decode the next complete JSON value, reading more of the file as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the very end of the buffer may continue in the next read
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+
+def iter_json_rows(file_path, read_size=JSON_READ_SIZE):
+    """
+    Yield (table, row) pairs from a JSON file shaped like `{"table": [{...}, ...], ...}`,
+    parsing it incrementally instead of loading the whole document.
+    """
+    with open(file_path, 'r') as file:
+        reader = JsonStreamReader(file, read_size)
+        reader.expect("{")
+        if reader.skip("}"):
+            return
+        while True:
+            table = reader.value()
+            reader.expect(":")
+            reader.expect("[")
+            if not reader.skip("]"):
+                while True:
+                    yield table, reader.value()
+                    if not reader.skip(","):
+                        break
+                reader.expect("]")
+            if not reader.skip(","):
+                break
+        reader.expect("}")
+
+def iter_dict_rows(data):
+    """Yield (table, row) pairs from already loaded data."""
+    for table, rows in data.items():
+        for row in rows:
+            yield table, row
+
+def truncate_tables(cursor, table_specs):
+    """Clear every table with a single TRUNCATE, listing them in foreign key order."""
+    if table_specs:
+        tables = ", ".join(spec.name for spec in table_specs)
+        cursor.execute(f"TRUNCATE {tables} CASCADE;")
+
+def resync_sequences(cursor, table_specs):
+    """Move SERIAL sequences past the largest loaded key, so that later inserts do not collide."""
+    for spec in table_specs:
+        if len(spec.key) != 1:
+            continue
+        key = spec.key[0]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s);", (spec.name, key))
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            cursor.execute(f"""
+                SELECT setval(%s, COALESCE(MAX({key}), 1), MAX({key}) IS NOT NULL)
+                FROM {spec.name};
+            """, (sequence,))
+
+def load_rows(cursor, rows, batch_size=DEFAULT_LOAD_BATCH_SIZE):
+    """
+    Insert (table, row) pairs in multi-row batches, grouping rows by table and column set.
+    Returns {table: number of inserted rows}.
+    """
+    pending = {}
+    loaded = {}
+
+    def flush(table, columns):
+        batch = pending.pop((table, columns))
+        execute_values(
+            cursor,
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s;",
+            batch,
+            page_size=len(batch),
+        )
+        loaded[table] = loaded.get(table, 0) + len(batch)
+
+    current_table = None
+    for table, row in rows:
+        # Parents are loaded completely before their children start
+        if table != current_table:
+            for group in [group for group in pending if group[0] == current_table]:
+                flush(*group)
+            current_table = table
+            loaded.setdefault(table, 0)
+
+        columns = tuple(row.keys())
+        batch = pending.setdefault((table, columns), [])
+        batch.append(tuple(row.values()))
+        if len(batch) >= batch_size:
+            flush(table, columns)
+
+    for group in list(pending):
+        flush(*group)
+    return loaded
+
+def insert_data(db_name, data, batch_size=DEFAULT_LOAD_BATCH_SIZE):
+    """
+    Insert data into the specified database and count records.
+    `data` is either a dict of table rows or an iterable of (table, row) pairs.
+    """
+    rows = iter_dict_rows(data) if isinstance(data, dict) else data
+    with connection(db_name) as conn:
+        try:
+            with conn.cursor() as cursor:
+                table_specs = load_table_specs(conn)
+
                 # Clear existing data
-                cursor.execute(f"DELETE FROM {table};")
+                truncate_tables(cursor, table_specs)
                 # Insert new data
-                for row in rows:
-                    columns = ', '.join(row.keys())
-                    values = ', '.join(f"%s" for _ in row)
-                    sql = f"INSERT INTO {table} ({columns}) VALUES ({values});"
-                    cursor.execute(sql, tuple(row.values()))
-            
-            conn.commit()
-            print(f"Data inserted into {db_name} successfully.")
-            
-            # Count and display the number of records in each table
-            print(f"Counting records in tables of {db_name}...")
-            for table in data.keys():
-                cursor.execute(f"SELECT COUNT(*) FROM {table};")
-                count = cursor.fetchone()[0]
-                print(f"Table '{table}' has {count} records.")
-                
-    except Exception as e:
-        print(f"Error inserting data into {db_name}: {e}")
-    finally:
-        conn.close()
-
-def main():
-    # Load sample data
-    dev_data = load_json('dev_sample_data.json')
-    prod_data = load_json('prod_sample_data.json')
-    
+                loaded = load_rows(cursor, rows, batch_size)
+                resync_sequences(cursor, [spec for spec in table_specs if spec.name in loaded])
+
+                conn.commit()
+                print(f"Data inserted into {db_name} successfully.")
+
+                # Display the number of records in each table; the tables were emptied first,
+                # so they hold exactly the loaded rows
+                for table, count in loaded.items():
+                    print(f"Table '{table}' has {count} records.")
+
+        except Exception as e:
+            conn.rollback()
+            print(f"Error inserting data into {db_name}: {e}")
+
+def insert_file(db_name, file_path, batch_size=DEFAULT_LOAD_BATCH_SIZE):
+    """Stream a JSON file into the specified database."""
+    if not os.path.exists(file_path):
+        print(f"File not found: {file_path}")
+        raise FileNotFoundError(file_path)
+    insert_data(db_name, iter_json_rows(file_path), batch_size)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Insert sample data into the DEV and PROD databases.")
+    parser.add_argument("--dev-file", default=sample_data_path('dev_sample_data.json'),
+                        help="JSON file to load into the DEV database.")
+    parser.add_argument("--prod-file", default=sample_data_path('prod_sample_data.json'),
+                        help="JSON file to load into the PROD database.")
+    return parser.parse_args(argv)
+
+def main(dev_file=sample_data_path('dev_sample_data.json'), prod_file=sample_data_path('prod_sample_data.json')):
     # Insert sample data into DEV and PROD databases
     print("Inserting sample data into DEV database...")
-    insert_data(os.getenv("DB_DEV_NAME"), dev_data)
-    
+    insert_file(dev_db_name(), dev_file)
+
     print("Inserting sample data into PROD database...")
-    insert_data(os.getenv("DB_PROD_NAME"), prod_data)
+    insert_file(prod_db_name(), prod_file)
 
 if __name__ == "__main__":
-    main()
-
+    args = parse_args()
+    main(dev_file=args.dev_file, prod_file=args.prod_file)
@@ -0,0 +1,165 @@
+"""
+# large_values.py
+
+## Purpose:
+This module moves oversized text values, such as multi-MB `documents.content` or `description` values,
+from the DEV database to the PROD database in chunks, so that no value has to be held in memory whole.
+
+## Usage:
+This module is used internally by the transfer scripts and is not run directly.
+
+## Details:
+- When rows are read from DEV with `select_list`, values of the columns in `LARGE_VALUE_COLUMNS` longer
+  than `LARGE_VALUE_BYTES` are left on the server, and `wrap_rows` puts a `LargeValue` placeholder in
+  their place.
+- `write_large_record` copies each placeholder value with `substring` in chunks of `LARGE_VALUE_CHUNK`
+  characters into the unlogged PROD `staging_large_values` table, then upserts the record with the value
+  reassembled on the server by `string_agg`. Both happen in one transaction, so PROD never shows a
+  partially copied value.
+"""
+
+import json
+import os
+from collections import namedtuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Values longer than this many bytes are streamed in chunks instead of being fetched with their row;
+# 0 disables streaming
+LARGE_VALUE_BYTES = int(os.getenv("LARGE_VALUE_BYTES", str(1024 * 1024)))
+
+# Number of characters copied per chunk of a streamed value
+LARGE_VALUE_CHUNK = int(os.getenv("LARGE_VALUE_CHUNK", str(1024 * 1024)))
+
+# Text columns that may hold values too large to fetch with their row
+LARGE_VALUE_COLUMNS = {
+    "categories": ("description",),
+    "companies": ("description",),
+    "documents": ("content",),
+    "images": ("description",),
+}
+
+# Placeholder for a value left on DEV. key: primary key values of the row; size: length in bytes
+LargeValue = namedtuple("LargeValue", ["table", "column", "key", "size"])
+
+def large_columns(spec):
+    return [column for column in LARGE_VALUE_COLUMNS.get(spec.name, ()) if column in spec.columns]
+
+def select_list(spec, max_value_bytes=LARGE_VALUE_BYTES):
+    """
+    Return the SELECT list for the columns of a table. Values of large columns over `max_value_bytes` are
+    read as NULL, and the size of each large column is appended after the columns for `wrap_rows`.
+    """
+    columns = large_columns(spec) if max_value_bytes else []
+    if not columns:
+        return ", ".join(spec.columns)
+    limit = int(max_value_bytes)
+    items = [
+        f"CASE WHEN octet_length({column}) > {limit} THEN NULL ELSE {column} END" if column in columns else column
+        for column in spec.columns
+    ]
+    items += [f"CASE WHEN octet_length({column}) > {limit} THEN octet_length({column}) END" for column in columns]
+    return ", ".join(items)
+
+def wrap_rows(rows, spec, max_value_bytes=LARGE_VALUE_BYTES):
+    """Turn rows read with `select_list` into rows of `spec.columns`, with LargeValue placeholders."""
+    columns = large_columns(spec) if max_value_bytes else []
+    if not columns:
+        yield from rows
+        return
+    width = len(spec.columns)
+    column_indexes = [spec.columns.index(column) for column in columns]
+    key_indexes = [spec.columns.index(column) for column in spec.key]
+    for row in rows:
+        sizes = row[width:]
+        row = row[:width]
+        if any(sizes):
+            row = list(row)
+            key = tuple(row[index] for index in key_indexes)
+            for column, index, size in zip(columns, column_indexes, sizes):
+                if size:
+                    row[index] = LargeValue(spec.name, column, key, size)
+            row = tuple(row)
+        yield row
+
+def has_large_values(record):
+    return any(isinstance(value, LargeValue) for value in record)
+
+def large_value_bytes(records):
+    """Return the total size of the values left on DEV by the given records."""
+    return sum(value.size for record in records for value in record if isinstance(value, LargeValue))
+
+def ensure_large_value_table(conn):
+    # Unlogged: the chunks only live until the transaction that reassembles them commits
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE UNLOGGED TABLE IF NOT EXISTS staging_large_values (
+                value_id TEXT NOT NULL,
+                column_name VARCHAR(255) NOT NULL,
+                seq INTEGER NOT NULL,
+                chunk TEXT NOT NULL,
+                PRIMARY KEY (value_id, column_name, seq)
+            );
+        """)
+    conn.commit()
+
+def copy_value_chunks(dev_cursor, prod_cursor, spec, value, value_id, chunk_size=LARGE_VALUE_CHUNK):
+    """
+    Copy one value from DEV into `staging_large_values`, one chunk at a time.
+    Returns False if the DEV record no longer exists.
+    """
+    key_condition = " AND ".join(f"{column} = %s" for column in spec.key)
+    offset = 1
+    seq = 0
+    while True:
+        dev_cursor.execute(f"""
+            SELECT substring({value.column} from %s for %s)
+            FROM {spec.name}
+            WHERE {key_condition};
+        """, (offset, chunk_size, *value.key))
+        row = dev_cursor.fetchone()
+        if row is None:
+            return False
+        chunk = row[0]
+        if not chunk:
+            return True
+        prod_cursor.execute("""
+            INSERT INTO staging_large_values (value_id, column_name, seq, chunk)
+            VALUES (%s, %s, %s, %s);
+        """, (value_id, value.column, seq, chunk))
+        if len(chunk) < chunk_size:
+            return True
+        offset += len(chunk)
+        seq += 1
+
+def write_large_record(dev_conn, prod_conn, spec, record, upsert_sql, chunk_size=LARGE_VALUE_CHUNK):
+    """
+    Upsert one record holding LargeValue placeholders, streaming their values from DEV.
+    `upsert_sql` is the `INSERT ... VALUES %s ON CONFLICT ... RETURNING (xmax = 0)` statement of the table.
+    The caller commits. Returns whether the record was inserted, or None if it was deleted from DEV since
+    it was read.
+    """
+    key = tuple(record[spec.columns.index(column)] for column in spec.key)
+    value_id = f"{spec.name}:{json.dumps(key, default=str)}"
+    placeholders = []
+    params = []
+    with dev_conn.cursor() as dev_cursor, prod_conn.cursor() as prod_cursor:
+        prod_cursor.execute("DELETE FROM staging_large_values WHERE value_id = %s;", (value_id,))
+        for column, value in zip(spec.columns, record):
+            if not isinstance(value, LargeValue):
+                placeholders.append("%s")
+                params.append(value)
+                continue
+            if not copy_value_chunks(dev_cursor, prod_cursor, spec, value, value_id, chunk_size):
+                return None
+            placeholders.append("""COALESCE((
+                SELECT string_agg(chunk, '' ORDER BY seq) FROM staging_large_values
+                WHERE value_id = %s AND column_name = %s
+            ), '')""")
+            params.extend([value_id, column])
+
+        prod_cursor.execute(upsert_sql.replace("VALUES %s", f"VALUES ({', '.join(placeholders)})", 1), params)
+        inserted = prod_cursor.fetchone()[0]
+        prod_cursor.execute("DELETE FROM staging_large_values WHERE value_id = %s;", (value_id,))
+    return inserted
@@ -0,0 +1,273 @@
+"""
+# metrics.py
+
+## Purpose:
+This module collects timings and counters during a transfer run and exports them for monitoring.
+
+## Usage:
+This module is used internally by the transfer scripts. The exports are enabled from `data_transfer.py`
+with `--metrics-textfile` / `--metrics-report` or the `METRICS_TEXTFILE` / `METRICS_REPORT` variables.
+
+## Details:
+- Stage timers (`connect`, `extract`, `validate`, `write`, `commit`, `conflict`, ...) are recorded as
+  histograms, so both the total time per stage and the latency distribution are available.
+- Counters track rows and bytes per table, and retries per reason.
+- `write_prometheus_textfile` writes the metrics in the Prometheus text format, for the node_exporter
+  textfile collector. The file is replaced atomically, so a scrape never sees a partial run.
+- `write_json_report` writes a structured JSON report of the run.
+- Stage times are summed over all threads, so in the parallel and async modes they can exceed the
+  wall-clock duration of the run.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "db_transfer_"
+
+# Histogram buckets in seconds, from a fast single-row write to a slow COPY of a large table
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+HELP = {
+    "rows_total": "Rows handled per table and result.",
+    "bytes_total": "Approximate payload bytes handled per table and result.",
+    "retries_total": "Retried operations per table and reason.",
+    "stage_seconds": "Time spent per transfer stage.",
+    "batch_seconds": "Latency of writing one batch to PROD, including conflict handling.",
+    "change_delay_seconds": "Delay between the first pending DEV change and its application to PROD (daemon mode).",
+    "run_duration_seconds": "Wall-clock duration of the last run.",
+    "last_run_success": "Whether the last run succeeded (1) or failed (0).",
+    "last_run_timestamp_seconds": "Unix time at which the last run finished.",
+}
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Bucketed observations, kept per label set."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """Yield (upper_bound, cumulative_count) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls into."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+class MetricsRegistry:
+    """Thread-safe store for the counters, gauges and histograms of one run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, mode=None):
+        with self._lock:
+            self.mode = mode
+            self.started = time.time()
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            families = {}
+            for (name, labels), value in self.counters.items():
+                families.setdefault((name, "counter"), []).append((labels, value))
+            for (name, labels), value in self.gauges.items():
+                families.setdefault((name, "gauge"), []).append((labels, value))
+            for (name, labels), histogram in self.histograms.items():
+                families.setdefault((name, "histogram"), []).append((labels, histogram))
+
+            for (name, kind), samples in sorted(families.items()):
+                metric = METRIC_PREFIX + name
+                if name in HELP:
+                    lines.append(f"# HELP {metric} {HELP[name]}")
+                lines.append(f"# TYPE {metric} {kind}")
+                for labels, value in sorted(samples, key=lambda sample: sample[0]):
+                    if kind != "histogram":
+                        lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+                        continue
+                    for bound, total in value.cumulative():
+                        le = (("le", _format_value(bound)),)
+                        lines.append(f"{metric}_bucket{_format_labels(labels, le)} {total}")
+                    lines.append(f"{metric}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+                    lines.append(f"{metric}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_report(self):
+        """Return the metrics of the run as a JSON-serializable dict."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            gauges = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.gauges.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "mean": round(histogram.sum / histogram.count, 6) if histogram.count else 0.0,
+                    "p50": round(histogram.quantile(0.5), 6),
+                    "p95": round(histogram.quantile(0.95), 6),
+                    "max": round(histogram.max, 6),
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+            # Total seconds per stage, summed over tables
+            stages = {}
+            for (name, labels), histogram in self.histograms.items():
+                stage = dict(labels).get("stage")
+                if name == "stage_seconds" and stage:
+                    stages[stage] = round(stages.get(stage, 0.0) + histogram.sum, 6)
+            return {
+                "mode": self.mode,
+                "started": self.started,
+                "stages": stages,
+                "counters": counters,
+                "gauges": gauges,
+                "histograms": histograms,
+            }
+
+# Metrics of the current run, shared by every module and thread of the process
+REGISTRY = MetricsRegistry()
+
+def increment(name, value=1, **labels):
+    REGISTRY.increment(name, value, **labels)
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+def stage_timer(stage, **labels):
+    """Time the block as one observation of the given stage."""
+    return REGISTRY.timer("stage_seconds", stage=stage, **labels)
+
+def timed_iter(iterable, stage, **labels):
+    """Yield from `iterable`, recording the time spent waiting for each item as the given stage."""
+    iterator = iter(iterable)
+    try:
+        while True:
+            with stage_timer(stage, **labels):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+def payload_bytes(rows):
+    """Approximate the payload size of a batch of rows: the length of text and binary values, 8 bytes otherwise."""
+    size = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (str, bytes, bytearray, memoryview)):
+                size += len(value)
+            elif value is not None:
+                size += 8
+    return size
+
+def record_rows(table, result, rows, include_bytes=False):
+    """Count `rows` (a batch) for the given table and result, optionally with their payload bytes."""
+    increment("rows_total", len(rows), table=table, result=result)
+    if include_bytes:
+        increment("bytes_total", payload_bytes(rows), table=table, result=result)
+
+def start_run(mode):
+    REGISTRY.reset(mode)
+
+def finish_run(success):
+    finished = time.time()
+    REGISTRY.set_gauge("run_duration_seconds", round(finished - REGISTRY.started, 6), mode=REGISTRY.mode)
+    REGISTRY.set_gauge("last_run_success", 1 if success else 0, mode=REGISTRY.mode)
+    REGISTRY.set_gauge("last_run_timestamp_seconds", round(finished, 3), mode=REGISTRY.mode)
+
+def _write_atomically(path, content):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+def write_prometheus_textfile(path, registry=REGISTRY):
+    _write_atomically(path, registry.to_prometheus())
+
+def write_json_report(path, registry=REGISTRY):
+    _write_atomically(path, json.dumps(registry.to_report(), indent=4) + "\n")
@@ -0,0 +1,211 @@
+"""
+# parallel_transfer.py
+
+## Purpose:
+This script transfers every table from the DEV database to the PROD database with a pool of parallel workers.
+
+## Usage:
+This script is invoked within `data_transfer.py` (`--mode parallel`) and is not typically run directly by the user.
+
+## Details:
+- Each table is split into primary key ranges of a configurable size, aligned to multiples of that size,
+  so that a range (and its checkpoint) keeps its bounds when the table's smallest or largest key changes.
+- Ranges are processed by a pool of worker threads. Each range borrows its own DEV/PROD connection pair
+  from the shared connection pools.
+- The tables, their keys and their foreign keys are read from the DEV schema. A table only starts once
+  every table it references is complete, and independent tables run at the same time.
+- Records that conflict with a unique index, in PROD or across ranges, are quarantined before writing.
+- Each range checkpoints its last committed key on PROD. A range that fails on a connection error is
+  retried with exponential backoff and resumes from its checkpoint, and so does a restarted run.
+- Batches are capped by record count and payload bytes, and oversized text values are streamed from
+  DEV in chunks instead of being read with their rows (see `large_values.py`).
+- Tables with composite or non-integer primary keys are split on their first key column, or
+  transferred as a single range when that column is not an integer.
+"""
+
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from graphlib import TopologicalSorter
+from dotenv import load_dotenv
+from db import connection, dev_db_name, prod_db_name, with_retries
+from large_values import LARGE_VALUE_BYTES, ensure_large_value_table, select_list, wrap_rows
+from metrics import timed_iter
+from schema import dependency_graph, load_table_specs
+from sync_state import clear_checkpoints, ensure_checkpoint_table, get_checkpoint, save_checkpoint
+from quarantine import ensure_quarantine_table
+from validate_and_transfer import DEFAULT_BATCH_BYTES, DEFAULT_BATCH_SIZE, UniqueConflictValidator, iter_batches
+from validate_and_transfer import transfer_batch
+
+load_dotenv()
+
+# Number of worker threads
+DEFAULT_WORKERS = int(os.getenv("TRANSFER_WORKERS", "4"))
+
+# Number of primary keys covered by each range handed to a worker
+DEFAULT_RANGE_SIZE = int(os.getenv("TRANSFER_RANGE_SIZE", "50000"))
+
+def split_key_ranges(dev_conn, spec, range_size=DEFAULT_RANGE_SIZE):
+    """
+    Split the table into [low, high) ranges of the first primary key column, aligned to multiples of
+    `range_size`. A non-integer key yields a single (None, None) range covering the whole table.
+    """
+    key = spec.key[0]
+    with dev_conn.cursor() as cursor:
+        cursor.execute(f"SELECT min({key}), max({key}) FROM {spec.name};")
+        low, high = cursor.fetchone()
+    dev_conn.commit()
+    if low is None:
+        return []
+    if not isinstance(low, int):
+        return [(None, None)]
+    # Aligned bounds keep the checkpoint names of a resumed run stable as the table changes
+    return [(start, start + range_size) for start in range(low - low % range_size, high + 1, range_size)]
+
+def range_checkpoint_name(spec, low, high):
+    return f"parallel:{spec.name}:{'all' if low is None else f'{low}-{high}'}"
+
+def transfer_range(spec, low, high, batch_size=DEFAULT_BATCH_SIZE, validator=None, batch_bytes=DEFAULT_BATCH_BYTES):
+    """
+    Stream one key range of a table from DEV and upsert it into PROD, on a DEV/PROD connection
+    pair borrowed from the pools for the duration of the range.
+    Records conflicting with a unique index are quarantined by `validator`, which is shared by
+    every range of the table.
+    Progress is checkpointed on PROD with every batch, so a retried or restarted range resumes after
+    its last committed key, and a completed range is skipped. Ranges of tables with composite keys
+    are only marked as completed, and otherwise restart from their beginning.
+    Returns a tuple of (extracted_records, updated_records, skipped_records, quarantined_records, inserted_records).
+    """
+    if validator is None:
+        validator = UniqueConflictValidator(spec)
+    key = spec.key[0]
+    key_index = spec.columns.index(key)
+    resumable = len(spec.key) == 1
+    checkpoint_name = range_checkpoint_name(spec, low, high)
+
+    conditions = []
+    params = []
+    if low is not None:
+        conditions.append(f"{key} >= %s AND {key} < %s")
+        params.extend([low, high])
+    extracted_records = updated_records = skipped_records = quarantined_records = inserted_records = 0
+    with connection(dev_db_name()) as dev_conn, connection(prod_db_name()) as prod_conn:
+        checkpoint = get_checkpoint(prod_conn, checkpoint_name)
+        if checkpoint is not None:
+            if checkpoint["completed"]:
+                logging.info(f"Skipping completed range of '{spec.name}' keys [{low}, {high}).")
+                return 0, 0, 0, 0, 0
+            if resumable and checkpoint["last_key"] is not None:
+                logging.info(f"Resuming range of '{spec.name}' keys [{low}, {high}) after {checkpoint['last_key']}.")
+                conditions.append(f"{key} > %s")
+                params.append(checkpoint["last_key"])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        last_key = None
+        with dev_conn.cursor(name=f"transfer_{spec.name}_{low}") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(f"""
+                SELECT {select_list(spec, LARGE_VALUE_BYTES)}
+                FROM {spec.name}
+                {where}
+                ORDER BY {', '.join(spec.key)};
+            """, params)
+            batches = iter_batches(wrap_rows(cursor, spec, LARGE_VALUE_BYTES), batch_size, batch_bytes)
+            for batch in timed_iter(batches, "extract", table=spec.name):
+                extracted_records += len(batch)
+                save = None
+                if resumable:
+                    last_key = batch[-1][key_index]
+                    save = partial(save_checkpoint, name=checkpoint_name, table_name=spec.name,
+                                   last_key=last_key, commit=False)
+                batch_updated, batch_skipped, batch_quarantined, batch_inserted = transfer_batch(
+                    prod_conn, batch, validator, save, dev_conn
+                )
+                updated_records += batch_updated
+                skipped_records += batch_skipped
+                quarantined_records += batch_quarantined
+                inserted_records += batch_inserted
+        dev_conn.commit()
+        save_checkpoint(prod_conn, checkpoint_name, spec.name, last_key, completed=True)
+    return extracted_records, updated_records, skipped_records, quarantined_records, inserted_records
+
+def parallel_transfer_data(workers=DEFAULT_WORKERS, range_size=DEFAULT_RANGE_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                           table_specs=None):
+    """
+    Transfer every table from DEV to PROD with a pool of workers, in foreign key dependency order.
+    When `table_specs` is omitted, the tables are read from the DEV schema.
+    Returns {table: {"extracted": ..., "updated": ..., "skipped": ..., "quarantined": ..., "inserted": ...}}.
+    """
+    with connection(dev_db_name()) as dev_conn:
+        if table_specs is None:
+            table_specs = load_table_specs(dev_conn)
+        specs_by_name = {spec.name: spec for spec in table_specs}
+        results = {spec.name: {"extracted": 0, "updated": 0, "skipped": 0, "quarantined": 0, "inserted": 0}
+                   for spec in table_specs}
+        validators = {spec.name: UniqueConflictValidator(spec) for spec in table_specs}
+        with connection(prod_db_name()) as prod_conn:
+            ensure_quarantine_table(prod_conn)
+            ensure_checkpoint_table(prod_conn)
+            ensure_large_value_table(prod_conn)
+
+        sorter = TopologicalSorter(dependency_graph(table_specs))
+        sorter.prepare()
+        remaining_ranges = {}
+        futures = {}
+        errors = []
+
+        def finish_table(table_name):
+            sorter.done(table_name)
+            stats = results[table_name]
+            logging.info(f"Transferred '{table_name}': {stats['extracted']} extracted, "
+                         f"{stats['updated']} updated, {stats['skipped']} skipped, "
+                         f"{stats['quarantined']} quarantined.")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while sorter.is_active() and not errors:
+                # Submit the ranges of every table whose parents are complete
+                ready = sorter.get_ready()
+                while ready:
+                    for table_name in ready:
+                        ranges = split_key_ranges(dev_conn, specs_by_name[table_name], range_size)
+                        if not ranges:
+                            finish_table(table_name)
+                            continue
+                        remaining_ranges[table_name] = len(ranges)
+                        for low, high in ranges:
+                            future = executor.submit(with_retries, transfer_range, specs_by_name[table_name],
+                                                     low, high, batch_size, validators[table_name])
+                            futures[future] = (table_name, low, high)
+                    ready = sorter.get_ready()
+
+                if not futures:
+                    break
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    table_name, low, high = futures.pop(future)
+                    try:
+                        extracted, updated, skipped, quarantined, inserted = future.result()
+                    except Exception as e:
+                        logging.error(f"Error transferring '{table_name}' keys [{low}, {high}): {e}")
+                        errors.append(e)
+                        continue
+                    results[table_name]["extracted"] += extracted
+                    results[table_name]["updated"] += updated
+                    results[table_name]["skipped"] += skipped
+                    results[table_name]["quarantined"] += quarantined
+                    results[table_name]["inserted"] += inserted
+                    remaining_ranges[table_name] -= 1
+                    if remaining_ranges[table_name] == 0:
+                        finish_table(table_name)
+
+    # Tables that depend on a failed range are never started. Their checkpoints are kept,
+    # so the next run resumes where this one stopped
+    if errors:
+        raise errors[0]
+
+    with connection(prod_db_name()) as prod_conn:
+        clear_checkpoints(prod_conn, "parallel:")
+
+    return results
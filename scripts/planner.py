@@ -0,0 +1,190 @@
+"""
+# planner.py
+
+## Purpose:
+This script works out what a transfer would do, without writing anything to the PROD database.
+
+## Usage:
+This script is invoked within `data_transfer.py` (`--mode plan`) and is not typically run directly by the user.
+
+## Details:
+- For every table, the DEV and PROD rows are compared with the range and row hashes of `hash_diff.py`,
+  which tells the rows that would be inserted, updated or left unchanged. Tables without a single integer
+  primary key are compared with one row hash per key.
+- Rows that would be quarantined because of a unique index (such as the document title) are found with
+  `UniqueConflictValidator`, reading only the key and unique columns.
+- Row sizes are summed on the DEV server with `pg_column_size`, as `benchmark.py` measures them, so row
+  contents never leave the database.
+- The expected duration is estimated for every mode in the newest report of `benchmark.py`, from its
+  measured rows/s and MB/s, applied to the rows that mode processes: every row of the tables it transfers,
+  or only the changed `documents` rows for `diff`.
+- Both connections are read-only for the whole plan.
+"""
+
+import glob
+import json
+import logging
+import os
+from collections import namedtuple
+from dotenv import load_dotenv
+from benchmark import RESULTS_DIR, transferred_tables
+from db import connection, dev_db_name, prod_db_name
+from hash_diff import DEFAULT_FANOUT, DEFAULT_LEAF_SIZE, DEFAULT_RANGE_SIZE, find_changes, get_key_bounds
+from hash_diff import row_hash_sql
+from metrics import stage_timer
+from schema import load_table_specs
+from validate_and_transfer import UniqueConflictValidator, iter_batches
+
+load_dotenv()
+
+# source, source_bytes: rows in DEV and their size; bytes: size of the inserted and updated rows
+TablePlan = namedtuple(
+    "TablePlan", ["table", "source", "insert", "update", "unchanged", "conflicts", "bytes", "source_bytes"]
+)
+
+# Modes that only write the changed rows; the other modes read every row of the tables they transfer
+CHANGED_ROW_MODES = ("diff",)
+
+def find_all_changes(dev_cursor, prod_cursor, spec):
+    """Yield (key, in_prod) for the changed DEV rows of a table, comparing one row hash per key."""
+    key_columns = ", ".join(spec.key)
+    hashes = []
+    for cursor in (dev_cursor, prod_cursor):
+        cursor.execute(f"""
+            SELECT jsonb_build_array({key_columns})::text, {row_hash_sql(spec)}
+            FROM {spec.name};
+        """)
+        hashes.append(dict(cursor.fetchall()))
+    dev_hashes, prod_hashes = hashes
+    for key in sorted(key for key, digest in dev_hashes.items() if prod_hashes.get(key) != digest):
+        yield tuple(json.loads(key)), key in prod_hashes
+
+def payload_size(dev_cursor, spec, keys):
+    """Sum the stored size of the DEV rows with the given keys, on the server."""
+    dev_cursor.execute(f"""
+        SELECT COALESCE(sum(pg_column_size(t.*)), 0)
+        FROM {spec.name} t
+        WHERE ({', '.join(spec.key)}) IN %s;
+    """, (tuple(keys),))
+    return int(dev_cursor.fetchone()[0])
+
+def find_conflicts(dev_cursor, prod_conn, validator, keys):
+    """Return the keys among `keys` whose unique values conflict with PROD or with other incoming rows."""
+    spec = validator.spec
+    dev_cursor.execute(f"""
+        SELECT {', '.join(spec.columns)}
+        FROM {spec.name}
+        WHERE ({', '.join(spec.key)}) IN %s
+        ORDER BY {', '.join(spec.key)};
+    """, (tuple(keys),))
+    # Nothing is written, so the titles stay claimed for the whole plan to catch duplicates across batches
+    _, rejected = validator.split(prod_conn, dev_cursor.fetchall())
+    return {validator.record_key(record) for record, _ in rejected}
+
+def plan_table(dev_conn, prod_conn, spec, range_size=DEFAULT_RANGE_SIZE, leaf_size=DEFAULT_LEAF_SIZE,
+               fanout=DEFAULT_FANOUT):
+    """Return the TablePlan of one table."""
+    with dev_conn.cursor() as dev_cursor, prod_conn.cursor() as prod_cursor:
+        dev_cursor.execute(f"SELECT count(*), COALESCE(sum(pg_column_size(t.*)), 0) FROM {spec.name} t;")
+        source, source_bytes = dev_cursor.fetchone()
+
+        low, _ = get_key_bounds(dev_cursor, spec)
+        if len(spec.key) == 1 and (low is None or isinstance(low, int)):
+            changes = (((key,), in_prod) for key, in_prod in
+                       find_changes(dev_cursor, prod_cursor, spec, range_size, leaf_size, fanout))
+        else:
+            changes = find_all_changes(dev_cursor, prod_cursor, spec)
+
+        # Only the key and unique columns are needed to find the conflicts
+        validator = None
+        if spec.unique:
+            validator = UniqueConflictValidator(spec._replace(columns=spec.key + spec.unique))
+
+        insert = update = conflicts = size = 0
+        for batch in iter_batches(changes, leaf_size):
+            keys = [key for key, _ in batch]
+            rejected = find_conflicts(dev_cursor, prod_conn, validator, keys) if validator else set()
+            conflicts += len(rejected)
+            accepted = [(key, in_prod) for key, in_prod in batch if key not in rejected]
+            update += sum(1 for _, in_prod in accepted if in_prod)
+            insert += sum(1 for _, in_prod in accepted if not in_prod)
+            if accepted:
+                size += payload_size(dev_cursor, spec, [key for key, _ in accepted])
+
+    return TablePlan(
+        table=spec.name,
+        source=source,
+        insert=insert,
+        update=update,
+        unchanged=source - insert - update - conflicts,
+        conflicts=conflicts,
+        bytes=size,
+        source_bytes=int(source_bytes),
+    )
+
+def load_throughput(results_dir=RESULTS_DIR):
+    """
+    Return {mode: (rows_per_second, mb_per_second)} measured by the newest benchmark report,
+    or {} if there is none.
+    """
+    reports = glob.glob(os.path.join(results_dir, "*.json"))
+    if not reports:
+        return {}
+    with open(max(reports, key=os.path.getmtime)) as file:
+        report = json.load(file)
+    return {
+        result["mode"]: (result["rows_per_second"], result["mb_per_second"])
+        for result in report.get("results", [])
+        if result.get("exit_code") == 0 and result["rows_per_second"] and result["mb_per_second"]
+    }
+
+def mode_workload(mode, tables):
+    """Return the (rows, bytes) that `mode` processes for the planned `tables`, counted like `benchmark.py`."""
+    names = transferred_tables(mode, [plan.table for plan in tables])
+    plans = [plan for plan in tables if plan.table in names]
+    if mode in CHANGED_ROW_MODES:
+        return sum(plan.insert + plan.update for plan in plans), sum(plan.bytes for plan in plans)
+    return sum(plan.source for plan in plans), sum(plan.source_bytes for plan in plans)
+
+def estimate_duration(tables, throughput):
+    """Estimate the seconds each measured mode needs to transfer the planned `tables`."""
+    estimates = {}
+    for mode, (rows_per_second, mb_per_second) in throughput.items():
+        rows, size = mode_workload(mode, tables)
+        estimates[mode] = round(max(rows / rows_per_second, size / (1024 * 1024) / mb_per_second), 1)
+    return estimates
+
+def plan_transfer(table_specs=None, range_size=DEFAULT_RANGE_SIZE, leaf_size=DEFAULT_LEAF_SIZE, fanout=DEFAULT_FANOUT):
+    """
+    Plan the transfer of every table from DEV to PROD without writing anything.
+    When `table_specs` is omitted, the tables are read from the DEV schema.
+    Returns a dict with the TablePlans (as dicts), their totals and the estimated duration per mode.
+    """
+    tables = []
+    with connection(dev_db_name()) as dev_conn, connection(prod_db_name()) as prod_conn:
+        dev_conn.set_session(readonly=True)
+        prod_conn.set_session(readonly=True)
+        if table_specs is None:
+            table_specs = load_table_specs(dev_conn)
+        for spec in table_specs:
+            with stage_timer("plan", table=spec.name):
+                tables.append(plan_table(dev_conn, prod_conn, spec, range_size, leaf_size, fanout))
+        dev_conn.commit()
+        prod_conn.commit()
+
+    totals = {field: sum(getattr(plan, field) for plan in tables) for field in TablePlan._fields[1:]}
+    return {
+        "tables": [plan._asdict() for plan in tables],
+        "totals": totals,
+        "estimated_seconds": estimate_duration(tables, load_throughput()),
+    }
+
+def log_plan(plan):
+    for table in plan["tables"] + [dict(plan["totals"], table="total")]:
+        logging.info(f"{table['table']}: {table['insert']} to insert, {table['update']} to update, "
+                     f"{table['unchanged']} unchanged, {table['conflicts']} unique conflicts, "
+                     f"{table['bytes'] / (1024 * 1024):.1f} MB to transfer.")
+    if not plan["estimated_seconds"]:
+        logging.info("No benchmark results to estimate the duration from; run benchmark.py to measure throughput.")
+    for mode, seconds in sorted(plan["estimated_seconds"].items(), key=lambda item: item[1]):
+        logging.info(f"Estimated duration in '{mode}' mode: {seconds}s.")
@@ -0,0 +1,70 @@
+"""
+# quarantine.py
+
+## Purpose:
+This module stores the records that were rejected before being written to PROD, together with the reason.
+
+## Usage:
+This module is used internally by the transfer scripts and is not run directly.
+
+## Details:
+- Rejected records are kept in the `quarantine` table on PROD as JSON, so they can be reviewed and fixed
+  at the source without stopping the transfer.
+- Each entry holds the source table, the primary key of the record, the record itself and the reason it
+  was rejected, such as a title that is already used by another document.
+- A record rejected again for the same reason, for example when an interrupted transfer is resumed,
+  updates its existing entry instead of adding a duplicate.
+"""
+
+import json
+from psycopg2.extras import execute_values
+
+def ensure_quarantine_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quarantine (
+                id SERIAL PRIMARY KEY,
+                table_name VARCHAR(255) NOT NULL,
+                record_key TEXT NOT NULL,
+                record JSONB NOT NULL,
+                reason TEXT NOT NULL,
+                quarantined_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_quarantine_record
+                ON quarantine (table_name, record_key, reason);
+        """)
+    conn.commit()
+
+def quarantine_records(conn, spec, rejected, commit=True):
+    """
+    Store rejected records of the given table in the `quarantine` table and commit.
+    `rejected` is a list of (record, reason) pairs, with records as tuples in `spec.columns` order.
+    With `commit=False` the records become part of the caller's transaction.
+    """
+    if not rejected:
+        return 0
+    key_indexes = [spec.columns.index(column) for column in spec.key]
+    rows = [
+        (
+            spec.name,
+            json.dumps([record[index] for index in key_indexes], default=str),
+            json.dumps(dict(zip(spec.columns, record)), default=str),
+            reason,
+        )
+        for record, reason in rejected
+    ]
+    with conn.cursor() as cursor:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO quarantine (table_name, record_key, record, reason) VALUES %s
+            ON CONFLICT (table_name, record_key, reason)
+            DO UPDATE SET record = EXCLUDED.record,
+                          quarantined_at = now();
+            """,
+            rows,
+            template="(%s, %s, %s::jsonb, %s)",
+        )
+    if commit:
+        conn.commit()
+    return len(rows)
@@ -0,0 +1,163 @@
+"""
+# schema.py
+
+## Purpose:
+This module describes the tables that are synchronized between the DEV and PROD databases.
+
+## Usage:
+This module is used internally by the transfer scripts and is not run directly.
+
+## Details:
+- `TABLE_SPECS` mirrors the tables created by `create_databases_and_tables.py`, listed in foreign key
+  dependency order, parents before children.
+- `load_table_specs` reads the same information from `pg_catalog`, so that any table in the database
+  can be synchronized.
+- `dependency_graph` and `topological_order` order tables so that every table comes after the tables
+  it references.
+"""
+
+from collections import namedtuple
+from graphlib import TopologicalSorter
+
+# name: table name
+# columns: columns transferred between DEV and PROD
+# key: primary key columns
+# unique: columns covered by a single-column unique index other than the primary key
+# references: (column, parent table, parent column) triples for foreign keys
+TableSpec = namedtuple("TableSpec", ["name", "columns", "key", "unique", "references"])
+
+# Bookkeeping tables and columns that are never transferred
+INTERNAL_TABLES = {"sync_state", "quarantine", "transfer_checkpoints", "pending_indexes"}
+INTERNAL_TABLE_PREFIXES = ("staging_",)
+INTERNAL_COLUMNS = {"updated_at"}
+
+TABLE_SPECS = [
+    TableSpec(
+        name="categories",
+        columns=("id", "title", "description"),
+        key=("id",),
+        unique=(),
+        references=(),
+    ),
+    TableSpec(
+        name="companies",
+        columns=("id", "category_id", "site_url", "title", "description"),
+        key=("id",),
+        unique=(),
+        references=(("category_id", "categories", "id"),),
+    ),
+    TableSpec(
+        name="documents",
+        columns=("id", "company_id", "title", "content"),
+        key=("id",),
+        unique=("title",),
+        references=(("company_id", "companies", "id"),),
+    ),
+    TableSpec(
+        name="images",
+        columns=("id", "document_id", "image_url", "description"),
+        key=("id",),
+        unique=("image_url",),
+        references=(("document_id", "documents", "id"),),
+    ),
+    TableSpec(
+        name="companies_categories",
+        columns=("company_id", "category_id"),
+        key=("company_id", "category_id"),
+        unique=(),
+        references=(("company_id", "companies", "id"), ("category_id", "categories", "id")),
+    ),
+]
+
+def get_table_spec(table_name, table_specs=TABLE_SPECS):
+    """Return the TableSpec for the given table name."""
+    for spec in table_specs:
+        if spec.name == table_name:
+            return spec
+    raise KeyError(f"Unknown table '{table_name}'")
+
+def is_internal_table(table_name):
+    return table_name in INTERNAL_TABLES or table_name.startswith(INTERNAL_TABLE_PREFIXES)
+
+def load_table_specs(conn, schema_name="public"):
+    """
+    Read the tables of a database from `pg_catalog` and return their TableSpecs in topological order.
+
+    Tables without a primary key cannot be upserted and are left out.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname, a.attname
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_attribute a ON a.attrelid = c.oid
+            WHERE n.nspname = %s AND c.relkind = 'r' AND a.attnum > 0 AND NOT a.attisdropped
+            ORDER BY c.relname, a.attnum;
+        """, (schema_name,))
+        columns = {}
+        for table, column in cursor.fetchall():
+            columns.setdefault(table, []).append(column)
+
+        # Primary keys and single-column unique indexes, with columns in index order
+        cursor.execute("""
+            SELECT c.relname, i.indisprimary,
+                   array_agg(a.attname ORDER BY k.ordinality) AS index_columns
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ordinality)
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+            WHERE n.nspname = %s AND i.indisunique AND i.indpred IS NULL AND i.indexprs IS NULL
+            GROUP BY c.relname, i.indexrelid, i.indisprimary;
+        """, (schema_name,))
+        keys = {}
+        unique = {}
+        for table, is_primary, index_columns in cursor.fetchall():
+            if is_primary:
+                keys[table] = tuple(index_columns)
+            elif len(index_columns) == 1:
+                unique.setdefault(table, []).append(index_columns[0])
+
+        cursor.execute("""
+            SELECT c.relname, a.attname, p.relname, pa.attname
+            FROM pg_constraint f
+            JOIN pg_class c ON c.oid = f.conrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_class p ON p.oid = f.confrelid
+            CROSS JOIN LATERAL unnest(f.conkey, f.confkey) AS k(attnum, parent_attnum)
+            JOIN pg_attribute a ON a.attrelid = f.conrelid AND a.attnum = k.attnum
+            JOIN pg_attribute pa ON pa.attrelid = f.confrelid AND pa.attnum = k.parent_attnum
+            WHERE n.nspname = %s AND f.contype = 'f'
+            ORDER BY c.relname, f.conname;
+        """, (schema_name,))
+        references = {}
+        for table, column, parent, parent_column in cursor.fetchall():
+            references.setdefault(table, []).append((column, parent, parent_column))
+    conn.commit()
+
+    specs = []
+    for table, table_columns in columns.items():
+        if is_internal_table(table) or table not in keys:
+            continue
+        specs.append(TableSpec(
+            name=table,
+            columns=tuple(column for column in table_columns if column not in INTERNAL_COLUMNS),
+            key=keys[table],
+            unique=tuple(unique.get(table, ())),
+            references=tuple(references.get(table, ())),
+        ))
+    return topological_order(specs)
+
+def dependency_graph(table_specs=TABLE_SPECS):
+    """Return {table: set of tables it references} for the given tables, ignoring self-references."""
+    names = {spec.name for spec in table_specs}
+    return {
+        spec.name: {parent for _, parent, _ in spec.references if parent in names and parent != spec.name}
+        for spec in table_specs
+    }
+
+def topological_order(table_specs=TABLE_SPECS):
+    """Return the TableSpecs ordered so that parents come before their children."""
+    specs_by_name = {spec.name: spec for spec in table_specs}
+    order = TopologicalSorter(dependency_graph(table_specs)).static_order()
+    return [specs_by_name[name] for name in order]
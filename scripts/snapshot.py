@@ -0,0 +1,344 @@
+"""
+# snapshot.py
+
+## Purpose:
+This script dumps the DEV tables into a compressed on-disk snapshot and replays snapshots into PROD databases,
+so that one DEV read can feed several PROD targets and retried syncs without reading DEV again.
+
+## Usage:
+This script is invoked within `data_transfer.py` (`--mode snapshot` and `--mode replay`, with `--snapshot-dir`)
+and is not typically run directly by the user.
+
+## Details:
+- Every table is split into primary key ranges, and each range is written with `COPY ... TO STDOUT
+  (FORMAT binary)` into its own zlib-compressed chunk file. All tables are read from one DEV snapshot.
+- `manifest.json` describes the tables (columns, keys, foreign keys), the chunk files with their row
+  counts, sizes and CRC32 checksums, and the DEV high-water mark of every table. It is written last, so
+  a directory without a manifest is an incomplete snapshot.
+- A replay memory-maps each chunk file, decompresses it incrementally into `COPY ... FROM STDIN
+  (FORMAT binary)` into the PROD staging table, and merges the staging table into its target like
+  `copy_transfer.py`. Replaying the same snapshot again is harmless.
+- Rows that the merge leaves out, because of a unique conflict or a missing parent, are stored in the
+  PROD `quarantine` table in the same transaction, so they are not lost once the high-water mark moves
+  past them.
+- Binary COPY data is specific to the column types, so the PROD tables must have the same column types
+  as the DEV tables they were dumped from.
+"""
+
+import datetime
+import json
+import logging
+import mmap
+import os
+import zlib
+from dotenv import load_dotenv
+from copy_transfer import build_merge_sql, dropped_rows_sql, prepare_staging_table
+from db import connection, dev_db_name, prod_db_name
+from extract_data_from_dev import get_change_high_water_mark
+from hash_diff import get_key_bounds
+from metrics import increment, stage_timer
+from quarantine import ensure_quarantine_table, quarantine_records
+from schema import TableSpec, load_table_specs
+from sync_state import ensure_sync_state_table, get_high_water_mark, save_high_water_mark
+
+load_dotenv()
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Directory used when none is given
+DEFAULT_SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+# Primary keys covered by each chunk file
+DEFAULT_RANGE_SIZE = int(os.getenv("SNAPSHOT_RANGE_SIZE", "100000"))
+
+# zlib level of the chunk files: 1 is fastest, 9 smallest
+DEFAULT_COMPRESSION_LEVEL = int(os.getenv("SNAPSHOT_COMPRESSION_LEVEL", "3"))
+
+# Compressed bytes decompressed per step during a replay
+READ_SIZE = 256 * 1024
+
+# Rows left out of a merge that are quarantined at a time
+QUARANTINE_BATCH_SIZE = 1000
+
+class CompressedChunkWriter:
+    """File-like target for `COPY ... TO STDOUT` that compresses the data into a chunk file."""
+
+    def __init__(self, path, level=DEFAULT_COMPRESSION_LEVEL):
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(level)
+        self.bytes = 0
+        self.compressed_bytes = 0
+        self.crc32 = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.bytes += len(data)
+        self._write(self._compressor.compress(data))
+        return len(data)
+
+    def _write(self, compressed):
+        if compressed:
+            self.crc32 = zlib.crc32(compressed, self.crc32)
+            self.compressed_bytes += len(compressed)
+            self._file.write(compressed)
+
+    def close(self):
+        self._write(self._compressor.flush())
+        self._file.close()
+
+class MappedChunkReader:
+    """
+    File-like source for `COPY ... FROM STDIN` that decompresses a memory-mapped chunk file.
+    Each `read` decompresses at most `size` bytes, so memory use does not depend on the chunk size.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self._offset = 0
+        self._decompressor = zlib.decompressobj()
+        self._pending = b""
+        self._eof = False
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = READ_SIZE
+        while not self._pending and not self._eof:
+            if self._decompressor.unconsumed_tail:
+                data = self._decompressor.unconsumed_tail
+            elif self._offset < len(self._view):
+                data = self._view[self._offset:self._offset + READ_SIZE]
+                self._offset += len(data)
+            else:
+                self._pending = self._decompressor.flush()
+                self._eof = True
+                break
+            self._pending = self._decompressor.decompress(data, size)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+def file_crc32(path):
+    """Return the CRC32 of a chunk file, read through a memory map."""
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return zlib.crc32(mapped)
+
+def key_ranges(dev_conn, spec, range_size=DEFAULT_RANGE_SIZE):
+    """
+    Split the table into [low, high) ranges of its primary key, within the current transaction.
+    Tables without a single integer key are dumped as one (None, None) range.
+    """
+    if len(spec.key) != 1:
+        return [(None, None)]
+    with dev_conn.cursor() as cursor:
+        low, high = get_key_bounds(cursor, spec)
+    if low is None:
+        return []
+    if not isinstance(low, int):
+        return [(None, None)]
+    return [(start, min(start + range_size, high + 1)) for start in range(low, high + 1, range_size)]
+
+def dump_chunk(dev_conn, spec, path, conditions, params, level=DEFAULT_COMPRESSION_LEVEL):
+    """Write the rows matching `conditions` into a chunk file. Returns the manifest entry of the chunk."""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    writer = CompressedChunkWriter(path + ".tmp", level)
+    try:
+        with dev_conn.cursor() as cursor:
+            query = cursor.mogrify(f"""
+                SELECT {', '.join(spec.columns)}
+                FROM {spec.name}
+                {where}
+                ORDER BY {', '.join(spec.key)}
+            """, params).decode()
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", writer)
+            rows = cursor.rowcount
+    finally:
+        writer.close()
+    os.replace(path + ".tmp", path)
+    return {
+        "file": os.path.basename(path),
+        "rows": rows,
+        "bytes": writer.bytes,
+        "compressed_bytes": writer.compressed_bytes,
+        "crc32": writer.crc32,
+    }
+
+def create_snapshot(directory=DEFAULT_SNAPSHOT_DIR, table_specs=None, since=None, range_size=DEFAULT_RANGE_SIZE,
+                    level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Dump the DEV tables into `directory`, optionally only the rows changed after `since` (`updated_at`).
+    When `table_specs` is omitted, every table of the DEV schema is dumped. Returns the manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        # The old manifest would describe chunk files that are about to be overwritten
+        os.remove(manifest_path)
+
+    tables = []
+    with connection(dev_db_name()) as dev_conn:
+        # Every table and chunk is read from the same snapshot
+        dev_conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        if table_specs is None:
+            table_specs = load_table_specs(dev_conn)
+        for spec in table_specs:
+            high_water_mark = get_change_high_water_mark(dev_conn, spec.name)
+            chunks = []
+            with stage_timer("snapshot", table=spec.name):
+                for index, (low, high) in enumerate(key_ranges(dev_conn, spec, range_size)):
+                    conditions = []
+                    params = []
+                    if low is not None:
+                        conditions.append(f"{spec.key[0]} >= %s AND {spec.key[0]} < %s")
+                        params.extend([low, high])
+                    if since is not None:
+                        conditions.append("updated_at > %s")
+                        params.append(since)
+                    path = os.path.join(directory, f"{spec.name}.{index:05d}.copy.z")
+                    chunk = dump_chunk(dev_conn, spec, path, conditions, params, level)
+                    if not chunk["rows"]:
+                        os.remove(path)
+                        continue
+                    chunks.append(chunk)
+
+            rows = sum(chunk["rows"] for chunk in chunks)
+            increment("rows_total", rows, table=spec.name, result="extracted")
+            increment("bytes_total", sum(chunk["bytes"] for chunk in chunks), table=spec.name, result="extracted")
+            logging.info(f"Dumped {rows} records of DEV '{spec.name}' table into {len(chunks)} chunk files.")
+            tables.append({
+                "spec": spec._asdict(),
+                "high_water_mark": high_water_mark.isoformat() if high_water_mark else None,
+                "chunks": chunks,
+            })
+        dev_conn.commit()
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "source": dev_db_name(),
+        "since": since.isoformat() if since else None,
+        "tables": tables,
+    }
+    with open(manifest_path + ".tmp", 'w') as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+def load_manifest(directory=DEFAULT_SNAPSHOT_DIR):
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No snapshot manifest in '{directory}'; the snapshot is missing or incomplete.")
+    with open(path) as file:
+        manifest = json.load(file)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.get('version')} in '{directory}'.")
+    return manifest
+
+def spec_from_manifest(entry):
+    spec = entry["spec"]
+    return TableSpec(
+        name=spec["name"],
+        columns=tuple(spec["columns"]),
+        key=tuple(spec["key"]),
+        unique=tuple(spec["unique"]),
+        references=tuple(tuple(reference) for reference in spec["references"]),
+    )
+
+def quarantine_dropped_rows(prod_conn, spec, staging):
+    """
+    Quarantine, without committing, the staging rows that the merge is going to leave out.
+    Must be called before the merge. Returns the number of quarantined rows.
+    """
+    query = dropped_rows_sql(spec, staging)
+    if query is None:
+        return 0
+    quarantined_records = 0
+    with prod_conn.cursor(name=f"dropped_{spec.name}") as cursor:
+        cursor.itersize = QUARANTINE_BATCH_SIZE
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(QUARANTINE_BATCH_SIZE)
+            if not rows:
+                break
+            rejected = [(row[:-1], row[-1]) for row in rows]
+            for record, reason in rejected:
+                key = tuple(record[spec.columns.index(column)] for column in spec.key)
+                logging.warning(f"Quarantined '{spec.name}' record {key}: {reason}")
+            quarantined_records += quarantine_records(prod_conn, spec, rejected, commit=False)
+    return quarantined_records
+
+def replay_table(prod_conn, directory, entry):
+    """
+    Load the chunk files of one table into its PROD staging table, quarantine the rows that cannot be
+    merged and merge the rest. Returns (merged, skipped, quarantined).
+    """
+    spec = spec_from_manifest(entry)
+    staging = prepare_staging_table(prod_conn, spec)
+    staged_records = 0
+    with prod_conn.cursor() as cursor:
+        for chunk in entry["chunks"]:
+            path = os.path.join(directory, chunk["file"])
+            if file_crc32(path) != chunk["crc32"]:
+                raise ValueError(f"Snapshot chunk '{path}' is corrupted (CRC32 mismatch).")
+            reader = MappedChunkReader(path)
+            try:
+                with stage_timer("replay", table=spec.name):
+                    cursor.copy_expert(f"COPY {staging} ({', '.join(spec.columns)}) FROM STDIN WITH (FORMAT binary)",
+                                       reader)
+            finally:
+                reader.close()
+            staged_records += chunk["rows"]
+
+        quarantined_records = quarantine_dropped_rows(prod_conn, spec, staging)
+        with stage_timer("merge", table=spec.name):
+            cursor.execute(build_merge_sql(spec, staging))
+        merged_records = cursor.rowcount
+        cursor.execute(f"TRUNCATE {staging};")
+    return merged_records, staged_records - merged_records, quarantined_records
+
+def replay_snapshot(directory=DEFAULT_SNAPSHOT_DIR, db_name=None):
+    """
+    Replay a snapshot into a PROD database (by default the one from `.env`), one transaction per table.
+    Rows that cannot be merged are quarantined. The high-water marks of the snapshot are stored on PROD
+    when the snapshot covers every change the database has not seen yet, so later incremental runs
+    continue from them.
+    Returns {table: (merged_records, skipped_records, quarantined_records)}, where skipped records include
+    the quarantined ones and, for tables without non-key columns, the rows PROD already had.
+    """
+    manifest = load_manifest(directory)
+    since = datetime.datetime.fromisoformat(manifest["since"]) if manifest["since"] else None
+    results = {}
+    with connection(db_name or prod_db_name()) as prod_conn:
+        ensure_sync_state_table(prod_conn)
+        ensure_quarantine_table(prod_conn)
+        for entry in manifest["tables"]:
+            table_name = entry["spec"]["name"]
+            try:
+                merged_records, skipped_records, quarantined_records = replay_table(prod_conn, directory, entry)
+                with stage_timer("commit", table=table_name):
+                    prod_conn.commit()
+            except Exception:
+                prod_conn.rollback()
+                raise
+            results[table_name] = (merged_records, skipped_records, quarantined_records)
+            increment("rows_total", merged_records, table=table_name, result="updated")
+            increment("rows_total", skipped_records - quarantined_records, table=table_name, result="skipped")
+            increment("rows_total", quarantined_records, table=table_name, result="quarantined")
+            logging.info(f"Replayed {merged_records} records into PROD '{table_name}' table "
+                         f"({quarantined_records} quarantined due to conflicts or missing parents).")
+
+            if entry["high_water_mark"] is not None:
+                high_water_mark = datetime.datetime.fromisoformat(entry["high_water_mark"])
+                stored = get_high_water_mark(prod_conn, table_name)
+                # Never move a mark back, nor past changes that are older than the snapshot
+                covers_gap = since is None or (stored is not None and stored >= since)
+                if covers_gap and (stored is None or stored < high_water_mark):
+                    save_high_water_mark(prod_conn, table_name, high_water_mark)
+    return results
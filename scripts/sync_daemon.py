@@ -0,0 +1,353 @@
+"""
+# sync_daemon.py
+
+## Purpose:
+This script keeps the PROD database in sync with the DEV database continuously, applying DEV changes to
+PROD within seconds instead of on the next scheduled run.
+
+## Usage:
+This script is invoked within `data_transfer.py` (`--mode daemon`) and is not typically run directly by the user.
+
+## Details:
+- Triggers installed on the DEV tables `NOTIFY` the primary key of every inserted, updated or deleted row.
+  A dedicated DEV connection `LISTEN`s for them; the transfers themselves run on pooled connections
+  with TCP keepalives, which stay warm between changes.
+- Changes are debounced: they are applied once no new change has arrived for `DAEMON_DEBOUNCE_SECONDS`,
+  at the latest `DAEMON_MAX_DELAY_SECONDS` after the first one, or as soon as `DAEMON_MAX_PENDING` rows
+  are pending.
+- Changes are coalesced per row: a row that changed several times is applied once, from its current
+  DEV state. Rows that no longer exist on DEV are deleted from PROD, children before parents.
+- Each table keeps one validator for the daemon's lifetime, so the parent keys its rules have looked up
+  are reused by every apply; deleted rows are removed from them.
+- On start, and after the listening connection was lost, the rows changed since the high-water mark of
+  each table are caught up with an incremental transfer. Deletes made while the daemon was not
+  listening are not caught up.
+- The daemon stops on SIGINT or SIGTERM, after applying the pending changes.
+"""
+
+import json
+import logging
+import os
+import select
+import signal
+import threading
+import time
+import psycopg2
+from dotenv import load_dotenv
+from db import connect, connection, dev_db_name, get_pool, prod_db_name, with_retries
+from extract_data_from_dev import get_change_high_water_mark
+from large_values import LARGE_VALUE_BYTES, ensure_large_value_table, select_list, wrap_rows
+from metrics import increment, observe, stage_timer
+from quarantine import ensure_quarantine_table
+from schema import load_table_specs
+from sync_state import ensure_sync_state_table, get_sync_window_start, save_high_water_mark
+from validate_and_transfer import DEFAULT_BATCH_BYTES, DEFAULT_BATCH_SIZE, UniqueConflictValidator, iter_batches
+from validate_and_transfer import transfer_batch
+
+load_dotenv()
+
+# Channel on which the DEV triggers notify changes
+CHANGE_CHANNEL = os.getenv("DAEMON_CHANNEL", "db_transfer_changes")
+
+# Quiet period after the last change before the pending changes are applied
+DEFAULT_DEBOUNCE = float(os.getenv("DAEMON_DEBOUNCE_SECONDS", "0.5"))
+
+# Longest time a change waits while other changes keep arriving
+DEFAULT_MAX_DELAY = float(os.getenv("DAEMON_MAX_DELAY_SECONDS", "5"))
+
+# Number of pending rows that triggers an immediate apply
+DEFAULT_MAX_PENDING = int(os.getenv("DAEMON_MAX_PENDING", "1000"))
+
+# How often an idle daemon wakes up to check whether it was asked to stop
+IDLE_TIMEOUT = 1.0
+
+def install_change_triggers(dev_conn, table_specs, channel=CHANGE_CHANNEL):
+    """Install the triggers that notify `channel` of every changed row of the given DEV tables."""
+    with dev_conn.cursor() as cursor:
+        # The payload names the table and holds the primary key of the row, as a JSON array
+        cursor.execute(f"""
+            CREATE OR REPLACE FUNCTION notify_row_change() RETURNS TRIGGER AS $$
+            DECLARE
+                row_data jsonb;
+                row_key jsonb := '[]'::jsonb;
+                key_column text;
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    row_data := to_jsonb(OLD);
+                ELSE
+                    row_data := to_jsonb(NEW);
+                END IF;
+                FOREACH key_column IN ARRAY TG_ARGV LOOP
+                    row_key := row_key || jsonb_build_array(row_data -> key_column);
+                END LOOP;
+                PERFORM pg_notify('{channel}', json_build_object('table', TG_TABLE_NAME, 'key', row_key)::text);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+        for spec in table_specs:
+            key_arguments = ", ".join(f"'{column}'" for column in spec.key)
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_{spec.name}_notify ON {spec.name};")
+            cursor.execute(f"""
+                CREATE TRIGGER trg_{spec.name}_notify
+                AFTER INSERT OR UPDATE OR DELETE ON {spec.name}
+                FOR EACH ROW EXECUTE FUNCTION notify_row_change({key_arguments});
+            """)
+    dev_conn.commit()
+    logging.info(f"Installed change notification triggers on {len(table_specs)} DEV tables.")
+
+def parse_notification(payload):
+    """Return (table, key) for a notification payload, with the key as a tuple of primary key values."""
+    change = json.loads(payload)
+    return change["table"], tuple(change["key"])
+
+def fetch_rows_by_key(dev_cursor, spec, keys):
+    """
+    Fetch the current DEV rows for the given primary keys.
+    Returns (rows, found_keys), where found_keys holds the keys of the rows that still exist.
+    """
+    key_columns = ", ".join(spec.key)
+    # The keys are read back in the JSON form used by the triggers, so they compare equal to the
+    # notified keys whatever their type
+    dev_cursor.execute(f"""
+        SELECT jsonb_build_array({key_columns})::text, {select_list(spec, LARGE_VALUE_BYTES)}
+        FROM {spec.name}
+        WHERE ({key_columns}) IN %s
+        ORDER BY {key_columns};
+    """, (tuple(keys),))
+    found_keys = set()
+    rows = []
+    for row in dev_cursor.fetchall():
+        found_keys.add(tuple(json.loads(row[0])))
+        rows.append(row[1:])
+    return list(wrap_rows(rows, spec, LARGE_VALUE_BYTES)), found_keys
+
+def delete_rows(prod_conn, spec, keys):
+    """Delete the rows with the given primary keys from PROD. Returns the number of deleted rows."""
+    try:
+        with prod_conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {spec.name} WHERE ({', '.join(spec.key)}) IN %s;", (tuple(keys),))
+            deleted = cursor.rowcount
+        prod_conn.commit()
+    except psycopg2.IntegrityError as e:
+        prod_conn.rollback()
+        logging.warning(f"Could not delete {len(keys)} '{spec.name}' records from PROD: {e}")
+        return 0
+    increment("rows_total", deleted, table=spec.name, result="deleted")
+    return deleted
+
+def create_validators(table_specs):
+    """Return {table: UniqueConflictValidator}, one validator per table."""
+    return {spec.name: UniqueConflictValidator(spec) for spec in table_specs}
+
+def apply_changes(pending, table_specs, batch_size=DEFAULT_BATCH_SIZE, batch_bytes=DEFAULT_BATCH_BYTES,
+                  validators=None):
+    """
+    Apply the pending changes, {table: set of keys}, from the current DEV rows.
+    Existing rows are upserted parents first, missing rows are deleted children first, and the
+    high-water mark of each table is advanced once its changes are applied. `validators` are the
+    {table: UniqueConflictValidator} kept between applies; new ones are created when omitted.
+    Returns a tuple of (upserted_records, deleted_records, quarantined_records).
+    """
+    if validators is None:
+        validators = create_validators(table_specs)
+    upserted_records = deleted_records = quarantined_records = 0
+    missing = {}
+    high_water_marks = {}
+    with connection(dev_db_name()) as dev_conn, connection(prod_db_name()) as prod_conn:
+        # Every table is read from the same snapshot
+        dev_conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        with dev_conn.cursor() as dev_cursor:
+            for spec in table_specs:
+                keys = pending.get(spec.name)
+                if not keys:
+                    continue
+                high_water_marks[spec.name] = get_change_high_water_mark(dev_conn, spec.name)
+                rows, found_keys = fetch_rows_by_key(dev_cursor, spec, keys)
+                missing[spec.name] = keys - found_keys
+                validator = validators[spec.name]
+                for batch in iter_batches(rows, batch_size, batch_bytes):
+                    updated, _, quarantined, _ = transfer_batch(prod_conn, batch, validator, None, dev_conn)
+                    upserted_records += updated
+                    quarantined_records += quarantined
+
+        for spec in reversed(table_specs):
+            if missing.get(spec.name):
+                deleted_records += delete_rows(prod_conn, spec, missing[spec.name])
+                for validator in validators.values():
+                    validator.forget_deleted(spec.name, missing[spec.name])
+        dev_conn.commit()
+
+        for table_name, high_water_mark in high_water_marks.items():
+            if high_water_mark is not None:
+                save_high_water_mark(prod_conn, table_name, high_water_mark)
+    return upserted_records, deleted_records, quarantined_records
+
+def catch_up(table_specs, batch_size=DEFAULT_BATCH_SIZE, batch_bytes=DEFAULT_BATCH_BYTES, validators=None):
+    """
+    Transfer the rows of every table changed since its high-water mark on PROD (every row of a table that
+    was never synced), then advance the mark. Returns the number of transferred records.
+    """
+    if validators is None:
+        validators = create_validators(table_specs)
+    transferred_records = 0
+    with connection(dev_db_name()) as dev_conn, connection(prod_db_name()) as prod_conn:
+        dev_conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        for spec in table_specs:
+            since = get_sync_window_start(prod_conn, spec.name)
+            high_water_mark = get_change_high_water_mark(dev_conn, spec.name)
+            if high_water_mark is None:
+                continue
+            conditions = ["updated_at <= %s"]
+            params = [high_water_mark]
+            if since is not None:
+                conditions.append("updated_at > %s")
+                params.append(since)
+
+            validator = validators[spec.name]
+            with dev_conn.cursor(name=f"catch_up_{spec.name}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(f"""
+                    SELECT {select_list(spec, LARGE_VALUE_BYTES)}
+                    FROM {spec.name}
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY {', '.join(spec.key)};
+                """, params)
+                batches = iter_batches(wrap_rows(cursor, spec, LARGE_VALUE_BYTES), batch_size, batch_bytes)
+                for batch in batches:
+                    transfer_batch(prod_conn, batch, validator, None, dev_conn)
+                    transferred_records += len(batch)
+            save_high_water_mark(prod_conn, spec.name, high_water_mark)
+        dev_conn.commit()
+    return transferred_records
+
+def listen(channel=CHANGE_CHANNEL):
+    """Open the dedicated DEV connection that listens for change notifications."""
+    listen_conn = connect(dev_db_name(), keepalive=True)
+    listen_conn.autocommit = True
+    with listen_conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {channel};")
+    return listen_conn
+
+class PendingChanges:
+    """
+    The notified changes waiting to be applied, coalesced per row, and the debounce rules that decide when
+    they are due. `clock` returns the current time in seconds; it is injectable so that the rules can be
+    driven without waiting.
+    """
+
+    def __init__(self, debounce=DEFAULT_DEBOUNCE, max_delay=DEFAULT_MAX_DELAY, max_pending=DEFAULT_MAX_PENDING,
+                 clock=time.monotonic):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.clock = clock
+        self.tables = {}
+        self.rows = 0
+        self.first_change = self.last_change = None
+
+    def add(self, table_name, key):
+        """Record a change of one row. A row that is already pending is only counted once."""
+        keys = self.tables.setdefault(table_name, set())
+        if key not in keys:
+            keys.add(key)
+            self.rows += 1
+        self.last_change = self.clock()
+        if self.first_change is None:
+            self.first_change = self.last_change
+
+    def timeout(self, idle=IDLE_TIMEOUT):
+        """Return how long to wait for more changes before the pending ones are due."""
+        if not self.rows:
+            return idle
+        return max(0.0, min(self.last_change + self.debounce, self.first_change + self.max_delay) - self.clock())
+
+    def due(self):
+        """Whether the pending changes should be applied now."""
+        if not self.rows:
+            return False
+        now = self.clock()
+        return (now >= self.last_change + self.debounce or now >= self.first_change + self.max_delay
+                or self.rows >= self.max_pending)
+
+    def take(self):
+        """Return ({table: set of keys}, rows, seconds since the first change) and start over."""
+        taken = (self.tables, self.rows, self.clock() - self.first_change)
+        self.tables = {}
+        self.rows = 0
+        self.first_change = self.last_change = None
+        return taken
+
+def run_daemon(debounce=DEFAULT_DEBOUNCE, max_delay=DEFAULT_MAX_DELAY, max_pending=DEFAULT_MAX_PENDING,
+               batch_size=DEFAULT_BATCH_SIZE, stop_event=None, on_apply=None):
+    """
+    Replicate DEV changes to PROD until `stop_event` is set (by default, on SIGINT or SIGTERM).
+    `on_apply`, when given, is called after every applied set of changes, e.g. to export metrics.
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop_event.set())
+
+    # Create the pools with TCP keepalives before anything borrows from them
+    get_pool(dev_db_name(), keepalive=True)
+    get_pool(prod_db_name(), keepalive=True)
+
+    with connection(dev_db_name()) as dev_conn:
+        table_specs = load_table_specs(dev_conn)
+        install_change_triggers(dev_conn, table_specs)
+    specs_by_name = {spec.name: spec for spec in table_specs}
+    validators = create_validators(table_specs)
+    with connection(prod_db_name()) as prod_conn:
+        ensure_sync_state_table(prod_conn)
+        ensure_quarantine_table(prod_conn)
+        ensure_large_value_table(prod_conn)
+
+    listen_conn = None
+    pending = PendingChanges(debounce, max_delay, max_pending)
+    try:
+        while not stop_event.is_set():
+            if listen_conn is None:
+                # Listen before catching up, so that no change falls between the two
+                listen_conn = with_retries(listen)
+                caught_up = with_retries(catch_up, table_specs, batch_size, validators=validators)
+                logging.info(f"Listening for DEV changes; caught up {caught_up} changed records.")
+
+            try:
+                readable, _, _ = select.select([listen_conn], [], [], pending.timeout())
+                if readable:
+                    listen_conn.poll()
+            except (OSError, psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                logging.warning(f"Lost the DEV change notification connection: {e}")
+                increment("retries_total", reason="listen")
+                listen_conn.close()
+                listen_conn = None
+                continue
+
+            while listen_conn.notifies:
+                notify = listen_conn.notifies.pop(0)
+                table_name, key = parse_notification(notify.payload)
+                if table_name in specs_by_name:
+                    pending.add(table_name, key)
+
+            if not pending.due():
+                continue
+
+            changes, rows, delay = pending.take()
+            observe("change_delay_seconds", delay)
+            with stage_timer("apply"):
+                upserted, deleted, quarantined = with_retries(apply_changes, changes, table_specs, batch_size,
+                                                              validators=validators)
+            logging.info(f"Applied {rows} DEV changes to PROD: {upserted} upserted, {deleted} deleted, "
+                         f"{quarantined} quarantined.")
+            if on_apply is not None:
+                on_apply()
+
+        if pending.rows:
+            changes, rows, _ = pending.take()
+            with_retries(apply_changes, changes, table_specs, batch_size, validators=validators)
+            logging.info(f"Applied the last {rows} DEV changes before stopping.")
+    finally:
+        if listen_conn is not None:
+            listen_conn.close()
+    logging.info("Sync daemon stopped.")
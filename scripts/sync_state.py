@@ -0,0 +1,115 @@
+"""
+# sync_state.py
+
+## Purpose:
+This module persists incremental synchronization state and transfer checkpoints in the PROD database.
+
+## Usage:
+This module is used internally by `validate_and_transfer.py` and is not run directly.
+
+## Details:
+- Keeps a per-table high-water mark in the `sync_state` table on PROD.
+- The high-water mark is the largest DEV `updated_at` value that has been transferred successfully,
+  so later runs only read rows changed since then.
+- Keeps named checkpoints in the `transfer_checkpoints` table on PROD: the last key that was written
+  by a transfer that is still in progress. Checkpoints are written in the same transaction as the batch
+  they describe, so a restarted transfer can resume after them without losing records.
+"""
+
+import os
+import datetime
+
+# Rows changed this long before the stored high-water mark are read again. Transactions that were in
+# flight during the previous run are already covered by `get_change_high_water_mark`, which keeps the
+# mark below their start; the overlap is a margin for sessions it cannot see in `pg_stat_activity`
+SYNC_OVERLAP = datetime.timedelta(seconds=int(os.getenv("SYNC_OVERLAP_SECONDS", "60")))
+
+def ensure_sync_state_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                table_name VARCHAR(255) PRIMARY KEY,
+                high_water_mark TIMESTAMPTZ,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+    conn.commit()
+
+def get_high_water_mark(conn, table_name):
+    """Return the stored high-water mark for the table, or None if it has never been synced."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT high_water_mark FROM sync_state WHERE table_name = %s;", (table_name,))
+        row = cursor.fetchone()
+    conn.commit()
+    return row[0] if row else None
+
+def save_high_water_mark(conn, table_name, high_water_mark):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO sync_state (table_name, high_water_mark, updated_at)
+            VALUES (%s, %s, now())
+            ON CONFLICT (table_name)
+            DO UPDATE SET high_water_mark = EXCLUDED.high_water_mark,
+                          updated_at = EXCLUDED.updated_at;
+        """, (table_name, high_water_mark))
+    conn.commit()
+
+def get_sync_window_start(conn, table_name):
+    """Return the `updated_at` lower bound for the next incremental read, or None for a full read."""
+    high_water_mark = get_high_water_mark(conn, table_name)
+    if high_water_mark is None:
+        return None
+    return high_water_mark - SYNC_OVERLAP
+
+def ensure_checkpoint_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS transfer_checkpoints (
+                name VARCHAR(255) PRIMARY KEY,
+                table_name VARCHAR(255) NOT NULL,
+                last_key TEXT,
+                high_water_mark TIMESTAMPTZ,
+                completed BOOLEAN NOT NULL DEFAULT false,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+    conn.commit()
+
+def get_checkpoint(conn, name):
+    """Return the checkpoint as a dict with `last_key`, `high_water_mark` and `completed`, or None."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT last_key, high_water_mark, completed
+            FROM transfer_checkpoints
+            WHERE name = %s;
+        """, (name,))
+        row = cursor.fetchone()
+    conn.commit()
+    if row is None:
+        return None
+    return {"last_key": row[0], "high_water_mark": row[1], "completed": row[2]}
+
+def save_checkpoint(conn, name, table_name, last_key, high_water_mark=None, completed=False, commit=True):
+    """
+    Record the last key written by a transfer. With `commit=False` the checkpoint becomes part of
+    the caller's transaction, which is how it is tied to the batch it describes.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO transfer_checkpoints (name, table_name, last_key, high_water_mark, completed, updated_at)
+            VALUES (%s, %s, %s, %s, %s, now())
+            ON CONFLICT (name)
+            DO UPDATE SET last_key = EXCLUDED.last_key,
+                          high_water_mark = EXCLUDED.high_water_mark,
+                          completed = EXCLUDED.completed,
+                          updated_at = EXCLUDED.updated_at;
+        """, (name, table_name, None if last_key is None else str(last_key), high_water_mark, completed))
+    if commit:
+        conn.commit()
+
+def clear_checkpoints(conn, name_prefix):
+    """Remove the checkpoints of a finished transfer, so that the next run starts from the beginning."""
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM transfer_checkpoints WHERE left(name, length(%s)) = %s;",
+                       (name_prefix, name_prefix))
+    conn.commit()
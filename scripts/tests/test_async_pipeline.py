@@ -0,0 +1,149 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+import psycopg2
+from dotenv import load_dotenv
+
+import async_pipeline
+from async_pipeline import CHECKPOINT_NAME, ChunkProgress, run_pipeline
+from sync_state import ensure_checkpoint_table, get_checkpoint
+
+
+load_dotenv()
+
+# Generous bound on a run over a handful of rows; a pipeline that hangs on its queue never finishes
+PIPELINE_TIMEOUT = 30
+
+def connect(dbname):
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST"),
+        dbname=dbname,
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        port=os.getenv("DB_PORT")
+    )
+
+def run(**kwargs):
+    return asyncio.run(asyncio.wait_for(run_pipeline(**kwargs), PIPELINE_TIMEOUT))
+
+class TestChunkProgress(unittest.TestCase):
+
+    def test_checkpoint_waits_for_earlier_chunks(self):
+        progress = ChunkProgress()
+        # Chunk 1 is written before chunk 0, so nothing below it is known to be written yet
+        self.assertIsNone(progress.checkpoint_key(1, 4))
+        progress.complete(1, 4)
+        self.assertIsNone(progress.last_key)
+        # Once chunk 0 is written too, the checkpoint jumps past both
+        self.assertEqual(progress.checkpoint_key(0, 2), 4)
+        progress.complete(0, 2)
+        self.assertEqual(progress.last_key, 4)
+        self.assertEqual(progress.written_ahead, {})
+
+    def test_resumed_progress_starts_from_the_checkpoint(self):
+        progress = ChunkProgress(last_key=10)
+        self.assertEqual(progress.checkpoint_key(1, 14), 10)
+        self.assertEqual(progress.checkpoint_key(0, 12), 12)
+
+class TestAsyncPipeline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dev_conn = connect(os.getenv("DB_DEV_NAME"))
+        cls.prod_conn = connect(os.getenv("DB_PROD_NAME"))
+        ensure_checkpoint_table(cls.prod_conn)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dev_conn.close()
+        cls.prod_conn.close()
+
+    def setUp(self):
+        for conn in (self.dev_conn, self.prod_conn):
+            self.create_sample_data(conn)
+        with self.dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                SELECT n, 1, 'Pipeline Document ' || n, 'Content ' || n
+                FROM generate_series(1, 7) AS n;
+            """)
+        self.dev_conn.commit()
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("DELETE FROM transfer_checkpoints WHERE name = %s;", (CHECKPOINT_NAME,))
+        self.prod_conn.commit()
+
+    def create_sample_data(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM images;")
+            cursor.execute("DELETE FROM documents;")
+            cursor.execute("DELETE FROM companies;")
+            cursor.execute("DELETE FROM categories;")
+            cursor.execute("""
+                INSERT INTO categories (id, title, description)
+                VALUES (1, 'Sample Category', 'Description of Sample Category');
+            """)
+            cursor.execute("""
+                INSERT INTO companies (id, category_id, title, site_url, description)
+                VALUES (1, 1, 'Sample Company', 'http://example.com', 'Description of Sample Company');
+            """)
+        conn.commit()
+
+    def prod_document_ids(self):
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM documents ORDER BY id;")
+            ids = [row[0] for row in cursor.fetchall()]
+        self.prod_conn.commit()
+        return ids
+
+    def test_rows_arrive_on_prod(self):
+        stats = run(batch_size=2, queue_size=1, writers=2)
+
+        self.assertEqual(stats["extracted"], 7)
+        self.assertEqual(stats["inserted"], 7)
+        self.assertEqual(self.prod_document_ids(), [1, 2, 3, 4, 5, 6, 7])
+        self.assertIsNone(get_checkpoint(self.prod_conn, CHECKPOINT_NAME),
+                          "A completed run should clear its checkpoint.")
+
+    def test_writer_failure_stops_the_pipeline_and_keeps_the_checkpoint(self):
+        transfer_batch = async_pipeline.transfer_batch
+
+        def failing_transfer_batch(prod_conn, batch, *args):
+            if batch[0][0] >= 5:
+                raise RuntimeError("PROD went away")
+            return transfer_batch(prod_conn, batch, *args)
+
+        with mock.patch("async_pipeline.transfer_batch", failing_transfer_batch):
+            with self.assertRaises(RuntimeError):
+                run(batch_size=2, queue_size=1, writers=1)
+
+        # The chunks before the failing one were written, and the checkpoint advanced with them
+        self.assertEqual(self.prod_document_ids(), [1, 2, 3, 4])
+        self.assertEqual(get_checkpoint(self.prod_conn, CHECKPOINT_NAME)["last_key"], "4")
+
+        # The next run resumes after the checkpoint
+        stats = run(batch_size=2, queue_size=1, writers=2)
+        self.assertEqual(stats["extracted"], 3)
+        self.assertEqual(self.prod_document_ids(), [1, 2, 3, 4, 5, 6, 7])
+        self.assertIsNone(get_checkpoint(self.prod_conn, CHECKPOINT_NAME))
+
+    def test_unreachable_prod_raises_instead_of_hanging(self):
+        get_pool = async_pipeline.get_pool
+        prod_db_name = os.getenv("DB_PROD_NAME")
+
+        def pool_without_prod(db_name):
+            pool = get_pool(db_name)
+            if db_name != prod_db_name:
+                return pool
+            unreachable = mock.Mock(wraps=pool)
+            unreachable.getconn.side_effect = psycopg2.OperationalError("could not connect to server")
+            return unreachable
+
+        with mock.patch("async_pipeline.get_pool", pool_without_prod):
+            with self.assertRaises(psycopg2.OperationalError):
+                run(batch_size=1, queue_size=1, writers=2)
+
+        self.assertEqual(self.prod_document_ids(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import benchmark
+from generate_synthetic_data import DEFAULT_CONFIG
+from planner import TablePlan, estimate_duration, load_throughput
+
+
+class TestBenchmarkReport(unittest.TestCase):
+
+    def run_mode(self, mode, exit_code=0, transfer_seconds=2.0):
+        """Run `benchmark_mode` with the databases and the child process replaced by fixed measurements."""
+        clock = iter([0.0, 1.0, 1.0, 2.0, 2.0, 2.0 + transfer_seconds, 10.0, 11.0])
+        with mock.patch("benchmark.insert_data"), \
+                mock.patch("benchmark.transferred_tables", return_value=["documents"]), \
+                mock.patch("benchmark.measure_tables", return_value=(1000, 4 * 1024 * 1024)), \
+                mock.patch("benchmark.run_transfer", return_value=(exit_code, 51200)), \
+                mock.patch("benchmark.time.perf_counter", side_effect=lambda: next(clock)):
+            return benchmark.benchmark_mode(mode, DEFAULT_CONFIG)
+
+    def report(self, *results):
+        return {"commit": None, "timestamp": "2026-01-01T00:00:00", "config": DEFAULT_CONFIG._asdict(),
+                "results": list(results)}
+
+    def test_mode_result(self):
+        result = self.run_mode("upsert")
+
+        self.assertEqual(result["stages"], {"seed_dev": 1.0, "seed_prod": 1.0, "transfer": 2.0, "verify": 1.0})
+        self.assertEqual(result["rows_per_second"], 500.0)
+        self.assertEqual(result["mb_per_second"], 2.0)
+        self.assertEqual(result["peak_rss_mb"], 50.0)
+
+    def test_planner_reads_the_saved_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            benchmark.save_results(self.report(self.run_mode("upsert"), self.run_mode("copy", transfer_seconds=0.5)),
+                                   os.path.join(directory, "report.json"))
+            throughput = load_throughput(directory)
+
+        self.assertEqual(throughput, {"upsert": (500.0, 2.0), "copy": (2000.0, 8.0)})
+
+    def test_modes_are_estimated_from_the_rows_they_process(self):
+        megabyte = 1024 * 1024
+        tables = [
+            TablePlan(table="documents", source=10000, insert=60, update=40, unchanged=9900, conflicts=0,
+                      bytes=megabyte, source_bytes=16 * megabyte),
+            TablePlan(table="images", source=60000, insert=5000, update=0, unchanged=55000, conflicts=0,
+                      bytes=megabyte, source_bytes=8 * megabyte),
+        ]
+        throughput = {"upsert": (500.0, 2.0), "copy": (2000.0, 8.0), "diff": (1000.0, 0.5)}
+
+        # upsert reads every document, copy every row of every table, diff only the changed documents
+        self.assertEqual(estimate_duration(tables, throughput), {"upsert": 20.0, "copy": 35.0, "diff": 2.0})
+
+    def test_failed_modes_are_left_out(self):
+        with tempfile.TemporaryDirectory() as directory:
+            benchmark.save_results(self.report(self.run_mode("upsert"), self.run_mode("async", exit_code=1)),
+                                   os.path.join(directory, "report.json"))
+            self.assertEqual(set(load_throughput(directory)), {"upsert"})
+
+    def test_newest_report_is_used(self):
+        with tempfile.TemporaryDirectory() as directory:
+            old = benchmark.save_results(self.report(self.run_mode("upsert", transfer_seconds=4.0)),
+                                         os.path.join(directory, "old.json"))
+            benchmark.save_results(self.report(self.run_mode("upsert")), os.path.join(directory, "new.json"))
+            os.utime(old, (0, 0))
+            self.assertEqual(load_throughput(directory), {"upsert": (500.0, 2.0)})
+
+    def test_no_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(load_throughput(directory), {})
+
+if __name__ == '__main__':
+    unittest.main()
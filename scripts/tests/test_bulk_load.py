@@ -0,0 +1,117 @@
+import unittest
+from unittest import mock
+import psycopg2
+from dotenv import load_dotenv
+import os
+
+import bulk_load
+from bulk_load import bulk_load_data
+
+
+load_dotenv()
+
+class TestBulkLoad(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dev_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_DEV_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+
+        cls.prod_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_PROD_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+
+        cls.clear_data(cls.prod_conn)
+        cls.clear_data(cls.dev_conn)
+        with cls.dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO categories (id, title, description)
+                VALUES (1, 'Sample Category', 'Description of Sample Category');
+            """)
+            cursor.execute("""
+                INSERT INTO companies (id, category_id, title, site_url, description)
+                VALUES (1, 1, 'Sample Company', 'http://example.com', 'Description of Sample Company');
+            """)
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (1, 1, 'Sample Document', 'Content of Sample Document');
+            """)
+            cursor.execute("""
+                INSERT INTO images (id, document_id, image_url, description)
+                VALUES (1, 1, 'http://example.com/image.jpg', 'Sample Image Description');
+            """)
+        cls.dev_conn.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dev_conn.close()
+        cls.prod_conn.close()
+
+    @classmethod
+    def clear_data(cls, conn):
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM images;")
+            cursor.execute("DELETE FROM documents;")
+            cursor.execute("DELETE FROM companies_categories;")
+            cursor.execute("DELETE FROM companies;")
+            cursor.execute("DELETE FROM categories;")
+        conn.commit()
+
+    def test_indexes_are_rebuilt_after_load(self):
+        results = bulk_load_data()
+
+        self.assertEqual(results["documents"], (1, 0))
+        self.assertEqual(results["images"], (1, 0))
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname, i.indisvalid
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname IN ('idx_documents_title', 'idx_images_url')
+                ORDER BY c.relname;
+            """)
+            self.assertEqual(cursor.fetchall(), [('idx_documents_title', True), ('idx_images_url', True)])
+            cursor.execute("SELECT COUNT(*) FROM pending_indexes;")
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.prod_conn.commit()
+
+    def test_unique_indexes_are_enforced_at_commit(self):
+        rebuild_pending_indexes = bulk_load.rebuild_pending_indexes
+        duplicate_errors = []
+        calls = []
+
+        def insert_duplicate_then_rebuild(prod_conn):
+            calls.append(prod_conn)
+            # The first call runs before the load; only the one after the commit races another writer
+            if len(calls) == 1:
+                return rebuild_pending_indexes(prod_conn)
+            try:
+                with self.prod_conn.cursor() as cursor:
+                    cursor.execute("""
+                        INSERT INTO documents (id, company_id, title, content)
+                        VALUES (2, 1, 'Sample Document', 'Duplicate title');
+                    """)
+                self.prod_conn.commit()
+                duplicate_errors.append(None)
+            except psycopg2.IntegrityError as e:
+                self.prod_conn.rollback()
+                duplicate_errors.append(e)
+            return rebuild_pending_indexes(prod_conn)
+
+        with mock.patch("bulk_load.rebuild_pending_indexes", insert_duplicate_then_rebuild):
+            bulk_load_data()
+
+        self.assertEqual(len(duplicate_errors), 1)
+        self.assertIsInstance(duplicate_errors[0], psycopg2.errors.UniqueViolation)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import threading
+import unittest
+
+from copy_transfer import BoundedBuffer
+
+
+class TestBoundedBuffer(unittest.TestCase):
+
+    def test_pipes_all_data_in_order(self):
+        pipe = BoundedBuffer(max_chunks=2)
+        rows = [f"{i}\tSample Document {i}\n".encode() for i in range(500)]
+
+        def produce():
+            for row in rows:
+                pipe.write(row)
+            pipe.close()
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+
+        received = b""
+        while True:
+            data = pipe.read(8192)
+            if not data:
+                break
+            received += data
+        producer.join()
+
+        self.assertEqual(received, b"".join(rows))
+
+    def test_abort_unblocks_producer(self):
+        pipe = BoundedBuffer(max_chunks=1)
+        errors = []
+
+        def produce():
+            try:
+                for _ in range(10):
+                    pipe.write(b"row\n")
+            except IOError as e:
+                errors.append(e)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        pipe.abort()
+        producer.join(timeout=5)
+
+        self.assertFalse(producer.is_alive())
+        self.assertEqual(len(errors), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from dotenv import load_dotenv
+import os
+
+from create_databases_and_tables import apply_schema, provision_databases
+
+
+load_dotenv()
+
+TEMPLATE = "test_provision_template"
+DATABASES = ["test_provision_a", "test_provision_b"]
+
+def connect(dbname):
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST"),
+        dbname=dbname,
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        port=os.getenv("DB_PORT")
+    )
+
+class TestProvisioning(unittest.TestCase):
+
+    @classmethod
+    def drop_databases(cls):
+        conn = connect("postgres")
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            for db_name in DATABASES + [TEMPLATE]:
+                cursor.execute(f"DROP DATABASE IF EXISTS {db_name};")
+        conn.close()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.drop_databases()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.drop_databases()
+
+    def test_clones_are_provisioned_from_template(self):
+        provision_databases(DATABASES, template=TEMPLATE)
+        # Applying the schema again is a no-op
+        apply_schema(DATABASES[0])
+
+        for db_name in DATABASES:
+            conn = connect(db_name)
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT table_name FROM information_schema.tables
+                    WHERE table_schema = 'public' ORDER BY table_name;
+                """)
+                tables = [row[0] for row in cursor.fetchall()]
+            conn.close()
+            self.assertEqual(tables, ["categories", "companies", "companies_categories", "documents", "images"])
+
+if __name__ == '__main__':
+    unittest.main()
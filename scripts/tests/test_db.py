@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+import psycopg2
+
+import data_transfer
+from db import with_retries
+
+
+class FlakyOperation:
+    """Fails with `error` on the first `failures` calls, then returns 'done'."""
+
+    def __init__(self, failures, error=psycopg2.OperationalError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+        self.__name__ = "flaky_operation"
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("server closed the connection unexpectedly")
+        return "done"
+
+class TestWithRetries(unittest.TestCase):
+
+    def test_retries_with_growing_backoff(self):
+        operation = FlakyOperation(failures=3)
+        # Without jitter, the delays are exactly base_delay doubled after every attempt
+        with mock.patch("db.time.sleep") as sleep, mock.patch("db.random.uniform", return_value=1.0):
+            result = with_retries(operation, attempts=5, base_delay=0.5)
+
+        self.assertEqual(result, "done")
+        self.assertEqual(operation.calls, 4)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0, 2.0])
+
+    def test_jitter_stays_within_bounds(self):
+        operation = FlakyOperation(failures=4)
+        with mock.patch("db.time.sleep") as sleep:
+            with_retries(operation, attempts=5, base_delay=1.0)
+
+        delays = [call.args[0] for call in sleep.call_args_list]
+        for attempt, delay in enumerate(delays):
+            self.assertGreaterEqual(delay, 0.5 * 2 ** attempt)
+            self.assertLessEqual(delay, 1.5 * 2 ** attempt)
+
+    def test_last_connection_error_is_raised(self):
+        operation = FlakyOperation(failures=10, error=psycopg2.InterfaceError)
+        with mock.patch("db.time.sleep") as sleep:
+            with self.assertRaises(psycopg2.InterfaceError):
+                with_retries(operation, attempts=3, base_delay=1.0)
+
+        self.assertEqual(operation.calls, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_other_errors_are_not_retried(self):
+        operation = FlakyOperation(failures=1, error=ValueError)
+        with mock.patch("db.time.sleep") as sleep:
+            with self.assertRaises(ValueError):
+                with_retries(operation, attempts=5, base_delay=1.0)
+
+        self.assertEqual(operation.calls, 1)
+        sleep.assert_not_called()
+
+    def test_transfer_is_retried_after_connection_error(self):
+        operation = FlakyOperation(failures=2)
+        transfer = mock.Mock(side_effect=lambda **kwargs: operation() and {"extracted": 1})
+        with mock.patch("data_transfer.validate_and_transfer_data", transfer), mock.patch("db.time.sleep"):
+            succeeded = data_transfer.main(mode="upsert")
+
+        self.assertTrue(succeeded)
+        self.assertEqual(transfer.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@ import psycopg2
 from dotenv import load_dotenv
 import os
 
+from extract_data_from_dev import get_change_high_water_mark, stream_new_records
+
 load_dotenv()
 
 class TestDatabaseOperations(unittest.TestCase):
@@ -110,6 +112,57 @@ class TestDatabaseOperations(unittest.TestCase):
             self.assertEqual(relation[0], self.get_company_id())  # Company ID
             self.assertEqual(relation[1], self.get_category_id())  # Category ID
 
+    def test_stream_new_records(self):
+        records = list(stream_new_records(itersize=1))
+        self.assertIn('Sample Document', [record[2] for record in records])
+
+        chunks = list(stream_new_records(chunk_size=1))
+        self.assertTrue(all(len(chunk) == 1 for chunk in chunks))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), len(records))
+
+    def test_update_advances_updated_at(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT updated_at FROM documents WHERE title = 'Sample Document';")
+            before = cursor.fetchone()[0]
+        self.conn.commit()
+        with self.conn.cursor() as cursor:
+            cursor.execute("UPDATE documents SET content = 'Edited content' WHERE title = 'Sample Document';")
+            cursor.execute("SELECT updated_at FROM documents WHERE title = 'Sample Document';")
+            after = cursor.fetchone()[0]
+        self.conn.commit()
+        self.assertGreater(after, before)
+
+    def test_high_water_mark_stays_below_running_transactions(self):
+        running_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_DEV_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+        try:
+            # A transaction that started before the update below and has not committed yet
+            with running_conn.cursor() as cursor:
+                cursor.execute("SELECT now();")
+                running_since = cursor.fetchone()[0]
+            with self.conn.cursor() as cursor:
+                cursor.execute("UPDATE documents SET content = 'Newer content' WHERE title = 'Sample Document';")
+            self.conn.commit()
+
+            high_water_mark = get_change_high_water_mark(self.conn, "documents")
+            self.conn.commit()
+            self.assertLess(high_water_mark, running_since)
+        finally:
+            running_conn.rollback()
+            running_conn.close()
+
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT max(updated_at) FROM documents;")
+            newest = cursor.fetchone()[0]
+        self.conn.commit()
+        self.assertEqual(get_change_high_water_mark(self.conn, "documents"), newest)
+        self.conn.commit()
+
     def get_company_id(self):
         with self.conn.cursor() as cursor:
             cursor.execute("SELECT id FROM companies WHERE title = 'Sample Company';")
@@ -0,0 +1,120 @@
+import os
+import unittest
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from dotenv import load_dotenv
+
+from create_databases_and_tables import create_database, provision_databases
+from db import close_all_pools
+from fan_out import Target, fan_out_transfer_data
+from sync_state import ensure_checkpoint_table
+
+
+load_dotenv()
+
+REPLICA = "test_fanout_replica"
+BROKEN = "test_fanout_broken"
+MISSING = "test_fanout_missing"
+
+def connect(dbname):
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST"),
+        dbname=dbname,
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        port=os.getenv("DB_PORT")
+    )
+
+class TestTargetQueue(unittest.TestCase):
+
+    def test_failed_target_does_not_block_the_reader(self):
+        target = Target("unreachable", queue_size=1)
+        target.offer(["first batch"])
+        target.failed.set()
+        # The queue is full, but the target is gone, so the batch is dropped instead of waited on
+        target.offer(["second batch"])
+        self.assertEqual(target.queue.qsize(), 1)
+
+class TestFanOutTransfer(unittest.TestCase):
+
+    @classmethod
+    def drop_databases(cls):
+        # Pooled connections would keep the databases from being dropped
+        close_all_pools()
+        conn = connect("postgres")
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            for db_name in (REPLICA, BROKEN):
+                cursor.execute(f"DROP DATABASE IF EXISTS {db_name};")
+        conn.close()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.drop_databases()
+        provision_databases([REPLICA])
+        # A database without the tables, so its writer fails on the first batch
+        create_database(BROKEN)
+
+        cls.dev_conn = connect(os.getenv("DB_DEV_NAME"))
+        cls.prod_conn = connect(os.getenv("DB_PROD_NAME"))
+        cls.replica_conn = connect(REPLICA)
+        for conn in (cls.dev_conn, cls.prod_conn, cls.replica_conn):
+            cls.create_sample_data(conn)
+        with cls.dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                SELECT n, 1, 'Fan Out Document ' || n, 'Content ' || n
+                FROM generate_series(1, 5) AS n;
+            """)
+        cls.dev_conn.commit()
+        ensure_checkpoint_table(cls.prod_conn)
+        with cls.prod_conn.cursor() as cursor:
+            cursor.execute("DELETE FROM transfer_checkpoints WHERE name LIKE 'fanout:%';")
+        cls.prod_conn.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dev_conn.close()
+        cls.prod_conn.close()
+        cls.replica_conn.close()
+        cls.drop_databases()
+
+    @classmethod
+    def create_sample_data(cls, conn):
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM images;")
+            cursor.execute("DELETE FROM documents;")
+            cursor.execute("DELETE FROM companies;")
+            cursor.execute("DELETE FROM categories;")
+            cursor.execute("""
+                INSERT INTO categories (id, title, description)
+                VALUES (1, 'Sample Category', 'Description of Sample Category');
+            """)
+            cursor.execute("""
+                INSERT INTO companies (id, category_id, title, site_url, description)
+                VALUES (1, 1, 'Sample Company', 'http://example.com', 'Description of Sample Company');
+            """)
+        conn.commit()
+
+    def test_failing_targets_do_not_stop_the_healthy_ones(self):
+        prod_db_name = os.getenv("DB_PROD_NAME")
+        results = fan_out_transfer_data(targets=[prod_db_name, REPLICA, BROKEN, MISSING], batch_size=2,
+                                        queue_size=1)
+
+        self.assertIsNone(results[prod_db_name]["error"])
+        self.assertIsNone(results[REPLICA]["error"])
+        self.assertIsNotNone(results[BROKEN]["error"])
+        self.assertIsNotNone(results[MISSING]["error"])
+        self.assertEqual(results[prod_db_name]["inserted"], 5)
+        self.assertEqual(results[REPLICA]["inserted"], 5)
+
+        for conn in (self.prod_conn, self.replica_conn):
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT id FROM documents ORDER BY id;")
+                self.assertEqual([row[0] for row in cursor.fetchall()], [1, 2, 3, 4, 5])
+                cursor.execute("SELECT COUNT(*) FROM transfer_checkpoints WHERE name LIKE 'fanout:%';")
+                self.assertEqual(cursor.fetchone()[0], 0, "Completed targets should clear their checkpoint.")
+            conn.commit()
+
+if __name__ == '__main__':
+    unittest.main()
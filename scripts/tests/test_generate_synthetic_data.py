@@ -0,0 +1,58 @@
+import unittest
+
+from generate_synthetic_data import DEFAULT_CONFIG, generate_rows, table_sizes
+
+
+def documents(config, side):
+    return {row["id"]: row for table, row in generate_rows(config, side) if table == "documents"}
+
+class TestGenerateSyntheticData(unittest.TestCase):
+
+    def test_same_seed_generates_the_same_rows(self):
+        config = DEFAULT_CONFIG._replace(scale=0.1)
+        for side in ("dev", "prod"):
+            self.assertEqual(list(generate_rows(config, side)), list(generate_rows(config, side)))
+        self.assertNotEqual(list(generate_rows(config, "dev")),
+                            list(generate_rows(config._replace(seed=config.seed + 1), "dev")))
+
+    def test_table_sizes_follow_the_scale(self):
+        config = DEFAULT_CONFIG._replace(scale=0.1)
+        counts = {}
+        for table, _ in generate_rows(config, "dev"):
+            counts[table] = counts.get(table, 0) + 1
+        sizes = table_sizes(config)
+        self.assertEqual(counts, {**sizes, "companies_categories": sizes["companies"]})
+
+    def test_without_changes_prod_matches_dev(self):
+        config = DEFAULT_CONFIG._replace(scale=0.2, change_rate=0, title_collision_rate=0)
+        self.assertEqual(list(generate_rows(config, "dev")), list(generate_rows(config, "prod")))
+
+    def test_change_and_collision_rates_are_honoured(self):
+        config = DEFAULT_CONFIG._replace(scale=2, content_size=100, change_rate=0.2, title_collision_rate=0.05)
+        dev = documents(config, "dev")
+        prod = documents(config, "prod")
+
+        colliding = [row for document_id, row in prod.items() if document_id not in dev]
+        collision_rate = len(colliding) / len(dev)
+        self.assertAlmostEqual(collision_rate, config.title_collision_rate, delta=0.02)
+        # Every colliding PROD document takes the title of a DEV document that is missing from PROD
+        dev_titles = {row["title"]: document_id for document_id, row in dev.items()}
+        for row in colliding:
+            self.assertNotIn(dev_titles[row["title"]], prod)
+
+        changed = [document_id for document_id, row in dev.items()
+                   if document_id not in prod or prod[document_id]["content"] != row["content"]]
+        # Colliding documents are missing from PROD as well
+        change_rate = (len(changed) - len(colliding)) / (len(dev) - len(colliding))
+        self.assertAlmostEqual(change_rate, config.change_rate, delta=0.03)
+
+    def test_prod_images_only_reference_prod_documents(self):
+        config = DEFAULT_CONFIG._replace(scale=0.5, change_rate=0.3)
+        rows = list(generate_rows(config, "prod"))
+        document_ids = {row["id"] for table, row in rows if table == "documents"}
+        for table, row in rows:
+            if table == "images":
+                self.assertIn(row["document_id"], document_ids)
+
+if __name__ == '__main__':
+    unittest.main()
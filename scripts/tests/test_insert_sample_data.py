@@ -0,0 +1,30 @@
+import json
+import os
+import tempfile
+import unittest
+
+from insert_sample_data import iter_dict_rows, iter_json_rows, sample_data_path
+
+
+class TestIterJsonRows(unittest.TestCase):
+
+    def test_matches_json_load_for_any_read_size(self):
+        file_path = sample_data_path('dev_sample_data.json')
+        with open(file_path, 'r') as file:
+            expected = list(iter_dict_rows(json.load(file)))
+
+        for read_size in (1, 2, 7, 64, 1024 * 1024):
+            self.assertEqual(list(iter_json_rows(file_path, read_size)), expected)
+
+    def test_numbers_split_across_reads(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as file:
+            file.write('{"documents": [{"id": 123456, "title": "A"}], "images": []}')
+        try:
+            rows = list(iter_json_rows(file.name, read_size=3))
+        finally:
+            os.remove(file.name)
+
+        self.assertEqual(rows, [('documents', {'id': 123456, 'title': 'A'})])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from metrics import MetricsRegistry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_prometheus_histogram_is_cumulative(self):
+        registry = MetricsRegistry()
+        for value in (0.001, 0.02, 0.02, 400.0):
+            registry.observe("stage_seconds", value, stage="write", table="documents")
+
+        lines = registry.to_prometheus().splitlines()
+
+        self.assertIn("# TYPE db_transfer_stage_seconds histogram", lines)
+        self.assertIn('db_transfer_stage_seconds_bucket{stage="write",table="documents",le="0.005"} 1', lines)
+        self.assertIn('db_transfer_stage_seconds_bucket{stage="write",table="documents",le="0.025"} 3', lines)
+        self.assertIn('db_transfer_stage_seconds_bucket{stage="write",table="documents",le="+Inf"} 4', lines)
+        self.assertIn('db_transfer_stage_seconds_count{stage="write",table="documents"} 4', lines)
+
+    def test_report_sums_stages_over_tables(self):
+        registry = MetricsRegistry()
+        registry.observe("stage_seconds", 1.5, stage="write", table="documents")
+        registry.observe("stage_seconds", 0.5, stage="write", table="images")
+        registry.increment("rows_total", 10, table="documents", result="updated")
+        registry.increment("rows_total", 5, table="documents", result="updated")
+
+        report = registry.to_report()
+
+        self.assertEqual(report["stages"], {"write": 2.0})
+        self.assertEqual(report["counters"], [
+            {"name": "rows_total", "labels": {"result": "updated", "table": "documents"}, "value": 15},
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from unittest import mock
+import psycopg2
+from dotenv import load_dotenv
+import os
+
+from parallel_transfer import parallel_transfer_data, split_key_ranges
+from schema import get_table_spec, load_table_specs
+
+
+load_dotenv()
+
+def key_bounds_connection(low, high):
+    """A DEV connection whose table has keys from `low` to `high`."""
+    conn = mock.MagicMock()
+    conn.cursor.return_value.__enter__.return_value.fetchone.return_value = (low, high)
+    return conn
+
+class TestSplitKeyRanges(unittest.TestCase):
+
+    def test_ranges_are_aligned_to_the_range_size(self):
+        spec = get_table_spec("documents")
+        self.assertEqual(split_key_ranges(key_bounds_connection(7, 23), spec, range_size=10),
+                         [(0, 10), (10, 20), (20, 30)])
+
+    def test_ranges_keep_their_bounds_as_the_table_changes(self):
+        spec = get_table_spec("documents")
+        before = split_key_ranges(key_bounds_connection(7, 23), spec, range_size=10)
+        # The smallest key was deleted and the table grew past the last range
+        after = split_key_ranges(key_bounds_connection(12, 31), spec, range_size=10)
+        self.assertEqual(set(before) & set(after), {(10, 20), (20, 30)})
+        self.assertEqual(after, [(10, 20), (20, 30), (30, 40)])
+
+    def test_empty_table_has_no_ranges(self):
+        self.assertEqual(split_key_ranges(key_bounds_connection(None, None), get_table_spec("documents")), [])
+
+class TestParallelTransfer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dev_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_DEV_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+
+        cls.prod_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_PROD_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+
+        cls.clear_data(cls.prod_conn)
+        cls.clear_data(cls.dev_conn)
+        with cls.dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO categories (id, title, description)
+                VALUES (1, 'Sample Category', 'Description of Sample Category');
+            """)
+            cursor.execute("""
+                INSERT INTO companies (id, category_id, title, site_url, description)
+                VALUES (1, 1, 'Sample Company', 'http://example.com', 'Description of Sample Company');
+            """)
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (1, 1, 'Sample Document', 'Content of Sample Document');
+            """)
+            cursor.execute("""
+                INSERT INTO images (id, document_id, image_url, description)
+                VALUES (1, 1, 'http://example.com/image.jpg', 'Sample Image Description');
+            """)
+            cursor.execute("INSERT INTO companies_categories (company_id, category_id) VALUES (1, 1);")
+        cls.dev_conn.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dev_conn.close()
+        cls.prod_conn.close()
+
+    @classmethod
+    def clear_data(cls, conn):
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM images;")
+            cursor.execute("DELETE FROM documents;")
+            cursor.execute("DELETE FROM companies_categories;")
+            cursor.execute("DELETE FROM companies;")
+            cursor.execute("DELETE FROM categories;")
+        conn.commit()
+
+    def test_table_specs_in_dependency_order(self):
+        names = [spec.name for spec in load_table_specs(self.dev_conn)]
+        self.assertLess(names.index('categories'), names.index('companies'))
+        self.assertLess(names.index('companies'), names.index('documents'))
+        self.assertLess(names.index('documents'), names.index('images'))
+        self.assertLess(names.index('companies'), names.index('companies_categories'))
+        self.assertNotIn('sync_state', names)
+
+    def test_all_tables_are_transferred(self):
+        results = parallel_transfer_data(workers=2, range_size=1)
+
+        for table in ('categories', 'companies', 'documents', 'images', 'companies_categories'):
+            self.assertEqual(results[table]["updated"], 1, f"Table '{table}' was not transferred.")
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("SELECT company_id, category_id FROM companies_categories;")
+            self.assertEqual(cursor.fetchall(), [(1, 1)])
+
+if __name__ == '__main__':
+    unittest.main()
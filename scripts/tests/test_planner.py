@@ -0,0 +1,96 @@
+import unittest
+import psycopg2
+from dotenv import load_dotenv
+import os
+
+from planner import plan_transfer
+from schema import get_table_spec
+
+
+load_dotenv()
+
+class TestPlanner(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dev_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_DEV_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+
+        cls.prod_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_PROD_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+
+        cls.create_sample_data(cls.dev_conn)
+        cls.create_sample_data(cls.prod_conn)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dev_conn.close()
+        cls.prod_conn.close()
+
+    @classmethod
+    def create_sample_data(cls, conn):
+        with conn.cursor() as cursor:
+            # Clear existing data
+            cursor.execute("DELETE FROM images;")
+            cursor.execute("DELETE FROM documents;")
+            cursor.execute("DELETE FROM companies;")
+            cursor.execute("DELETE FROM categories;")
+
+            cursor.execute("""
+                INSERT INTO categories (id, title, description)
+                VALUES (1, 'Sample Category', 'Description of Sample Category');
+            """)
+            cursor.execute("""
+                INSERT INTO companies (id, category_id, title, site_url, description)
+                VALUES (1, 1, 'Sample Company', 'http://example.com', 'Description of Sample Company');
+            """)
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                SELECT i, 1, 'Sample Document ' || i, 'Content of Sample Document ' || i
+                FROM generate_series(1, 50) AS i;
+            """)
+            conn.commit()
+
+    def test_plan_counts_changes_without_writing(self):
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (60, 1, 'Taken Title', 'Only in PROD');
+            """)
+        self.prod_conn.commit()
+        with self.dev_conn.cursor() as cursor:
+            cursor.execute("UPDATE documents SET content = 'Changed content' WHERE id = 7;")
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (51, 1, 'New Sample Document', 'New content'),
+                       (52, 1, 'Taken Title', 'Title already used in PROD');
+            """)
+        self.dev_conn.commit()
+
+        plan = plan_transfer(table_specs=[get_table_spec("documents")])
+        documents = plan["tables"][0]
+        self.assertEqual(documents["insert"], 1)
+        self.assertEqual(documents["update"], 1)
+        self.assertEqual(documents["conflicts"], 1)
+        self.assertEqual(documents["unchanged"], 49)
+        self.assertGreater(documents["bytes"], 0)
+
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("SELECT content FROM documents WHERE id = 7;")
+            self.assertEqual(cursor.fetchone()[0], 'Content of Sample Document 7')
+            cursor.execute("SELECT COUNT(*) FROM documents WHERE id IN (51, 52);")
+            self.assertEqual(cursor.fetchone()[0], 0, "Planning must not write to PROD.")
+        self.prod_conn.commit()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import tempfile
+import unittest
+import psycopg2
+from dotenv import load_dotenv
+
+from quarantine import ensure_quarantine_table
+from schema import get_table_spec
+from snapshot import CompressedChunkWriter, MappedChunkReader, create_snapshot, file_crc32, replay_snapshot
+
+
+load_dotenv()
+
+class TestChunkFiles(unittest.TestCase):
+
+    def test_round_trip_in_bounded_reads(self):
+        data = os.urandom(50000) + b"repetitive payload " * 100000
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "chunk.copy.z")
+            writer = CompressedChunkWriter(path)
+            for start in range(0, len(data), 8192):
+                writer.write(data[start:start + 8192])
+            writer.close()
+            self.assertLess(writer.compressed_bytes, writer.bytes)
+            self.assertEqual(writer.crc32, file_crc32(path))
+
+            reader = MappedChunkReader(path)
+            parts = []
+            while True:
+                part = reader.read(8192)
+                if not part:
+                    break
+                self.assertLessEqual(len(part), 8192)
+                parts.append(part)
+            reader.close()
+        self.assertEqual(b"".join(parts), data)
+
+class TestSnapshotReplay(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prod_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_PROD_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.prod_conn.close()
+
+    @classmethod
+    def clear_data(cls, conn):
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM images;")
+            cursor.execute("DELETE FROM documents;")
+            cursor.execute("DELETE FROM companies_categories;")
+            cursor.execute("DELETE FROM companies;")
+            cursor.execute("DELETE FROM categories;")
+        conn.commit()
+
+    @classmethod
+    def fetch_rows(cls, conn, spec):
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(spec.columns)} FROM {spec.name} ORDER BY {', '.join(spec.key)};")
+            rows = cursor.fetchall()
+        conn.commit()
+        return rows
+
+    def test_replay_restores_dumped_rows(self):
+        dev_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_DEV_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+        self.clear_data(dev_conn)
+        with dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO categories (id, title, description)
+                VALUES (1, 'Sample Category', NULL), (2, 'Other Category', 'Description of Other Category');
+            """)
+            cursor.execute("""
+                INSERT INTO companies (id, category_id, title, site_url, description)
+                VALUES (1, 1, 'Sample Company', 'http://example.com', 'Description of Sample Company'),
+                       (2, 2, 'Other Company', NULL, NULL);
+            """)
+            # Values that COPY has to escape survive the round trip
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                SELECT n, 1 + n % 2, 'Snapshot Document ' || n, 'Line ' || n || E'\n\ttab \\ backslash ''quote'' é'
+                FROM generate_series(1, 25) AS n;
+            """)
+            cursor.execute("INSERT INTO documents (id, company_id, title, content) VALUES (26, NULL, 'Orphan', NULL);")
+        dev_conn.commit()
+
+        specs = [get_table_spec(name) for name in ("categories", "companies", "documents")]
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                create_snapshot(directory, table_specs=specs, range_size=10)
+                self.clear_data(self.prod_conn)
+                results = replay_snapshot(directory)
+
+            self.assertEqual(results["documents"], (26, 0, 0))
+            for spec in specs:
+                self.assertEqual(self.fetch_rows(self.prod_conn, spec), self.fetch_rows(dev_conn, spec),
+                                 f"PROD '{spec.name}' should match DEV after the replay.")
+        finally:
+            dev_conn.close()
+
+    def test_rows_left_out_of_the_merge_are_quarantined(self):
+        dev_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_DEV_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+        with dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (901, NULL, 'Snapshot Conflict', 'DEV content');
+            """)
+        dev_conn.commit()
+        ensure_quarantine_table(self.prod_conn)
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (902, NULL, 'Snapshot Conflict', 'PROD content');
+            """)
+            cursor.execute("DELETE FROM quarantine WHERE table_name = 'documents' AND record_key = '[901]';")
+        self.prod_conn.commit()
+
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                create_snapshot(directory, table_specs=[get_table_spec("documents")])
+                _, _, quarantined = replay_snapshot(directory)["documents"]
+
+            self.assertGreaterEqual(quarantined, 1)
+            with self.prod_conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT reason FROM quarantine
+                    WHERE table_name = 'documents' AND record_key = '[901]';
+                """)
+                self.assertEqual(cursor.fetchone()[0], "title is already used by another PROD record")
+            self.prod_conn.commit()
+        finally:
+            with dev_conn.cursor() as cursor:
+                cursor.execute("DELETE FROM documents WHERE id = 901;")
+            dev_conn.commit()
+            dev_conn.close()
+            with self.prod_conn.cursor() as cursor:
+                cursor.execute("DELETE FROM documents WHERE id = 902;")
+            self.prod_conn.commit()
+
+if __name__ == '__main__':
+    unittest.main()
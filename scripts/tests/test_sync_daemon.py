@@ -0,0 +1,161 @@
+import unittest
+import psycopg2
+from dotenv import load_dotenv
+import os
+import select
+import time
+
+from schema import load_table_specs
+from sync_daemon import PendingChanges, apply_changes, install_change_triggers, parse_notification
+
+
+load_dotenv()
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class TestPendingChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pending = PendingChanges(debounce=0.5, max_delay=5, max_pending=3, clock=self.clock)
+
+    def test_changes_are_applied_after_a_quiet_period(self):
+        self.assertEqual(self.pending.timeout(idle=1.0), 1.0)
+        self.pending.add("documents", (1,))
+        self.clock.now += 0.4
+        self.pending.add("documents", (1,))
+        self.assertEqual(self.pending.rows, 1, "A row changed twice is applied once.")
+        self.assertAlmostEqual(self.pending.timeout(), 0.5)
+
+        self.clock.now += 0.4
+        self.assertFalse(self.pending.due())
+        self.clock.now += 0.1
+        self.assertTrue(self.pending.due())
+
+        changes, rows, delay = self.pending.take()
+        self.assertEqual(changes, {"documents": {(1,)}})
+        self.assertEqual(rows, 1)
+        self.assertAlmostEqual(delay, 0.9)
+        self.assertFalse(self.pending.due())
+
+    def test_a_stream_of_changes_is_applied_after_the_max_delay(self):
+        for _ in range(20):
+            self.pending.add("documents", (1,))
+            self.assertFalse(self.pending.due())
+            self.clock.now += 0.25
+        # Changes never paused for the debounce period, but the first one has waited 5 seconds
+        self.assertLessEqual(self.pending.timeout(), 0.25)
+        self.pending.add("documents", (1,))
+        self.assertTrue(self.pending.due())
+
+    def test_many_pending_rows_are_applied_at_once(self):
+        self.pending.add("companies", (1,))
+        self.pending.add("documents", (1,))
+        self.assertFalse(self.pending.due())
+        self.pending.add("documents", (2,))
+        self.assertTrue(self.pending.due())
+
+class TestSyncDaemon(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dev_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_DEV_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+
+        cls.prod_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_PROD_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+
+        cls.create_sample_data(cls.dev_conn)
+        cls.create_sample_data(cls.prod_conn)
+        cls.table_specs = load_table_specs(cls.dev_conn)
+        install_change_triggers(cls.dev_conn, cls.table_specs)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dev_conn.close()
+        cls.prod_conn.close()
+
+    @classmethod
+    def create_sample_data(cls, conn):
+        with conn.cursor() as cursor:
+            # Clear existing data
+            cursor.execute("DELETE FROM images;")
+            cursor.execute("DELETE FROM documents;")
+            cursor.execute("DELETE FROM companies;")
+            cursor.execute("DELETE FROM categories;")
+
+            cursor.execute("""
+                INSERT INTO categories (id, title, description)
+                VALUES (1, 'Sample Category', 'Description of Sample Category');
+            """)
+            cursor.execute("""
+                INSERT INTO companies (id, category_id, title, site_url, description)
+                VALUES (1, 1, 'Sample Company', 'http://example.com', 'Description of Sample Company');
+            """)
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (1, 1, 'Sample Document', 'Content of Sample Document'),
+                       (2, 1, 'Deleted Document', 'Content of Deleted Document');
+            """)
+            conn.commit()
+
+    def test_repeated_changes_are_coalesced(self):
+        listen_conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_DEV_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        )
+        listen_conn.autocommit = True
+        with listen_conn.cursor() as cursor:
+            cursor.execute("LISTEN db_transfer_changes;")
+
+        for content in ('First edit', 'Second edit'):
+            with self.dev_conn.cursor() as cursor:
+                cursor.execute("UPDATE documents SET content = %s WHERE id = 1;", (content,))
+            self.dev_conn.commit()
+        with self.dev_conn.cursor() as cursor:
+            cursor.execute("DELETE FROM documents WHERE id = 2;")
+        self.dev_conn.commit()
+
+        # Wait for the notifications as the daemon does, until both rows are pending
+        pending = PendingChanges()
+        deadline = time.monotonic() + 10
+        while pending.rows < 2 and time.monotonic() < deadline:
+            readable, _, _ = select.select([listen_conn], [], [], deadline - time.monotonic())
+            if readable:
+                listen_conn.poll()
+            while listen_conn.notifies:
+                pending.add(*parse_notification(listen_conn.notifies.pop(0).payload))
+        listen_conn.close()
+        changes, rows, _ = pending.take()
+        self.assertEqual(changes, {"documents": {(1,), (2,)}})
+        self.assertEqual(rows, 2)
+
+        upserted, deleted, quarantined = apply_changes(changes, self.table_specs)
+        self.assertEqual((upserted, deleted, quarantined), (1, 1, 0))
+
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("SELECT id, content FROM documents ORDER BY id;")
+            self.assertEqual(cursor.fetchall(), [(1, 'Second edit')])
+        self.prod_conn.commit()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,42 @@
+import datetime
 import unittest
+from unittest import mock
 import psycopg2
 from dotenv import load_dotenv
 import os
 
-from validate_and_transfer import validate_and_transfer_data
+from validate_and_transfer import UniqueConflictValidator, validate_and_transfer_data
+from quarantine import ensure_quarantine_table
+from sync_state import ensure_checkpoint_table, ensure_sync_state_table, get_checkpoint, get_high_water_mark
+from sync_state import save_checkpoint
 
 
 load_dotenv()
 
+class EmptyProdConnection:
+    """A PROD connection on which no title is taken yet."""
+
+    def cursor(self):
+        return mock.MagicMock(**{"__enter__.return_value.fetchall.return_value": []})
+
+class TestTitleClaims(unittest.TestCase):
+
+    def test_titles_are_claimed_only_until_the_batch_is_written(self):
+        validator = UniqueConflictValidator(rules=[])
+        prod_conn = EmptyProdConnection()
+        valid, rejected = validator.split(prod_conn, [(1, 1, 'Shared Title', 'A')])
+        self.assertEqual(len(valid), 1)
+
+        # Another batch validated while the first one is in flight cannot take the title
+        _, rejected = validator.split(prod_conn, [(2, 1, 'Shared Title', 'B')])
+        self.assertEqual(len(rejected), 1)
+
+        # Once the first batch is written (or failed), the title is looked up in PROD instead
+        validator.release(valid)
+        self.assertEqual(validator.claimed, {"title": {}})
+        valid, rejected = validator.split(prod_conn, [(2, 1, 'Shared Title', 'B')])
+        self.assertEqual((len(valid), len(rejected)), (1, 0))
+
 class TestValidateAndTransfer(unittest.TestCase):
 
     @classmethod
@@ -28,8 +57,18 @@ class TestValidateAndTransfer(unittest.TestCase):
             port=os.getenv("DB_PORT")
         )
 
-        cls.create_sample_data(cls.dev_conn)
-        cls.create_sample_data(cls.prod_conn)
+    def setUp(self):
+        # Every test starts from the same rows, whatever the previous tests transferred or left in DEV
+        self.create_sample_data(self.dev_conn)
+        self.create_sample_data(self.prod_conn)
+        ensure_quarantine_table(self.prod_conn)
+        ensure_checkpoint_table(self.prod_conn)
+        ensure_sync_state_table(self.prod_conn)
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("DELETE FROM quarantine;")
+            cursor.execute("DELETE FROM transfer_checkpoints;")
+            cursor.execute("DELETE FROM sync_state;")
+        self.prod_conn.commit()
 
     @classmethod
     def tearDownClass(cls):
@@ -81,5 +120,146 @@ class TestValidateAndTransfer(unittest.TestCase):
             count = cursor.fetchone()[0]
             self.assertEqual(count, 1, "Duplicate record with ID 1 found in PROD.")
 
+    def test_title_conflict_is_quarantined(self):
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (100, 1, 'Taken Title', 'Existing PROD document');
+            """)
+        self.prod_conn.commit()
+        with self.dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (101, 1, 'Fresh Title A', 'Content A'),
+                       (102, 1, 'Taken Title', 'Colliding content'),
+                       (103, 1, 'Fresh Title B', 'Content B');
+            """)
+        self.dev_conn.commit()
+
+        stats = validate_and_transfer_data(batch_size=2)
+        self.assertEqual(stats["quarantined"], 1)
+        self.assertEqual(stats["skipped"], 0)
+        self.assertEqual(stats["inserted"], 2)
+
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM documents WHERE id IN (101, 102, 103) ORDER BY id;")
+            ids = [row[0] for row in cursor.fetchall()]
+            self.assertEqual(ids, [101, 103], "Only the conflicting record should be held back.")
+
+            cursor.execute("""
+                SELECT record->>'title' FROM quarantine
+                WHERE table_name = 'documents' AND record_key = '[102]';
+            """)
+            self.assertEqual(cursor.fetchone()[0], 'Taken Title')
+        self.prod_conn.commit()
+
+    def test_missing_company_is_quarantined(self):
+        # Company 2 only exists on DEV, so its document would break the PROD foreign key
+        with self.dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO companies (id, category_id, title, site_url, description)
+                VALUES (2, 1, 'DEV Only Company', 'https://dev-only.example.com', 'Not in PROD');
+            """)
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (151, 2, 'Orphan Document', 'Content of a DEV only company'),
+                       (152, 1, 'Valid Document', 'Content of a PROD company');
+            """)
+        self.dev_conn.commit()
+
+        stats = validate_and_transfer_data()
+        self.assertEqual(stats["quarantined"], 1)
+
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM documents WHERE id IN (151, 152) ORDER BY id;")
+            self.assertEqual([row[0] for row in cursor.fetchall()], [152])
+            cursor.execute("""
+                SELECT reason FROM quarantine
+                WHERE table_name = 'documents' AND record_key = '[151]';
+            """)
+            self.assertEqual(cursor.fetchone()[0], "company_id references a missing companies.id")
+        self.prod_conn.commit()
+
+        # Keep the orphan out of the transfers of the other tests
+        with self.dev_conn.cursor() as cursor:
+            cursor.execute("DELETE FROM documents WHERE id = 151;")
+            cursor.execute("DELETE FROM companies WHERE id = 2;")
+        self.dev_conn.commit()
+
+    def test_incremental_run_only_resends_changed_rows(self):
+        with self.dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (401, 1, 'Unchanged Document', 'Original content'),
+                       (402, 1, 'Changed Document', 'Original content');
+            """)
+        self.dev_conn.commit()
+
+        # Without the overlap margin, exactly the rows changed after the mark are read again
+        with mock.patch("sync_state.SYNC_OVERLAP", datetime.timedelta(0)):
+            stats = validate_and_transfer_data(incremental=True)
+            self.assertEqual(stats["extracted"], 3)
+            first_mark = get_high_water_mark(self.prod_conn, "documents")
+            self.assertIsNotNone(first_mark)
+
+            with self.dev_conn.cursor() as cursor:
+                cursor.execute("UPDATE documents SET content = 'Edited content' WHERE id = 402;")
+            self.dev_conn.commit()
+
+            stats = validate_and_transfer_data(incremental=True)
+            self.assertEqual(stats["extracted"], 1)
+            self.assertEqual(stats["updated"], 1)
+            self.assertGreater(get_high_water_mark(self.prod_conn, "documents"), first_mark)
+
+            stats = validate_and_transfer_data(incremental=True)
+            self.assertEqual(stats["extracted"], 0)
+
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("SELECT content FROM documents WHERE id = 402;")
+            self.assertEqual(cursor.fetchone()[0], 'Edited content')
+        self.prod_conn.commit()
+
+    def test_resumes_after_checkpoint(self):
+        with self.dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (201, 1, 'Before Checkpoint', 'Already transferred'),
+                       (202, 1, 'At Checkpoint', 'Already transferred'),
+                       (203, 1, 'After Checkpoint', 'Not transferred yet');
+            """)
+        self.dev_conn.commit()
+        ensure_checkpoint_table(self.prod_conn)
+        save_checkpoint(self.prod_conn, "upsert:documents", "documents", 202)
+
+        validate_and_transfer_data()
+
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM documents WHERE id IN (201, 202, 203) ORDER BY id;")
+            ids = [row[0] for row in cursor.fetchall()]
+            self.assertEqual(ids, [203], "Only records after the checkpoint should be transferred.")
+        self.prod_conn.commit()
+        self.assertIsNone(get_checkpoint(self.prod_conn, "upsert:documents"))
+
+    def test_large_content_is_streamed_in_chunks(self):
+        # Larger than LARGE_VALUE_BYTES and LARGE_VALUE_CHUNK, so it is copied in two chunks
+        content = "0123456789" * 150000 + "end"
+        with self.dev_conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO documents (id, company_id, title, content)
+                VALUES (301, 1, 'Large Document', %s),
+                       (302, 1, 'Small Document', 'Small content');
+            """, (content,))
+        self.dev_conn.commit()
+
+        stats = validate_and_transfer_data()
+        self.assertEqual(stats["skipped"], 0)
+
+        with self.prod_conn.cursor() as cursor:
+            cursor.execute("SELECT id, content FROM documents WHERE id IN (301, 302) ORDER BY id;")
+            self.assertEqual(cursor.fetchall(), [(301, content), (302, 'Small content')])
+            cursor.execute("SELECT COUNT(*) FROM staging_large_values;")
+            self.assertEqual(cursor.fetchone()[0], 0, "Staged chunks should be removed once reassembled.")
+        self.prod_conn.commit()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from unittest import mock
+
+from schema import get_table_spec
+from validation_rules import REFERENCE_LOOKUP_ROWS, MaxLength, NotNull, ReferenceExists, Rule, RuleSet, UrlFormat
+
+
+class TestRuleSet(unittest.TestCase):
+
+    def test_rows_are_split_with_every_failed_rule(self):
+        spec = get_table_spec("companies")
+        rules = [NotNull("title"), MaxLength("title", 255), MaxLength("site_url", 255), UrlFormat("site_url")]
+        batch = [
+            (1, None, "https://example.com/about", "Valid Company", None),
+            (2, None, None, "No Site Company", None),
+            (3, None, "not a url", None, None),
+            (4, None, "https://example.com/" + "a" * 300, "Long Url Company", None),
+        ]
+        valid, rejected = RuleSet(spec, rules).split(None, batch)
+
+        self.assertEqual([record[0] for record in valid], [1, 2])
+        reasons = {record[0]: reason for record, reason in rejected}
+        self.assertEqual(reasons[3], "title is NULL; site_url 'not a url' is not a valid URL")
+        self.assertEqual(reasons[4], "site_url is 320 characters long, more than 255")
+
+    def test_rule_without_check_cannot_be_created(self):
+        class Incomplete(Rule):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete("title")
+
+class TestReferenceExists(unittest.TestCase):
+
+    def setUp(self):
+        self.rule = ReferenceExists("document_id", "documents", "id")
+        self.prod_keys = {1, 2, 3}
+        self.load_keys = mock.patch.object(self.rule, "load_keys", side_effect=lambda conn: set(self.prod_keys))
+        self.find_keys = mock.patch.object(self.rule, "find_keys",
+                                           side_effect=lambda conn, values: set(values) & self.prod_keys)
+
+    def test_small_batches_are_only_looked_up(self):
+        with self.load_keys as load_keys, self.find_keys as find_keys:
+            reasons = self.rule.check(None, [1, 4, None])
+
+        self.assertEqual(reasons, [None, "document_id references a missing documents.id", None])
+        load_keys.assert_not_called()
+        find_keys.assert_called_once()
+
+    def test_large_batches_load_the_keys_once(self):
+        values = [1] * REFERENCE_LOOKUP_ROWS
+        with self.load_keys as load_keys, self.find_keys:
+            self.rule.check(None, values)
+            self.rule.check(None, values)
+            # Once loaded, the keys serve small batches as well
+            self.rule.check(None, [2])
+        load_keys.assert_called_once()
+
+    def test_deleted_parents_are_forgotten(self):
+        with self.load_keys, self.find_keys:
+            self.rule.check(None, [1] * REFERENCE_LOOKUP_ROWS)
+            self.prod_keys.discard(2)
+            self.rule.forget_deleted("documents", {(2,)})
+            self.rule.forget_deleted("companies", {(3,)})
+            reasons = self.rule.check(None, [2, 3])
+
+        self.assertEqual(reasons, ["document_id references a missing documents.id", None])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,14 +8,38 @@ This script validates the extracted data from the DEV database and prepares it f
 This script is invoked within `data_transfer.py` and is not typically run directly by the user.
 
 ## Details:
-- Validates the data by checking for duplicates and other constraints.
+- Validates the data by checking for duplicates and other constraints. Row-level rules (non-null titles,
+  VARCHAR lengths, URL formats and foreign key existence) are applied column-wise to whole batches by
+  `validation_rules.py`.
+- Title collisions, both with PROD and within the incoming data, are found up front with one indexed
+  lookup per batch and routed to the PROD `quarantine` table, so the write path does not have to
+  fail and bisect batches to discover them.
 - Prepares the data for transfer to the PROD database.
+- Batches are capped both by a number of records and by their payload size in bytes, so that batches
+  of large documents stay as small in memory as batches of short ones.
+- Oversized `content` values are not read with their record; they are streamed from DEV to PROD in
+  chunks by `large_values.py`, one record per transaction.
+- PROD is counted at most once per run: the upsert reports which rows it inserted, so the count after
+  the transfer is derived instead of scanning the table again.
 """
 
 import psycopg2
+from psycopg2.extras import execute_values
 import os
+import threading
+from contextlib import ExitStack
+from functools import partial
 from dotenv import load_dotenv
-from extract_data_from_dev import extract_new_records
+from extract_data_from_dev import stream_new_records, get_change_high_water_mark
+from schema import get_table_spec
+from db import connection, dev_db_name, prod_db_name
+from large_values import LARGE_VALUE_BYTES, ensure_large_value_table, has_large_values, large_value_bytes
+from large_values import write_large_record
+from metrics import REGISTRY, increment, payload_bytes, record_rows, stage_timer, timed_iter
+from quarantine import ensure_quarantine_table, quarantine_records
+from sync_state import clear_checkpoints, ensure_checkpoint_table, get_checkpoint, save_checkpoint
+from sync_state import ensure_sync_state_table, get_sync_window_start, save_high_water_mark
+from validation_rules import RuleSet
 import logging
 
 # Configure logging
@@ -23,87 +47,431 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 load_dotenv()
 
-def count_records(cursor, table_name):
-    cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
+# Number of records written to PROD per transaction
+DEFAULT_BATCH_SIZE = int(os.getenv("TRANSFER_BATCH_SIZE", "1000"))
+
+# Approximate payload bytes written to PROD per transaction; a batch closes at whichever limit comes first
+DEFAULT_BATCH_BYTES = int(os.getenv("TRANSFER_BATCH_BYTES", str(16 * 1024 * 1024)))
+
+# "exact" counts PROD once before the transfer, "estimate" reads the planner statistics instead
+COUNT_MODES = ("exact", "estimate")
+DEFAULT_COUNT_MODE = os.getenv("TRANSFER_COUNT_MODE", "exact")
+
+DOCUMENTS_SPEC = get_table_spec("documents")
+
+def build_upsert_sql(spec):
+    """
+    Build the multi-row `INSERT ... VALUES %s ON CONFLICT` statement for a table, for use with execute_values.
+    Each written row returns whether it was inserted (`xmax = 0`) rather than updated.
+    """
+    non_key_columns = [column for column in spec.columns if column not in spec.key]
+    if non_key_columns:
+        updates = ",\n                  ".join(f"{column} = EXCLUDED.{column}" for column in non_key_columns)
+        on_conflict = f"DO UPDATE SET {updates}"
+    else:
+        on_conflict = "DO NOTHING"
+    return f"""
+    INSERT INTO {spec.name} ({', '.join(spec.columns)})
+    VALUES %s
+    ON CONFLICT ({', '.join(spec.key)})
+    {on_conflict}
+    RETURNING (xmax = 0);
+"""
+
+UPSERT_DOCUMENTS_SQL = build_upsert_sql(DOCUMENTS_SPEC)
+
+def count_records(cursor, table_name, exact=True):
+    """Count the records of a table, or estimate them from the planner statistics without a scan."""
+    if exact:
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
+        return cursor.fetchone()[0]
+    return estimate_records(cursor, table_name)
+
+def estimate_records(cursor, table_name):
+    # reltuples is only known once the table has been vacuumed or analyzed; until then
+    # fall back to the live tuple count kept by the statistics collector
+    cursor.execute("""
+        SELECT CASE WHEN c.reltuples > 0 THEN c.reltuples::bigint ELSE COALESCE(s.n_live_tup, 0) END
+        FROM pg_class c
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE c.oid = %s::regclass;
+    """, (table_name,))
     return cursor.fetchone()[0]
 
 def get_existing_records(cursor, table_name):
     cursor.execute(f"SELECT id FROM {table_name};")
     return set(record[0] for record in cursor.fetchall())
 
-def validate_and_transfer_data():
-    # Establish connections to both DEV and PROD databases
-    dev_conn = psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        dbname=os.getenv("DB_DEV_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT")
-    )
-
-    prod_conn = psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        dbname=os.getenv("DB_PROD_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT")
-    )
-
-    dev_cursor = dev_conn.cursor()
-    prod_cursor = prod_conn.cursor()
+def iter_batches(records, batch_size, max_bytes=None):
+    """
+    Group an iterable of records into lists of up to `batch_size` records, closing a batch early once
+    its payload reaches `max_bytes`. A single record larger than `max_bytes` forms a batch of its own.
+    """
+    batch = []
+    size = 0
+    for record in records:
+        batch.append(record)
+        if max_bytes:
+            size += payload_bytes((record,))
+        if len(batch) >= batch_size or (max_bytes and size >= max_bytes):
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
 
-    try:
-        # Count records in DEV database
-        dev_document_count = count_records(dev_cursor, "documents")
-        logging.info(f"Number of records in DEV 'documents' table: {dev_document_count}")
+def execute_upsert(prod_conn, batch, upsert_sql):
+    """Upsert a batch. Returns the number of records that were inserted rather than updated."""
+    with prod_conn.cursor() as cursor:
+        results = execute_values(cursor, upsert_sql, batch, page_size=len(batch), fetch=True)
+    return sum(1 for (inserted,) in results if inserted)
 
-        # Count records in PROD database
-        prod_document_count_before = count_records(prod_cursor, "documents")
-        logging.info(f"Number of records in PROD 'documents' table before transfer: {prod_document_count_before}")
-
-        # Extract data from the DEV database
-        documents_data = extract_new_records()
-
-        # Track updated and skipped records
-        updated_records = 0
-        skipped_records = 0
-
-        # Iterate over the documents data
-        for document in documents_data:
-            document_id = document[0]
-            company_id = document[1]
-            title = document[2]
-            content = document[3]
-
-            try:
-                # Use individual transactions for each record to handle errors separately
-                with prod_conn.cursor() as single_cursor:
-                    single_cursor.execute("""
-                        INSERT INTO documents (id, company_id, title, content)
-                        VALUES (%s, %s, %s, %s)
-                        ON CONFLICT (id)
-                        DO UPDATE SET company_id = EXCLUDED.company_id,
-                                      title = EXCLUDED.title,
-                                      content = EXCLUDED.content;
-                    """, (document_id, company_id, title, content))
-                    updated_records += 1
+def resolve_conflict(prod_conn, batch, spec, upsert_sql, error):
+    """
+    Handle a batch that was rolled back because of `error`, a unique index (such as the document
+    title index) or foreign key violation. The batch is split in half and each half is retried,
+    so that only the offending rows end up being skipped.
+    Returns a tuple of (updated_records, skipped_records, inserted_records).
+    """
+    if len(batch) == 1:
+        # Log the constraint violation and continue
+        if spec is DOCUMENTS_SPEC and isinstance(error, psycopg2.errors.UniqueViolation):
+            logging.warning(f"Unique constraint violation for title '{batch[0][2]}': {error}")
+        else:
+            key = tuple(batch[0][spec.columns.index(column)] for column in spec.key)
+            logging.warning(f"Constraint violation for '{spec.name}' record {key}: {error}")
+        return 0, 1, 0
+
+    # Bisect the batch to isolate the offending rows
+    updated_records = skipped_records = inserted_records = 0
+    middle = len(batch) // 2
+    for half in (batch[:middle], batch[middle:]):
+        increment("retries_total", table=spec.name, reason="conflict")
+        try:
+            half_inserted = execute_upsert(prod_conn, half, upsert_sql)
+            prod_conn.commit()
+            updated_records += len(half)
+            inserted_records += half_inserted
+        except psycopg2.IntegrityError as e:
+            prod_conn.rollback()
+            half_updated, half_skipped, half_inserted = resolve_conflict(prod_conn, half, spec, upsert_sql, e)
+            updated_records += half_updated
+            skipped_records += half_skipped
+            inserted_records += half_inserted
+    return updated_records, skipped_records, inserted_records
+
+def write_batch(prod_conn, batch, spec=DOCUMENTS_SPEC, checkpoint=None):
+    """
+    Upsert a batch of records into a PROD table in a single transaction.
+
+    If the batch hits a unique index or a foreign key, the offending rows are isolated
+    by `resolve_conflict` and skipped. `checkpoint`, when given, is called with the PROD
+    connection to record progress in the same transaction as the batch (or right after the
+    conflicting rows were resolved), so a checkpoint is never ahead of the committed records.
+    Returns a tuple of (updated_records, skipped_records, inserted_records), where updated
+    records include the inserted ones.
+    """
+    if not batch:
+        if checkpoint is not None:
+            checkpoint(prod_conn)
+            prod_conn.commit()
+        return 0, 0, 0
+
+    upsert_sql = UPSERT_DOCUMENTS_SQL if spec is DOCUMENTS_SPEC else build_upsert_sql(spec)
+    with REGISTRY.timer("batch_seconds", table=spec.name):
+        try:
+            with stage_timer("write", table=spec.name):
+                inserted_records = execute_upsert(prod_conn, batch, upsert_sql)
+                if checkpoint is not None:
+                    checkpoint(prod_conn)
+            with stage_timer("commit", table=spec.name):
+                prod_conn.commit()
+            updated_records, skipped_records = len(batch), 0
+        except psycopg2.IntegrityError as e:
+            with stage_timer("conflict", table=spec.name):
+                prod_conn.rollback()  # Rollback the transaction for the failed batch
+                updated_records, skipped_records, inserted_records = resolve_conflict(
+                    prod_conn, batch, spec, upsert_sql, e
+                )
+                if checkpoint is not None:
+                    checkpoint(prod_conn)
+                    prod_conn.commit()
+
+    record_rows(spec.name, "extracted", batch, include_bytes=True)
+    increment("rows_total", updated_records, table=spec.name, result="updated")
+    increment("rows_total", skipped_records, table=spec.name, result="skipped")
+    increment("rows_total", inserted_records, table=spec.name, result="inserted")
+    return updated_records, skipped_records, inserted_records
+
+def write_large_records(dev_conn, prod_conn, records, spec=DOCUMENTS_SPEC):
+    """
+    Upsert records holding LargeValue placeholders one transaction at a time, streaming their values
+    from DEV. Records that violate a constraint or were deleted from DEV meanwhile are skipped.
+    Returns a tuple of (updated_records, skipped_records, inserted_records).
+    """
+    upsert_sql = UPSERT_DOCUMENTS_SQL if spec is DOCUMENTS_SPEC else build_upsert_sql(spec)
+    updated_records = skipped_records = inserted_records = 0
+    for record in records:
+        key = tuple(record[spec.columns.index(column)] for column in spec.key)
+        try:
+            with stage_timer("write_large", table=spec.name):
+                inserted = write_large_record(dev_conn, prod_conn, spec, record, upsert_sql)
+                if inserted is None:
+                    prod_conn.rollback()
+                    logging.warning(f"Skipped '{spec.name}' record {key}: deleted from DEV during the transfer.")
+                    skipped_records += 1
+                    continue
                 prod_conn.commit()
-            except psycopg2.errors.UniqueViolation as e:
-                # Log the unique constraint violation and continue
-                logging.warning(f"Unique constraint violation for title '{title}': {e}")
-                skipped_records += 1
-                prod_conn.rollback()  # Rollback the transaction for the failed record
-
-    except Exception as e:
-        logging.warning(f"Non-fatal error during data validation and transfer: {e}")
+        except psycopg2.IntegrityError as e:
+            prod_conn.rollback()
+            logging.warning(f"Constraint violation for '{spec.name}' record {key}: {e}")
+            skipped_records += 1
+            continue
+        updated_records += 1
+        inserted_records += 1 if inserted else 0
+
+    record_rows(spec.name, "extracted", records, include_bytes=True)
+    increment("bytes_total", large_value_bytes(records), table=spec.name, result="extracted")
+    increment("rows_total", updated_records, table=spec.name, result="updated")
+    increment("rows_total", skipped_records, table=spec.name, result="skipped")
+    increment("rows_total", inserted_records, table=spec.name, result="inserted")
+    return updated_records, skipped_records, inserted_records
+
+class UniqueConflictValidator:
+    """
+    Finds incoming records whose unique columns (such as the document title) are already used by a
+    different record, either in PROD or earlier in the same transfer, before they are written.
+    Records are first checked against the row-level `rules` of the table (see `validation_rules.py`),
+    which default to `default_rules(spec)`.
+
+    Accepted records claim their titles until `release` is called once their batch is written, so that
+    batches validated meanwhile (by other workers) cannot take the same titles. Committed titles are
+    found in PROD instead, which keeps memory bounded by the batches in flight. One validator is shared
+    by every batch (and every worker) of a table.
+    """
+
+    def __init__(self, spec=DOCUMENTS_SPEC, rules=None):
+        self.spec = spec
+        self.rules = RuleSet(spec, rules)
+        self.key_indexes = [spec.columns.index(column) for column in spec.key]
+        self.unique_indexes = {column: spec.columns.index(column) for column in spec.unique}
+        self.claimed = {column: {} for column in spec.unique}
+        self._lock = threading.Lock()
+
+    def record_key(self, record):
+        return tuple(record[index] for index in self.key_indexes)
+
+    def get_prod_owners(self, prod_conn, batch):
+        """Return {column: {value: key}} for the PROD records holding the unique values of the batch."""
+        owners = {}
+        with prod_conn.cursor() as cursor:
+            for column, index in self.unique_indexes.items():
+                values = list({record[index] for record in batch if record[index] is not None})
+                if not values:
+                    continue
+                cursor.execute(f"""
+                    SELECT {column}, {', '.join(self.spec.key)}
+                    FROM {self.spec.name}
+                    WHERE {column} = ANY(%s);
+                """, (values,))
+                owners[column] = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        return owners
+
+    def split(self, prod_conn, batch):
+        """Split a batch into (valid_records, rejected) where `rejected` holds (record, reason) pairs."""
+        batch, rejected = self.rules.split(prod_conn, batch)
+        if not self.unique_indexes or not batch:
+            return batch, rejected
+
+        prod_owners = self.get_prod_owners(prod_conn, batch)
+        valid = []
+        with self._lock:
+            for record in batch:
+                key = self.record_key(record)
+                reason = None
+                for column, index in self.unique_indexes.items():
+                    value = record[index]
+                    if value is None:
+                        continue
+                    owner = prod_owners.get(column, {}).get(value)
+                    if owner is not None and owner != key:
+                        reason = f"{column} '{value}' is already used by PROD record {owner}"
+                        break
+                    owner = self.claimed[column].get(value)
+                    if owner is not None and owner != key:
+                        reason = f"{column} '{value}' duplicates incoming record {owner}"
+                        break
+                if reason is not None:
+                    rejected.append((record, reason))
+                    continue
+                for column, index in self.unique_indexes.items():
+                    if record[index] is not None:
+                        self.claimed[column][record[index]] = key
+                valid.append(record)
+        return valid, rejected
+
+    def release(self, records):
+        """
+        Release the titles claimed by `records`, once their batch was committed (PROD then holds the
+        titles) or failed (the titles are free again).
+        """
+        with self._lock:
+            for record in records:
+                key = self.record_key(record)
+                for column, index in self.unique_indexes.items():
+                    claimed = self.claimed[column]
+                    if record[index] is not None and claimed.get(record[index]) == key:
+                        del claimed[record[index]]
+
+    def forget_deleted(self, table_name, keys):
+        """Tell the row-level rules that the rows with the given primary keys were deleted from a PROD table."""
+        self.rules.forget_deleted(table_name, keys)
+
+def transfer_batch(prod_conn, batch, validator, checkpoint=None, dev_conn=None):
+    """
+    Validate a batch against the row-level rules and the unique indexes, quarantine the rejected records
+    and upsert the rest.
+    Records holding LargeValue placeholders are written first, streaming their values from `dev_conn`.
+    `checkpoint` is passed on to `write_batch`, so it is only saved once the whole batch is written.
+    Returns a tuple of (updated_records, skipped_records, quarantined_records, inserted_records).
+    """
+    spec = validator.spec
+    with stage_timer("validate", table=spec.name):
+        valid, rejected = validator.split(prod_conn, batch)
+    if rejected:
+        for record, reason in rejected:
+            logging.warning(f"Quarantined '{spec.name}' record {validator.record_key(record)}: {reason}")
+        quarantine_records(prod_conn, spec, rejected)
+        rejected_records = [record for record, _ in rejected]
+        record_rows(spec.name, "extracted", rejected_records, include_bytes=True)
+        record_rows(spec.name, "quarantined", rejected_records)
+
+    try:
+        large_updated = large_skipped = large_inserted = 0
+        large = [record for record in valid if has_large_values(record)]
+        small = valid
+        if large:
+            if dev_conn is None:
+                raise ValueError(f"A DEV connection is needed to stream the large values of '{spec.name}' records")
+            small = [record for record in valid if not has_large_values(record)]
+            large_updated, large_skipped, large_inserted = write_large_records(dev_conn, prod_conn, large, spec)
+
+        updated_records, skipped_records, inserted_records = write_batch(prod_conn, small, spec, checkpoint)
     finally:
-        # Re-count records in PROD database
-        prod_document_count_after = count_records(prod_cursor, "documents")
-        logging.info(f"Number of records in PROD 'documents' table after transfer: {prod_document_count_after}")
-        logging.info(f"Number of records updated in PROD 'documents' table: {updated_records}")
-        logging.info(f"Number of records skipped due to unique constraint violations: {skipped_records}")
-
-        dev_cursor.close()
-        prod_cursor.close()
-        dev_conn.close()
-        prod_conn.close()
+        validator.release(valid)
+    return (updated_records + large_updated, skipped_records + large_skipped, len(rejected),
+            inserted_records + large_inserted)
+
+def validate_and_transfer_data(records=None, batch_size=DEFAULT_BATCH_SIZE, incremental=False,
+                               count_mode=DEFAULT_COUNT_MODE, batch_bytes=DEFAULT_BATCH_BYTES, dev_conn=None,
+                               prod_dbname=None):
+    """
+    Transfer documents from DEV to PROD in a single pass over the extracted records.
+
+    `records` may be any iterable of (id, company_id, title, content) rows, such as the stream
+    returned by `stream_new_records`. When omitted, records are streamed from the DEV database.
+    Batches hold up to `batch_size` records and about `batch_bytes` of payload. `dev_conn` is only
+    needed for `records` holding LargeValue placeholders. The records are written to `prod_dbname`,
+    which defaults to `DB_PROD_NAME`.
+    With `incremental`, only documents changed since the high-water mark stored on PROD are
+    streamed, and the mark is advanced once they have all been transferred.
+    When streaming from DEV, a checkpoint is saved on PROD with every batch, and a run that was
+    interrupted is resumed after the last committed document (within the same incremental window).
+    Records that break a validation rule, or whose title is already used by another document, are
+    quarantined instead of written.
+    PROD is counted once before the transfer (exactly, or estimated with `count_mode="estimate"`),
+    and the count after the transfer is derived from the records actually inserted.
+    Returns a dict with the number of extracted, updated, skipped and quarantined records.
+    """
+    # Track extracted, updated, skipped and quarantined records
+    extracted_records = 0
+    updated_records = 0
+    skipped_records = 0
+    quarantined_records = 0
+    inserted_records = 0
+    validator = UniqueConflictValidator(DOCUMENTS_SPEC)
+
+    with ExitStack() as stack:
+        prod_conn = stack.enter_context(connection(prod_dbname or prod_db_name()))
+        ensure_quarantine_table(prod_conn)
+        ensure_large_value_table(prod_conn)
+
+        # Only borrow a DEV connection when the records have to be streamed from it
+        high_water_mark = None
+        checkpoint_name = None
+        if records is None:
+            dev_conn = stack.enter_context(connection(dev_db_name()))
+            checkpoint_name = f"{'incremental' if incremental else 'upsert'}:documents"
+            ensure_checkpoint_table(prod_conn)
+            checkpoint = get_checkpoint(prod_conn, checkpoint_name)
+            after_id = None
+            if checkpoint is not None:
+                after_id = checkpoint["last_key"]
+                logging.info(f"Resuming the transfer of 'documents' after id {after_id}.")
+            since = None
+            if incremental:
+                # The high-water mark and the records are read from the same snapshot
+                dev_conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+                ensure_sync_state_table(prod_conn)
+                since = get_sync_window_start(prod_conn, "documents")
+                if checkpoint is not None:
+                    # Finish the window of the interrupted run before starting a new one
+                    high_water_mark = checkpoint["high_water_mark"]
+                else:
+                    high_water_mark = get_change_high_water_mark(dev_conn, "documents")
+                logging.info(f"Incremental sync of 'documents' changed after {since} up to {high_water_mark}.")
+            records = stream_new_records(dev_conn, since=since, until=high_water_mark, after_id=after_id,
+                                         max_value_bytes=LARGE_VALUE_BYTES)
+
+        # Count records in PROD database
+        exact = count_mode == "exact"
+        approximately = "" if exact else "approximately "
+        with prod_conn.cursor() as prod_cursor:
+            prod_document_count_before = count_records(prod_cursor, "documents", exact=exact)
+        prod_conn.commit()
+        logging.info(f"Number of records in PROD 'documents' table before transfer: "
+                     f"{approximately}{prod_document_count_before}")
+
+        try:
+            # Write the documents to PROD in batches, one transaction per batch
+            batches = iter_batches(records, batch_size, batch_bytes)
+            for batch in timed_iter(batches, "extract", table="documents"):
+                extracted_records += len(batch)
+                checkpoint = None
+                if checkpoint_name is not None:
+                    checkpoint = partial(save_checkpoint, name=checkpoint_name, table_name="documents",
+                                         last_key=batch[-1][0], high_water_mark=high_water_mark, commit=False)
+                batch_updated, batch_skipped, batch_quarantined, batch_inserted = transfer_batch(
+                    prod_conn, batch, validator, checkpoint, dev_conn
+                )
+                updated_records += batch_updated
+                skipped_records += batch_skipped
+                quarantined_records += batch_quarantined
+                inserted_records += batch_inserted
+
+            # Every record up to the high-water mark has been handled
+            if high_water_mark is not None:
+                save_high_water_mark(prod_conn, "documents", high_water_mark)
+            if checkpoint_name is not None:
+                clear_checkpoints(prod_conn, checkpoint_name)
+
+        except Exception as e:
+            logging.error(f"Error during data validation and transfer of 'documents': {e}")
+            raise
+        finally:
+            # Every new record adds one row to PROD, so there is no need to count it again
+            prod_document_count_after = prod_document_count_before + inserted_records
+            logging.info(f"Number of records extracted from DEV 'documents' table: {extracted_records}")
+            logging.info(f"Number of records in PROD 'documents' table after transfer: "
+                         f"{approximately}{prod_document_count_after}")
+            logging.info(f"Number of records updated in PROD 'documents' table: {updated_records}")
+            logging.info(f"Number of records skipped due to unique constraint violations: {skipped_records}")
+            logging.info(f"Number of records quarantined due to rule violations or title conflicts: {quarantined_records}")
+
+    return {
+        "extracted": extracted_records,
+        "updated": updated_records,
+        "skipped": skipped_records,
+        "quarantined": quarantined_records,
+        "inserted": inserted_records,
+    }
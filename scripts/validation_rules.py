@@ -0,0 +1,194 @@
+"""
+# validation_rules.py
+
+## Purpose:
+This module checks incoming records against row-level rules before they are written to the PROD database.
+
+## Usage:
+This module is used internally by `UniqueConflictValidator` in `validate_and_transfer.py`, so every transfer
+mode that validates records applies the rules. It is not run directly.
+
+## Details:
+- Rules are applied column-wise: a batch is transposed once, and each rule checks a whole column of
+  values in one pass, instead of running every rule on every row.
+- `NotNull`, `MaxLength` and `UrlFormat` mirror the `NOT NULL` and `VARCHAR(255)` definitions of
+  `create_databases_and_tables.py` and the expected URL format. `ReferenceExists` checks that a foreign
+  key value exists in the parent table on PROD.
+- The keys of a parent table are loaded once into a set. Values missing from the set are looked up on PROD
+  in one query per batch, so parents written during the same transfer are found as well. Batches smaller
+  than `REFERENCE_LOOKUP_ROWS` are only looked up, so a validator that sees few rows (such as the sync
+  daemon's) never reads a whole parent table. Keys of deleted parents are dropped with `forget_deleted`.
+- `default_rules` returns the rules of a table; other rules can be passed to the validator instead.
+- Records that break any rule are rejected with every failed rule as the reason, and are quarantined like
+  unique conflicts.
+"""
+
+import re
+import threading
+from abc import ABC, abstractmethod
+
+# Maximum length of the VARCHAR(255) columns
+VARCHAR_LENGTH = 255
+
+# Columns that may not be NULL, besides the primary keys
+NOT_NULL_COLUMNS = {
+    "categories": ("title",),
+    "companies": ("title",),
+    "documents": ("title",),
+    "images": ("image_url",),
+}
+
+# VARCHAR columns with their maximum length
+MAX_LENGTHS = {
+    "categories": {"title": VARCHAR_LENGTH},
+    "companies": {"site_url": VARCHAR_LENGTH, "title": VARCHAR_LENGTH},
+    "documents": {"title": VARCHAR_LENGTH},
+    "images": {"image_url": VARCHAR_LENGTH},
+}
+
+URL_COLUMNS = {
+    "companies": ("site_url",),
+    "images": ("image_url",),
+}
+
+# Batches with fewer rows than this look up their references on PROD instead of loading every parent key
+REFERENCE_LOOKUP_ROWS = 100
+
+# An http(s) URL with a host and no whitespace
+URL_PATTERN = re.compile(r"https?://[^\s/?#]+\.[^\s/?#]+(?:[/?#]\S*)?", re.IGNORECASE)
+
+class Rule(ABC):
+    """
+    A check applied to one column of a batch. `check` receives the column values of the whole batch and
+    returns a list with, for every value, None if it is valid or the reason it is rejected.
+    """
+
+    def __init__(self, column):
+        self.column = column
+
+    @abstractmethod
+    def check(self, prod_conn, values):
+        pass
+
+    def forget_deleted(self, table_name, keys):
+        """Called with the primary keys of rows deleted from a PROD table, for rules that cache keys."""
+
+class NotNull(Rule):
+
+    def check(self, prod_conn, values):
+        reason = f"{self.column} is NULL"
+        return [reason if value is None else None for value in values]
+
+class MaxLength(Rule):
+
+    def __init__(self, column, limit):
+        super().__init__(column)
+        self.limit = limit
+
+    def check(self, prod_conn, values):
+        limit = self.limit
+        return [
+            f"{self.column} is {len(value)} characters long, more than {limit}"
+            if isinstance(value, str) and len(value) > limit else None
+            for value in values
+        ]
+
+class UrlFormat(Rule):
+
+    def check(self, prod_conn, values):
+        match = URL_PATTERN.fullmatch
+        return [
+            f"{self.column} '{value}' is not a valid URL" if value is not None and not match(value) else None
+            for value in values
+        ]
+
+class ReferenceExists(Rule):
+    """Rejects foreign key values that do not exist in the parent table on PROD. NULL values are accepted."""
+
+    def __init__(self, column, parent_table, parent_column):
+        super().__init__(column)
+        self.parent_table = parent_table
+        self.parent_column = parent_column
+        self.keys = None
+        self._lock = threading.Lock()
+
+    def load_keys(self, prod_conn):
+        with prod_conn.cursor() as cursor:
+            cursor.execute(f"SELECT {self.parent_column} FROM {self.parent_table};")
+            return {row[0] for row in cursor.fetchall()}
+
+    def find_keys(self, prod_conn, values):
+        """Return the values among `values` that exist in the parent table."""
+        with prod_conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {self.parent_column}
+                FROM {self.parent_table}
+                WHERE {self.parent_column} = ANY(%s);
+            """, (list(values),))
+            return {row[0] for row in cursor.fetchall()}
+
+    def check(self, prod_conn, values):
+        with self._lock:
+            referenced = {value for value in values if value is not None}
+            if self.keys is None and len(values) < REFERENCE_LOOKUP_ROWS:
+                keys = self.find_keys(prod_conn, referenced) if referenced else set()
+            else:
+                if self.keys is None:
+                    self.keys = self.load_keys(prod_conn)
+                keys = self.keys
+                missing = referenced - keys
+                if missing:
+                    # Parents written since the keys were loaded
+                    keys.update(self.find_keys(prod_conn, missing))
+        reason = f"{self.column} references a missing {self.parent_table}.{self.parent_column}"
+        return [reason if value is not None and value not in keys else None for value in values]
+
+    def forget_deleted(self, table_name, keys):
+        # The parent column is the single-column primary key of the parent table
+        if table_name != self.parent_table:
+            return
+        with self._lock:
+            if self.keys is not None:
+                self.keys.difference_update(key[0] for key in keys)
+
+def default_rules(spec):
+    """Return the rules of a table, for the columns of `spec` that are transferred."""
+    rules = [NotNull(column) for column in NOT_NULL_COLUMNS.get(spec.name, ())]
+    rules += [MaxLength(column, limit) for column, limit in MAX_LENGTHS.get(spec.name, {}).items()]
+    rules += [UrlFormat(column) for column in URL_COLUMNS.get(spec.name, ())]
+    rules += [ReferenceExists(column, parent_table, parent_column)
+              for column, parent_table, parent_column in spec.references]
+    return [rule for rule in rules if rule.column in spec.columns]
+
+class RuleSet:
+    """The rules of one table, applied column-wise to whole batches."""
+
+    def __init__(self, spec, rules=None):
+        self.spec = spec
+        self.rules = default_rules(spec) if rules is None else list(rules)
+
+    def split(self, prod_conn, batch):
+        """Split a batch into (valid_records, rejected) where `rejected` holds (record, reason) pairs."""
+        if not self.rules or not batch:
+            return batch, []
+
+        columns = dict(zip(self.spec.columns, zip(*batch)))
+        reasons = [[] for _ in batch]
+        for rule in self.rules:
+            for row_reasons, reason in zip(reasons, rule.check(prod_conn, columns[rule.column])):
+                if reason is not None:
+                    row_reasons.append(reason)
+
+        valid = []
+        rejected = []
+        for record, row_reasons in zip(batch, reasons):
+            if row_reasons:
+                rejected.append((record, "; ".join(row_reasons)))
+            else:
+                valid.append(record)
+        return valid, rejected
+
+    def forget_deleted(self, table_name, keys):
+        """Forget the keys of rows deleted from a PROD table, so that they are no longer accepted as parents."""
+        for rule in self.rules:
+            rule.forget_deleted(table_name, keys)